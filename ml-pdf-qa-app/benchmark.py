@@ -0,0 +1,442 @@
+"""
+Benchmark the PDF QA pipeline on seeded synthetic documents.
+
+Each document size is generated with create_sample_pdf.generate_pdf and run
+through the pipeline stage by stage:
+
+    extract_text          PDFProcessor page extraction and cleaning
+    chunk_document        token-aware chunking
+    index_document        chunking, embedding and vector indexing
+    find_relevant_chunks  retrieval, once per planted fact question
+    _build_answer         answer cascade (reranker, reader) over the retrieved chunks
+
+Results (per-stage seconds, throughput, latency percentiles, peak RSS,
+retrieval hit rate and which cascade stage answered) are printed and written
+as JSON, so runs on different commits can be compared with --compare. Each
+run also compares the int8 and binary quantized indexes with exact search:
+recall@k and resident memory.
+
+    python benchmark.py --offline --pages 1 10 100 --output bench.json
+    python benchmark.py --offline --pages 1 10 100 --compare bench.json
+
+--offline replaces the embedding model and reader with small local stand-ins
+(a hashing encoder, a word tokenizer and a word-overlap reader), so the
+benchmark runs without network access or downloaded weights. Their timings
+measure the pipeline around the models, not the models themselves.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import zlib
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from create_sample_pdf import generate_pdf
+
+STAGES = ['extract_text', 'chunk_document', 'index_document', 'find_relevant_chunks', '_build_answer']
+
+
+# Offline stand-in models
+
+class HashingEncoder:
+    """Stands in for SentenceTransformer: normalized signed feature hashing of words"""
+
+    max_seq_length = 256
+    tokenizer = None  # Chunker falls back to whitespace token counts
+
+    def __init__(self, model_name=None, dimension=384, **kwargs):
+        self.model_name = model_name
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        from lexical_index import tokenize
+
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        matrix = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for token in tokenize(sentence):
+                digest = zlib.crc32(token.encode('utf-8'))
+                # A sign bit keeps vectors centred, like real embeddings
+                matrix[row, digest % self.dimension] += 1.0 if digest & 0x80000000 else -1.0
+        if normalize_embeddings:
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-9)
+        return matrix[0] if single else matrix
+
+
+class WordTokenizer:
+    """Stands in for the reader's fast tokenizer: one token per word or punctuation mark"""
+
+    TOKEN = re.compile(r'\w+|[^\w\s]')
+    CLS, SEP, PAD = 1, 2, 0
+    pad_token_id = PAD
+    model_input_names = ['input_ids', 'attention_mask']
+
+    @classmethod
+    def from_pretrained(cls, model_name=None, **kwargs):
+        return cls()
+
+    @staticmethod
+    def token_id(word):
+        return zlib.crc32(word.lower().encode('utf-8')) % 50000 + 3
+
+    def __call__(self, texts, return_offsets_mapping=False, **kwargs):
+        ids, offsets = [], []
+        for text in texts:
+            matches = list(self.TOKEN.finditer(text))
+            ids.append([self.token_id(m.group()) for m in matches])
+            offsets.append([m.span() for m in matches])
+        encoded = {'input_ids': ids}
+        if return_offsets_mapping:
+            encoded['offset_mapping'] = offsets
+        return encoded
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 3 if pair else 2
+
+    def build_inputs_with_special_tokens(self, first, second):
+        return [self.CLS] + list(first) + [self.SEP] + list(second) + [self.SEP]
+
+    def get_special_tokens_mask(self, first, second):
+        return [1] + [0] * len(first) + [1] + [0] * len(second) + [1]
+
+    def create_token_type_ids_from_sequences(self, first, second):
+        return [0] * (len(first) + 2) + [1] * (len(second) + 1)
+
+
+class OverlapModel:
+    """Stands in for a QA model on WordTokenizer ids: favours the sentence sharing most question words"""
+
+    SENTENCE_ENDS = {WordTokenizer.token_id(mark) for mark in '.!?'}
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        start_logits = np.full(input_ids.shape, -10.0, dtype=np.float32)
+        end_logits = np.full(input_ids.shape, -10.0, dtype=np.float32)
+        for row, ids in enumerate(input_ids.tolist()):
+            ids = ids[:int(attention_mask[row].sum())]
+            separator = ids.index(WordTokenizer.SEP)
+            wanted = set(ids[1:separator])
+            sentence_start = separator + 1
+            for position in range(separator + 1, len(ids) - 1):
+                if ids[position] in self.SENTENCE_ENDS or position == len(ids) - 2:
+                    sentence = ids[sentence_start:position + 1]
+                    overlap = len(wanted & set(sentence)) / max(len(wanted), 1)
+                    start_logits[row, sentence_start] = 10.0 * overlap
+                    end_logits[row, position] = 10.0 * overlap
+                    sentence_start = position + 1
+        return types.SimpleNamespace(start_logits=start_logits, end_logits=end_logits)
+
+
+class OverlapReader:
+    """Stands in for a question-answering pipeline: returns the sentence sharing most words"""
+
+    model = OverlapModel()
+
+    def _answer(self, question, context):
+        from lexical_index import tokenize
+        from chunker import SENTENCE
+
+        wanted = set(tokenize(question))
+        best = {'answer': '', 'score': 0.0, 'start': 0, 'end': 0}
+        for match in SENTENCE.finditer(context):
+            overlap = len(wanted & set(tokenize(match.group()))) / max(len(wanted), 1)
+            if overlap > best['score']:
+                best = {'answer': match.group(), 'score': overlap, 'start': match.start(), 'end': match.end()}
+        return best
+
+    def __call__(self, question, context, **kwargs):
+        if isinstance(question, (list, tuple)):
+            return [self._answer(q, c) for q, c in zip(question, context)]
+        return self._answer(question, context)
+
+
+def use_stand_in_models():
+    """Register the stand-ins in place of sentence_transformers and transformers"""
+    sentence_transformers = types.ModuleType('sentence_transformers')
+    sentence_transformers.SentenceTransformer = HashingEncoder
+    transformers = types.ModuleType('transformers')
+    transformers.pipeline = lambda task, model=None, **kwargs: OverlapReader()
+    transformers.AutoTokenizer = WordTokenizer
+    sys.modules['sentence_transformers'] = sentence_transformers
+    sys.modules['transformers'] = transformers
+
+
+# Measurement helpers
+
+def peak_rss_mb(who='self'):
+    """Peak resident set size in MB, or None where the resource module is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    target = resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN
+    peak = resource.getrusage(target).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_summary(seconds):
+    """Count, throughput and latency percentiles in milliseconds"""
+    if not seconds:
+        return {'count': 0}
+    values = np.asarray(seconds) * 1000.0
+    total = float(np.sum(seconds))
+    return {
+        'count': len(values),
+        'seconds': total,
+        'per_second': len(values) / total if total else None,
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p90_ms': float(np.percentile(values, 90)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=ROOT,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# Benchmark
+
+def run_size(qa_model, pages, seed, questions, repeat, workdir):
+    """Run every stage on one synthetic document; returns its result dict"""
+    from pdf_processor import PDFProcessor
+
+    path = os.path.join(workdir, f'synthetic-{pages}-{seed}.pdf')
+    facts = generate_pdf(path, pages, seed)
+    facts = facts[::max(1, len(facts) // questions)][:questions]
+    result = {'pages': pages, 'pdf_bytes': os.path.getsize(path), 'stages': {}}
+    stages = result['stages']
+
+    start = time.perf_counter()
+    extracted = PDFProcessor(path).extract_pages()
+    elapsed = time.perf_counter() - start
+    stages['extract_text'] = {
+        'seconds': elapsed,
+        'pages_per_second': pages / elapsed if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    start = time.perf_counter()
+    _, chunks = qa_model.chunk_document(extracted)
+    elapsed = time.perf_counter() - start
+    stages['chunk_document'] = {
+        'seconds': elapsed,
+        'chunks': len(chunks),
+        'chunks_per_second': len(chunks) / elapsed if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    start = time.perf_counter()
+    document = qa_model.index_document(extracted, filename=os.path.basename(path))
+    elapsed = time.perf_counter() - start
+    if document is None:
+        raise RuntimeError(f'indexing the {pages}-page document failed')
+    stages['index_document'] = {
+        'seconds': elapsed,
+        'chunks_per_second': len(document.chunks) / elapsed if elapsed else None,
+        'pages_per_second': pages / elapsed if elapsed else None,
+        'index_bytes': document.nbytes,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    retrieval, reading, hits = [], [], 0
+    answered_by = {}
+    for fact in facts:
+        for attempt in range(repeat):
+            start = time.perf_counter()
+            relevant = qa_model.find_relevant_chunks(fact['question'], doc_id=document.doc_id, top_k=5)
+            retrieval.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            record = qa_model._cascade([(fact['question'], relevant)])[0]
+            reading.append(time.perf_counter() - start)
+            answered_by[record['answered_by']] = answered_by.get(record['answered_by'], 0) + 1
+
+            if attempt == 0 and any(c['page_start'] <= fact['page'] <= c['page_end'] for c in relevant):
+                hits += 1
+
+    result['quantization'] = compare_quantization(qa_model, document, facts)
+
+    stages['find_relevant_chunks'] = dict(latency_summary(retrieval), peak_rss_mb=peak_rss_mb())
+    stages['_build_answer'] = dict(latency_summary(reading), peak_rss_mb=peak_rss_mb())
+    result['retrieval_hit_rate'] = hits / len(facts) if facts else None
+    result['answered_by'] = answered_by
+    result['peak_rss_mb'] = peak_rss_mb()
+    result['peak_rss_children_mb'] = peak_rss_mb('children')
+
+    qa_model.documents.remove(document.doc_id)
+    return result
+
+
+def compare_quantization(qa_model, document, facts, k=5):
+    """
+    Resident memory of the quantized backends, their recall@k against exact
+    search, and how often each backend's top k still covers the fact's page
+    """
+    from vector_index import create_index
+
+    vectors = np.ascontiguousarray(document.embeddings, dtype=np.float32)
+    queries = qa_model.encode_questions([fact['question'] for fact in facts])
+    pages = [(info['page_start'], info['page_end']) for info in document.chunk_info]
+    report = {'k': k, 'float32_bytes': int(vectors.nbytes)}
+
+    def covers(ids, page):
+        return any(pages[i][0] <= page <= pages[i][1] for i in ids)
+
+    truth = []
+    for backend in ('exact', 'int8', 'binary'):
+        index = create_index(backend, vectors.shape[1]).adopt(vectors)
+        found, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            found.append(set(index.search(query, k)[0].tolist()))
+            latencies.append(time.perf_counter() - start)
+        entry = {
+            'fact_hit_rate': float(np.mean([covers(ids, fact['page']) for ids, fact in zip(found, facts)])) if facts else None,
+            'search': latency_summary(latencies),
+        }
+        if backend == 'exact':
+            truth = found
+        else:
+            # Full-precision vectors stay on disk; only the codes are resident
+            resident = index.nbytes - vectors.nbytes
+            entry['recall_at_k'] = float(np.mean([
+                len(ids & expected) / max(len(expected), 1) for ids, expected in zip(found, truth)
+            ])) if facts else None
+            entry['resident_bytes'] = int(resident)
+            entry['memory_reduction'] = vectors.nbytes / resident if resident else None
+        report[backend] = entry
+    return report
+
+
+def compare(results, baseline_path):
+    """Print per-stage time ratios against an earlier results file"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {run['pages']: run for run in json.load(f)['runs']}
+
+    print(f"\nCompared with {baseline_path} (ratio > 1 is slower):")
+    for run in results['runs']:
+        old = baseline.get(run['pages'])
+        if old is None:
+            continue
+        for stage in STAGES:
+            new_stage, old_stage = run['stages'].get(stage, {}), old['stages'].get(stage, {})
+            key = 'p50_ms' if 'p50_ms' in new_stage else 'seconds'
+            if new_stage.get(key) and old_stage.get(key):
+                ratio = new_stage[key] / old_stage[key]
+                flag = '  ✗ regression' if ratio > 1.1 else ''
+                print(f"  {run['pages']:>5} pages  {stage:<22} {key:<8} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the PDF QA pipeline')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100], help='Document sizes (1-2000 pages)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic documents')
+    parser.add_argument('--questions', type=int, default=20, help='Planted-fact questions asked per document')
+    parser.add_argument('--repeat', type=int, default=3, help='Times each question is asked')
+    parser.add_argument('--offline', action='store_true', help='Use local stand-in models instead of downloading')
+    parser.add_argument('--output', help='Write JSON results to this path')
+    parser.add_argument('--compare', help='Compare with an earlier JSON results file')
+    args = parser.parse_args()
+
+    if args.offline:
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        use_stand_in_models()
+
+    from config import Config
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep runs independent of (and out of) the real embedding cache
+        Config.EMBEDDING_CACHE_DIR = os.path.join(workdir, 'embeddings')
+        Config.READER_WARM_UP = False
+
+        from advanced_qa_model import AdvancedQAModel
+
+        qa_model = AdvancedQAModel()
+        start = time.perf_counter()
+        if not qa_model.load_model():
+            sys.exit('✗ Could not load models (use --offline without network access)')
+        qa_model.reader.warm_up()
+        load_seconds = time.perf_counter() - start
+
+        results = {
+            'meta': {
+                'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'offline': args.offline,
+                'seed': args.seed,
+                'questions': args.questions,
+                'repeat': args.repeat,
+                'model_load_seconds': load_seconds,
+                'config': {
+                    'embedding_model': Config.EMBEDDING_MODEL_NAME,
+                    'reader_model': Config.READER_MODEL_NAME,
+                    'reader_backend': Config.READER_BACKEND,
+                    'vector_index_backend': Config.VECTOR_INDEX_BACKEND,
+                    'hybrid_retrieval': Config.HYBRID_RETRIEVAL,
+                    'chunk_overlap_tokens': Config.CHUNK_OVERLAP_TOKENS,
+                    'pdf_extract_workers': Config.PDF_EXTRACT_WORKERS,
+                },
+            },
+            'runs': [],
+        }
+
+        for pages in args.pages:
+            run = run_size(qa_model, pages, args.seed, args.questions, args.repeat, workdir)
+            results['runs'].append(run)
+
+            stages = run['stages']
+            print(f"\n📊 {pages} pages ({run['pdf_bytes'] / 1024:.0f} KB, {stages['chunk_document']['chunks']} chunks)")
+            for stage in STAGES[:3]:
+                print(f"  {stage:<22} {stages[stage]['seconds'] * 1000:10.1f} ms")
+            for stage in STAGES[3:]:
+                summary = stages[stage]
+                print(f"  {stage:<22} p50 {summary['p50_ms']:.2f} ms  p90 {summary['p90_ms']:.2f} ms  p99 {summary['p99_ms']:.2f} ms")
+            print(f"  retrieval hit rate     {run['retrieval_hit_rate']:.0%}")
+            print(f"  answered by            " + ', '.join(f"{stage} {count}" for stage, count in sorted(run['answered_by'].items())))
+            quantization = run['quantization']
+            for backend in ('int8', 'binary'):
+                quantized = quantization[backend]
+                print(f"  {backend:<6} recall@{quantization['k']}      {quantized['recall_at_k']:.0%} of exact,"
+                      f" fact found {quantized['fact_hit_rate']:.0%} (exact {quantization['exact']['fact_hit_rate']:.0%}),"
+                      f" {quantized['memory_reduction']:.1f}x less resident memory")
+            print(f"  peak RSS               {run['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
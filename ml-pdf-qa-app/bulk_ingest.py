@@ -0,0 +1,272 @@
+"""
+Offline bulk ingestion: pre-index a directory of PDFs into the on-disk cache.
+
+Onboarding an archive through /upload indexes one document at a time. This
+command walks a directory instead. A process pool hashes and extracts whole
+documents in parallel (one PDF per task, pages through PDFProcessor), while
+the main process chunks them with AdvancedQAModel.chunk_document and encodes
+the chunks of many documents together in large sentence_model.encode calls.
+Every finished document is written to the embedding cache the server loads,
+vector index included, so the server starts with it already searchable.
+
+A document's cache entry is only complete once its JSON sidecar is written,
+which happens last. Interrupting a run therefore loses at most the documents
+in flight, and running the same command again skips every PDF whose content
+is already indexed under the current model and chunking settings.
+
+    python bulk_ingest.py /data/archive
+    python bulk_ingest.py /data/archive --workers 8 --encode-chunks 8192
+
+Run it from the directory the server runs from (or pass --cache-dir) so
+both use the same cache. A running server picks the new documents up when
+it restarts, when it is asked about one by doc_id, or - with several worker
+processes - on the next /documents call.
+"""
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from document_store import IndexedDocument, hash_file
+from incremental import page_table
+
+
+# Worker processes
+
+_cache = None  # EmbeddingCache of the parent, to skip indexed documents before extracting them
+
+
+def _init_worker(cache):
+    global _cache
+    _cache = cache
+
+
+def _extract_document(path):
+    """Hash and extract one PDF; runs inside worker processes"""
+    from pdf_processor import PDFProcessor
+
+    start = time.perf_counter()
+    result = {'path': path, 'doc_id': None, 'skipped': False, 'error': None}
+    try:
+        result['doc_id'] = hash_file(path)
+        if _cache is not None and result['doc_id'] in _cache:
+            result['skipped'] = True
+            return result
+        processor = PDFProcessor(path, workers=1)
+        result['page_hashes'] = processor.page_hashes()
+        result['pages'] = processor.extract_pages()
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+# Main process
+
+def find_pdfs(root):
+    """Every .pdf file under root, in a stable order"""
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.pdf'):
+                paths.append(os.path.join(directory, name))
+    return paths
+
+
+class BulkIndexer:
+    """Chunks extracted documents and encodes them in batches that span documents"""
+
+    def __init__(self, qa_model, encode_chunks=4096, encode_batch_size=256):
+        self.qa_model = qa_model
+        self.encode_chunks = encode_chunks  # Chunks gathered before one encode call
+        self.encode_batch_size = encode_batch_size  # Batch size inside that call
+        self._pending = []  # Documents chunked but not yet encoded
+        self._pending_chunks = 0
+        self.documents = 0
+        self.pages = 0
+        self.chunks = 0
+        self.failed = []
+        self.encode_seconds = 0.0
+
+    def add(self, result):
+        """Chunk one extracted document; encodes once enough chunks are waiting"""
+        pages = [(number, text.strip()) for number, text in result['pages'] if text.strip()]
+        if not pages:
+            self.failed.append((result['path'], 'Could not extract text from PDF'))
+            return
+        try:
+            text, chunk_info = self.qa_model.chunk_document(pages)
+        except Exception as e:
+            self.failed.append((result['path'], f"Could not chunk document: {e}"))
+            return
+        chunks = [chunk.pop('text') for chunk in chunk_info]
+        if not chunks:
+            self.failed.append((result['path'], 'No chunks created from document'))
+            return
+
+        self._pending.append({
+            'doc_id': result['doc_id'],
+            'filename': os.path.basename(result['path']),
+            'path': result['path'],
+            'chunks': chunks,
+            'chunk_info': chunk_info,
+            'text_length': len(text),
+            'page_hashes': result['page_hashes'],
+            'page_offsets': page_table((number, len(page_text)) for number, page_text in pages),
+            'page_count': len(result['page_hashes']),
+        })
+        self._pending_chunks += len(chunks)
+        if self._pending_chunks >= self.encode_chunks:
+            self.flush()
+
+    def flush(self):
+        """Encode every waiting chunk in one call and write the documents to the cache"""
+        if not self._pending:
+            return
+        texts = [chunk for entry in self._pending for chunk in entry['chunks']]
+        start = time.perf_counter()
+        # Normalized so a dot product is the cosine similarity, as in index_document
+        embeddings = self.qa_model.sentence_model.encode(
+            texts,
+            batch_size=self.encode_batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+        self.encode_seconds += time.perf_counter() - start
+
+        offset = 0
+        for entry in self._pending:
+            count = len(entry['chunks'])
+            try:
+                self._save(entry, embeddings[offset:offset + count])
+                self.documents += 1
+                self.pages += entry['page_count']
+                self.chunks += count
+            except Exception as e:
+                self.failed.append((entry['path'], f"Could not write embedding cache: {e}"))
+            offset += count
+        self._pending = []
+        self._pending_chunks = 0
+
+    def _save(self, entry, embeddings):
+        index = self.qa_model._new_index(embeddings.shape[1], capacity=len(embeddings))
+        index.add(np.arange(len(embeddings)), embeddings)
+        index.finalize()
+        document = IndexedDocument(
+            entry['doc_id'],
+            entry['chunks'],
+            index,
+            filename=entry['filename'],
+            text_length=entry['text_length'],
+            chunk_info=entry['chunk_info'],
+            page_hashes=entry['page_hashes'],
+            page_offsets=entry['page_offsets'],
+            reader_tokens=self.qa_model._tokenize_chunks(entry['chunks'])
+        )
+        self.qa_model.save_document(document)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-index a directory of PDFs into the server\'s embedding cache')
+    parser.add_argument('directory', help='Directory searched recursively for .pdf files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Extraction processes')
+    parser.add_argument('--encode-chunks', type=int, default=4096, help='Chunks from many documents encoded per call')
+    parser.add_argument('--encode-batch-size', type=int, default=256, help='Batch size inside each encode call')
+    parser.add_argument('--cache-dir', help='Embedding cache to write (default: EMBEDDING_CACHE_DIR)')
+    parser.add_argument('--report-every', type=int, default=100, help='Print progress every this many documents')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    from config import Config
+
+    if args.cache_dir:
+        Config.EMBEDDING_CACHE_DIR = args.cache_dir
+    if not Config.EMBEDDING_CACHE_DIR:
+        parser.error('EMBEDDING_CACHE_DIR is disabled; pass --cache-dir')
+    Config.READER_WARM_UP = False  # Only the reader's tokenizer is needed
+
+    paths = find_pdfs(args.directory)
+    print(f"📚 {len(paths)} PDFs under {args.directory}")
+
+    from advanced_qa_model import AdvancedQAModel
+
+    qa_model = AdvancedQAModel()
+    if not qa_model.load_model(load_documents=False):
+        sys.exit(1)
+    indexer = BulkIndexer(qa_model, encode_chunks=args.encode_chunks, encode_batch_size=args.encode_batch_size)
+
+    start = time.perf_counter()
+    skipped = 0
+    seen = set()
+    interrupted = False
+
+    def report():
+        elapsed = time.perf_counter() - start
+        print(f"📥 {indexer.documents} indexed, {skipped} skipped, {len(indexer.failed)} failed - "
+              f"{indexer.documents / elapsed:.2f} docs/s, {indexer.pages / elapsed:.1f} pages/s")
+
+    # Spawned, not forked: this process holds model threads and locks
+    executor = ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(qa_model.embedding_cache,)
+    )
+    try:
+        # Only a few documents per worker are in flight, so memory stays flat on huge archives
+        remaining = iter(paths)
+        in_flight = set()
+        done_count = 0
+        while True:
+            while len(in_flight) < 4 * args.workers:
+                path = next(remaining, None)
+                if path is None:
+                    break
+                in_flight.add(executor.submit(_extract_document, path))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                if result['error'] is not None:
+                    indexer.failed.append((result['path'], result['error']))
+                elif result['skipped'] or result['doc_id'] in seen:
+                    skipped += 1  # Already indexed, or the same content under another name
+                else:
+                    seen.add(result['doc_id'])
+                    indexer.add(result)
+                done_count += 1
+                if done_count % args.report_every == 0:
+                    report()
+        indexer.flush()
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n✗ Interrupted; documents written so far are kept, run again to resume")
+        executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 {indexer.documents} documents ({indexer.pages} pages, {indexer.chunks} chunks) "
+          f"indexed in {elapsed:.1f}s")
+    print(f"  {indexer.documents / elapsed:.2f} docs/s, {indexer.pages / elapsed:.1f} pages/s "
+          f"({indexer.encode_seconds:.1f}s encoding)")
+    print(f"  {skipped} skipped (already indexed or duplicates), {len(indexer.failed)} failed")
+    for path, error in indexer.failed:
+        print(f"  ✗ {path}: {error}")
+    if interrupted:
+        sys.exit(130)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,61 +1,164 @@
 """
 Simple script to create a sample PDF for testing
+
+Without arguments it writes the three-line sample.pdf. With --pages it writes
+a seeded synthetic document instead: the same seed and page count always
+produce byte-identical output, and every page carries a planted fact
+("Component W-0417 operates at 512 rpm.") that benchmarks can ask about.
+
+    python create_sample_pdf.py --pages 500 --seed 7 --output corpus.pdf
 """
-try:
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter
-    
-    c = canvas.Canvas('sample.pdf', pagesize=letter)
-    c.drawString(100, 750, 'Sample PDF Document')
-    c.drawString(100, 730, 'This is a test PDF for the QA system.')
-    c.drawString(100, 710, 'You can ask questions about this document.')
-    c.save()
-    print('sample.pdf created successfully')
-except ImportError:
-    print('reportlab not installed. Using alternative method...')
-    # Create a minimal PDF manually
-    import os
-    pdf_content = b"""%PDF-1.4
-1 0 obj
-<< /Type /Catalog /Pages 2 0 R >>
-endobj
-2 0 obj
-<< /Type /Pages /Kids [3 0 R] /Count 1 >>
-endobj
-3 0 obj
-<< /Type /Page /Parent 2 0 R /Resources << /Font << /F1 4 0 R >> >> /MediaBox [0 0 612 792] /Contents 5 0 R >>
-endobj
-4 0 obj
-<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>
-endobj
-5 0 obj
-<< /Length 117 >>
-stream
-BT
-/F1 12 Tf
-100 750 Td
-(Sample PDF Document) Tj
-0 -20 Td
-(This is a test PDF for the QA system.) Tj
-0 -20 Td
-(You can ask questions about this document.) Tj
-ET
-endstream
-endobj
-xref
-0 6
-0000000000 65535 f 
-0000000009 00000 n 
-0000000058 00000 n 
-0000000115 00000 n 
-0000000244 00000 n 
-0000000333 00000 n 
-trailer
-<< /Size 6 /Root 1 0 R >>
-startxref
-500
-%%EOF
-"""
-    with open('sample.pdf', 'wb') as f:
-        f.write(pdf_content)
-    print('sample.pdf created successfully (minimal PDF)')
+import argparse
+import random
+
+SUBJECTS = [
+    'The maintenance team', 'The control unit', 'Each operator', 'The quarterly report',
+    'The safety board', 'The assembly line', 'The cooling system', 'The audit committee',
+    'The field engineer', 'The supply contract', 'The test bench', 'The warehouse',
+]
+VERBS = [
+    'reviews', 'monitors', 'records', 'replaces', 'inspects', 'schedules',
+    'approves', 'calibrates', 'documents', 'reports', 'verifies', 'adjusts',
+]
+OBJECTS = [
+    'the pressure readings', 'every shipment', 'the firmware version', 'the spare parts',
+    'the incident log', 'the hydraulic valves', 'the budget forecast', 'the wiring harness',
+    'the inspection checklist', 'the backup generator', 'the calibration data', 'the sensor array',
+]
+CLAUSES = [
+    'before each shift', 'at the end of the month', 'when an alarm is raised',
+    'according to the manual', 'during the annual shutdown', 'after every repair',
+    'unless a supervisor objects', 'within two working days', 'as required by the regulator',
+]
+UNITS = ['rpm', 'volts', 'bar', 'degrees Celsius', 'litres per minute', 'kilograms']
+
+CHARS_PER_LINE = 90
+
+
+def _sentence(rng):
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(CLAUSES)}."
+
+
+def _wrap(text, width):
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_stream(lines):
+    parts = ['BT', '/F1 10 Tf', '12 TL', '56 750 Td']
+    for line in lines:
+        parts.append(f"({_escape(line)}) Tj T*")
+    parts.append('ET')
+    return '\n'.join(parts).encode('latin-1')
+
+
+def synthetic_pages(pages, seed=0):
+    """
+    Seeded page texts and planted facts.
+    Returns (page_lines, facts); facts are dicts with page, question and answer.
+    """
+    rng = random.Random(seed)
+    page_lines, facts = [], []
+    for number in range(1, pages + 1):
+        component = f"W-{number:04d}"
+        value = rng.randint(10, 999)
+        unit = rng.choice(UNITS)
+        fact = f"Component {component} operates at {value} {unit}."
+        facts.append({
+            'page': number,
+            'question': f"At what level does component {component} operate?",
+            'answer': f"{value} {unit}",
+        })
+
+        sentences = [_sentence(rng) for _ in range(36)]
+        sentences.insert(rng.randrange(len(sentences) + 1), fact)
+        lines = [f"Section {number}"] + _wrap(' '.join(sentences), CHARS_PER_LINE)
+        page_lines.append(lines)
+    return page_lines, facts
+
+
+def write_pdf(path, page_lines):
+    """Write a minimal PDF with one Helvetica text page per list of lines"""
+    count = len(page_lines)
+    page_ids = [4 + 2 * i for i in range(count)]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {count} >>".encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page_id, lines in zip(page_ids, page_lines):
+        stream = _page_stream(lines)
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /Resources << /Font << /F1 3 0 R >> >> "
+            f"/MediaBox [0 0 612 792] /Contents {page_id + 1} 0 R >>"
+        ).encode()
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number in range(1, len(objects) + 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, objects[number]))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def generate_pdf(path, pages, seed=0):
+    """Write a seeded synthetic PDF of 1 to 2000 pages; returns its planted facts"""
+    if not 1 <= pages <= 2000:
+        raise ValueError('pages must be between 1 and 2000')
+    page_lines, facts = synthetic_pages(pages, seed)
+    write_pdf(path, page_lines)
+    return facts
+
+
+def create_sample_pdf(path='sample.pdf'):
+    try:
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import letter
+
+        c = canvas.Canvas(path, pagesize=letter)
+        c.drawString(100, 750, 'Sample PDF Document')
+        c.drawString(100, 730, 'This is a test PDF for the QA system.')
+        c.drawString(100, 710, 'You can ask questions about this document.')
+        c.save()
+        print(f'{path} created successfully')
+    except ImportError:
+        print('reportlab not installed. Using alternative method...')
+        # Create a minimal PDF manually
+        write_pdf(path, [[
+            'Sample PDF Document',
+            'This is a test PDF for the QA system.',
+            'You can ask questions about this document.',
+        ]])
+        print(f'{path} created successfully (minimal PDF)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create a sample or synthetic PDF')
+    parser.add_argument('--pages', type=int, help='Write a synthetic document with this many pages (1-2000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for synthetic text')
+    parser.add_argument('--output', default='sample.pdf', help='Output path')
+    args = parser.parse_args()
+
+    if args.pages is None:
+        create_sample_pdf(args.output)
+    else:
+        facts = generate_pdf(args.output, args.pages, args.seed)
+        print(f'{args.output} created successfully ({args.pages} pages, {len(facts)} facts, seed {args.seed})')
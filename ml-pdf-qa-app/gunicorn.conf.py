@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for serving the app with several worker processes.
+
+    gunicorn -c gunicorn.conf.py --chdir src main:app
+
+The app is imported once in the master (preload_app), so the embedding model
+and the readers are loaded before the workers are forked and their weights
+are shared copy-on-write. Documents are shared through the memory-mapped
+embedding cache, so one indexed by any worker can be queried from all of them.
+"""
+import gc
+import os
+
+# Read by config.py when the app is imported
+os.environ.setdefault('PDFQA_MULTIPROCESS', '1')
+
+bind = os.environ.get('PDFQA_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+# Request threads per worker; questions are micro-batched across them. Enough
+# threads that admission control (ASK_MAX_CONCURRENT + ASK_MAX_QUEUED), not the
+# socket backlog, queues and sheds requests
+threads = int(os.environ.get('PDFQA_THREADS', '64'))
+preload_app = True
+timeout = 120  # Indexing runs in the background, but a cold reader can take a while
+
+
+def pre_fork(server, worker):
+    # Keep the loaded objects out of the collector, so its bookkeeping writes
+    # do not copy their pages into every worker
+    gc.freeze()
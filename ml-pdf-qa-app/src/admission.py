@@ -0,0 +1,218 @@
+"""
+Admission control, backpressure and per-request deadlines.
+
+Question answering and ingestion compete for the same CPU-bound encoder and
+reader. Question requests pass through an AdmissionController: a bounded
+number run at once, a bounded number wait for a slot, and a request that
+cannot start in time is shed straight away - 429 when the queue is full, 503
+when it waited too long - with a Retry-After estimate, instead of piling up
+until every request times out. Ingestion has its own, separate limits in
+IngestionQueue.
+
+Every question request also carries a Deadline. It is bound to the request
+thread with deadline_scope(), travels into micro-batches alongside the
+trace, and the pipeline calls check_deadline() between stages, so retrieval
+and reader work is abandoned once the client's budget is spent.
+"""
+
+from collections import Counter
+import math
+import threading
+import time
+
+
+class Overloaded(Exception):
+    """A request shed by admission control; status is 429 or 503"""
+
+    def __init__(self, message, status=503, retry_after=1, reason=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after  # Seconds, for the Retry-After header
+        self.reason = reason
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before a pipeline stage could start"""
+
+    def __init__(self, stage):
+        super().__init__(f"Request deadline exceeded before {stage}")
+        self.stage = stage
+
+
+_expired = Counter()  # stage -> requests whose deadline passed before it
+_expired_lock = threading.Lock()
+
+
+def _exceeded(stage):
+    with _expired_lock:
+        _expired[stage] += 1
+    return DeadlineExceeded(stage)
+
+
+def deadline_stats():
+    """Requests abandoned per stage because their deadline had passed"""
+    with _expired_lock:
+        return dict(_expired)
+
+
+class Deadline:
+    """Point in time by which a request must be answered"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage):
+        """Raise DeadlineExceeded if the deadline passed before this stage"""
+        if self.expired:
+            raise _exceeded(stage)
+
+    def exceeded(self, stage):
+        """DeadlineExceeded to raise when work was cut short at this stage"""
+        return _exceeded(stage)
+
+
+_local = threading.local()
+
+
+def current_deadline():
+    """Deadline bound to the calling thread, or None"""
+    return getattr(_local, 'deadline', None)
+
+
+class deadline_scope:
+    """Bind a deadline (or None) to the calling thread for the duration of a block"""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = current_deadline()
+        _local.deadline = self.deadline
+        return self.deadline
+
+    def __exit__(self, *exc):
+        _local.deadline = self.previous
+        return False
+
+
+def check_deadline(stage):
+    """Raise DeadlineExceeded if the calling thread's deadline has passed"""
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+class Slot:
+    """An admitted request; release() frees its slot, once"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.start = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(time.monotonic() - self.start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    """Bounded concurrency plus a bounded, deadline-aware wait queue"""
+
+    def __init__(self, name, max_active=16, max_queued=64, max_wait=2.0):
+        self.name = name
+        self.max_active = max(1, int(max_active))
+        self.max_queued = max(0, int(max_queued))
+        self.max_wait = max_wait  # Longest time a request may wait for a slot
+
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = Counter()  # reason -> requests shed
+        self.wait_seconds = 0.0
+        self.service_seconds = 0.0
+        self.completed = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, deadline=None):
+        """
+        Wait for a slot and return it, or raise Overloaded: at once when the
+        queue is full (429), or once the request has waited max_wait or
+        its deadline has passed (503)
+        """
+        start = time.monotonic()
+        with self._condition:
+            if self.active >= self.max_active:
+                if self.queued >= self.max_queued:
+                    raise self._reject('queue_full', 429, f"Too many {self.name} requests queued")
+                wait = self.max_wait if deadline is None else min(self.max_wait, deadline.remaining())
+                self.queued += 1
+                try:
+                    while self.active >= self.max_active:
+                        remaining = start + wait - time.monotonic()
+                        if remaining <= 0:
+                            reason = 'deadline' if deadline is not None and deadline.expired else 'queue_timeout'
+                            raise self._reject(reason, 503, f"Timed out waiting for a {self.name} slot")
+                        self._condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.active += 1
+            self.admitted += 1
+            self.wait_seconds += time.monotonic() - start
+        return Slot(self)
+
+    def admit(self, deadline=None):
+        """Context manager holding a slot for a block; see acquire()"""
+        return self.acquire(deadline)
+
+    def _release(self, seconds):
+        with self._condition:
+            self.active -= 1
+            self.completed += 1
+            self.service_seconds += seconds
+            self._condition.notify()
+
+    def _reject(self, reason, status, message):
+        # Called with the condition held
+        self.rejected[reason] += 1
+        return Overloaded(message, status=status, retry_after=self._retry_after(), reason=reason)
+
+    def _retry_after(self):
+        """Seconds until the current queue has likely drained, from the mean service time"""
+        mean = self.service_seconds / self.completed if self.completed else 1.0
+        return min(60, max(1, math.ceil(mean * (self.queued + 1) / self.max_active)))
+
+    def retry_after(self):
+        with self._condition:
+            return self._retry_after()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'name': self.name,
+                'active': self.active,
+                'queued': self.queued,
+                'max_active': self.max_active,
+                'max_queued': self.max_queued,
+                'max_wait_seconds': self.max_wait,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'avg_wait_seconds': self.wait_seconds / self.admitted if self.admitted else 0.0,
+                'avg_service_seconds': self.service_seconds / self.completed if self.completed else 0.0,
+            }
@@ -4,221 +4,1136 @@ This model provides more descriptive and accurate answers by finding relevant
 passages using semantic similarity rather than just keyword matching.
 """
 
-from sentence_transformers import SentenceTransformer, util
-import torch
-import re
+from document_store import DocumentStore, IndexedDocument, hash_bytes
+from incremental import ReindexPlan, page_table
+from embedding_cache import EmbeddingCache
+from chunker import TokenChunker
+from vector_index import create_index, load_index
+from lexical_index import BM25Index, HybridRanker
+from answer_cache import AnswerCache
+from admission import DeadlineExceeded, check_deadline
+from reranker import CrossEncoderReranker
+from reader_tokens import ChunkTokens
+from tracing import tracer
+from reader_pool import get_reader_pool
+from config import Config
+from collections import Counter
+from fnmatch import fnmatch
+from itertools import islice
+import heapq
+import numpy as np
+import threading
+import time
+import os
 
 class AdvancedQAModel:
+    # Model loading stages, in order, as reported by load_progress()
+    LOAD_STAGES = ['not_started', 'importing', 'loading_embedding_model', 'loading_reranker',
+                   'loading_cached_documents', 'ready']
+
     def __init__(self, model_path=None):
         self.model_path = model_path
         self.sentence_model = None
-        self.document_embeddings = None
-        self.document_chunks = []
+        self.documents = DocumentStore(
+            max_documents=Config.MAX_INDEXED_DOCUMENTS,
+            max_bytes=Config.MAX_INDEX_BYTES
+        )
+        self.embedding_cache = None
+        self.ranker = HybridRanker(
+            alpha=Config.HYBRID_ALPHA,
+            decisive_ratio=Config.LEXICAL_DECISIVE_RATIO,
+            decisive_min_score=Config.LEXICAL_DECISIVE_MIN_SCORE,
+            decisive_max_hits=Config.LEXICAL_DECISIVE_MAX_HITS
+        )
+        self.answer_cache = AnswerCache(
+            max_entries=Config.ANSWER_CACHE_SIZE,
+            ttl=Config.ANSWER_CACHE_TTL,
+            similarity_threshold=Config.ANSWER_CACHE_SIMILARITY
+        )
+        self.reader = None
+        self.reranker = None
+        self.cascade_counts = Counter()  # answered_by stage -> answers
+        self._cascade_lock = threading.Lock()
         self.loaded = False
+        self.catalog = {}  # doc_id -> metadata of every document in the on-disk cache, loaded or not
+        self._catalog_keys = set()  # Cache keys whose sidecar has been read
+        
+        self.load_stage = 'not_started'
+        self.load_error = None
+        self.reader_state = 'not_loaded'
+        self._load_started = None
+        self._load_seconds = None
+        self._load_thread = None
+        self._load_lock = threading.Lock()
+        self._load_finished = threading.Event()
+
+    def start_loading(self):
+        """Load the models on a background thread so the server can start serving at once"""
+        with self._load_lock:
+            if self._load_thread is None:
+                self._load_thread = threading.Thread(target=self.load_model, name='model-loader', daemon=True)
+                self._load_thread.start()
+        return self._load_thread
+
+    def wait_until_loaded(self, timeout=None):
+        """Block until loading finished; True if the models are usable"""
+        self._load_finished.wait(timeout)
+        return self.loaded
+
+    def _enter_load_stage(self, stage):
+        self.load_stage = stage
+        if self._load_started is None:
+            self._load_started = time.perf_counter()
+        if stage in ('ready', 'failed'):
+            self._load_seconds = time.perf_counter() - self._load_started
 
-    def load_model(self):
-        """Load the sentence transformer model for semantic search"""
+    @property
+    def ready(self):
+        """Models loaded, cached documents registered and the reader warmed up"""
+        return self.load_stage == 'ready' and self.reader_state in ('ready', 'disabled')
+
+    def load_progress(self):
+        """Loading stage and progress, for the health and readiness probes"""
+        if self.load_stage in self.LOAD_STAGES:
+            progress = self.LOAD_STAGES.index(self.load_stage) / (len(self.LOAD_STAGES) - 1)
+        else:
+            progress = 0.0
+        elapsed = self._load_seconds
+        if elapsed is None and self._load_started is not None:
+            elapsed = time.perf_counter() - self._load_started
+        return {
+            'stage': self.load_stage,
+            'progress': progress,
+            'loaded': self.loaded,
+            'ready': self.ready,
+            'reader': self.reader_state,
+            'documents': len(self.documents),
+            'elapsed_seconds': elapsed,
+            'error': self.load_error,
+        }
+
+    def load_model(self, preload=False, load_documents=True):
+        """
+        Load the sentence transformer model for semantic search.
+        preload: also load every reader instance on this thread, so forked
+        worker processes inherit them (copy-on-write) instead of loading their own
+        load_documents: register the documents in the on-disk cache
+        """
         try:
+            # Imported here: torch and sentence_transformers take seconds to import
+            self._enter_load_stage('importing')
+            from sentence_transformers import SentenceTransformer
+            
             # Using a lightweight but effective model
-            self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self._enter_load_stage('loading_embedding_model')
+            self.sentence_model = SentenceTransformer(Config.EMBEDDING_MODEL_NAME)
             print("✓ Semantic Search Model loaded successfully!")
+            
+            if Config.RERANKER_ENABLED:
+                self._enter_load_stage('loading_reranker')
+                self.reranker = CrossEncoderReranker(Config.RERANKER_MODEL_NAME)
+
+            if Config.EMBEDDING_CACHE_DIR:
+                self.embedding_cache = EmbeddingCache(
+                    Config.EMBEDDING_CACHE_DIR,
+                    Config.EMBEDDING_MODEL_NAME,
+                    {
+                        'max_tokens': self._chunker().max_tokens,
+                        'overlap_tokens': Config.CHUNK_OVERLAP_TOKENS
+                    },
+                    dtype=Config.EMBEDDING_CACHE_DTYPE
+                )
+
+            # The reader is shared process-wide and loaded on first use
+            self.reader = get_reader_pool(Config.READER_MODEL_NAME)
+            if preload:
+                self.reader_state = 'warming'
+                self._warm_up_reader(instances=self.reader.size)
+            elif Config.READER_WARM_UP:
+                self.reader_state = 'warming'
+                threading.Thread(target=self._warm_up_reader, daemon=True).start()
+            else:
+                self.reader_state = 'disabled'
+
             self.loaded = True
+            if load_documents:
+                self._enter_load_stage('loading_cached_documents')
+                self.load_cached_documents()
+            self._enter_load_stage('ready')
             return True
         except Exception as e:
             print(f"✗ Error loading model: {e}")
             self.loaded = False
+            self.load_error = str(e)
+            self._enter_load_stage('failed')
             return False
+        finally:
+            self._load_finished.set()
 
-    def chunk_document(self, text, chunk_size=200, overlap=50):
+    def load_cached_documents(self, only_new=False):
         """
-        Split document into overlapping chunks for better context preservation
-        chunk_size: approximate number of words per chunk
-        overlap: number of overlapping words between chunks
+        Register the documents in the on-disk cache from their metadata alone.
+        Their chunks, embeddings and vector index are loaded the first time
+        one is asked for (get_document), so startup does not grow with the cache.
+        only_new: only read the sidecars of entries not seen before, to pick
+        up documents indexed by other worker processes
         """
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        if self.embedding_cache is None:
+            return 0
         
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for sentence in sentences:
-            words = sentence.split()
-            current_size += len(words)
-            current_chunk.append(sentence)
-            
-            if current_size >= chunk_size:
-                # Join chunk and save
-                chunk_text = ' '.join(current_chunk).strip()
-                if chunk_text:
-                    chunks.append(chunk_text)
-                
-                # Keep overlap - remove oldest sentences but keep recent ones
-                overlap_size = 0
-                new_chunk = []
-                for sent in reversed(current_chunk):
-                    overlap_size += len(sent.split())
-                    new_chunk.insert(0, sent)
-                    if overlap_size >= overlap:
-                        break
-                
-                current_chunk = new_chunk
-                current_size = overlap_size
+        if not only_new:
+            self._catalog_keys = set()
+        count = 0
+        for _, meta in self.embedding_cache.catalog(known=self._catalog_keys):
+            self._register(meta)
+            count += 1
+        if count:
+            print(f"💾 Registered {count} cached documents")
+        return count
+
+    def _register(self, meta):
+        """Remember a cached document's metadata, for listings and corpus filters"""
+        self._catalog_keys.add(self.embedding_cache.key(meta['doc_id']))
+        self.catalog[meta['doc_id']] = {
+            'doc_id': meta['doc_id'],
+            'filename': meta.get('filename'),
+            'text_length': meta.get('text_length', 0),
+            'chunks': meta.get('chunk_count', 0),
+            'created_at': meta.get('created_at', 0),
+        }
+
+    def _new_index(self, dimension, capacity=0, dtype=np.float32):
+        backend = Config.VECTOR_INDEX_BACKEND
+        params = Config.VECTOR_INDEX_PARAMS.get(backend, {})
+        return create_index(backend, dimension, capacity=capacity, dtype=dtype, **params)
+
+    def _index_from_cache(self, doc_id, embeddings):
+        """Vector index over memory-mapped embeddings, reusing a persisted graph if there is one"""
+        backend = Config.VECTOR_INDEX_BACKEND
+        if backend == 'exact':
+            return self._new_index(embeddings.shape[1], dtype=embeddings.dtype).adopt(embeddings)
         
-        # Add remaining text as final chunk
-        if current_chunk:
-            chunk_text = ' '.join(current_chunk).strip()
-            if chunk_text:
-                chunks.append(chunk_text)
+        index_path = self.embedding_cache.index_path(doc_id, backend)
+        if os.path.exists(index_path):
+            try:
+                params = Config.VECTOR_INDEX_PARAMS.get(backend, {})
+                return load_index(index_path, vectors=embeddings, **params)
+            except Exception as e:
+                print(f"✗ Rebuilding unreadable vector index {index_path}: {e}")
         
-        return chunks
+        index = self._new_index(embeddings.shape[1], dtype=embeddings.dtype).adopt(embeddings)
+        index.save(index_path, include_vectors=False)
+        return index
+
+    def _document_from_cache(self, meta, embeddings):
+        return IndexedDocument(
+            meta['doc_id'],
+            meta['chunks'],
+            self._index_from_cache(meta['doc_id'], embeddings),
+            filename=meta.get('filename'),
+            text_length=meta.get('text_length', 0),
+            chunk_info=meta.get('chunk_info'),
+            page_hashes=meta.get('page_hashes'),
+            page_offsets=meta.get('page_offsets'),
+            created_at=meta.get('created_at'),
+            reader_tokens=self._cached_reader_tokens(meta),
+            lexical=meta['lexical']
+        )
+
+    @staticmethod
+    def _cached_reader_tokens(meta):
+        """Cached reader tokens, unless they were made with another reader's tokenizer"""
+        if meta.get('reader_tokenizer') != Config.READER_MODEL_NAME:
+            return None
+        return meta.get('reader_tokens')
+
+    def _warm_up_reader(self, instances=1):
+        try:
+            self.reader.warm_up(instances)
+            self.reader_state = 'ready'
+        except Exception as e:
+            self.reader_state = 'failed'
+            print(f"✗ Reader warm-up failed: {e}")
+
+    def _chunker(self, max_tokens=None, overlap_tokens=None):
+        tokenizer = getattr(self.sentence_model, 'tokenizer', None)
+        if max_tokens is None:
+            max_tokens = Config.CHUNK_MAX_TOKENS
+        if max_tokens is None:
+            # Leave room for the [CLS]/[SEP] tokens the model adds
+            max_tokens = (getattr(self.sentence_model, 'max_seq_length', None) or 256) - 2
+        if overlap_tokens is None:
+            overlap_tokens = Config.CHUNK_OVERLAP_TOKENS
+        return TokenChunker(tokenizer, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+    def chunk_document(self, pages, max_tokens=None, overlap_tokens=None):
+        """
+        Split a document into overlapping chunks that fit the embedding model.
+        pages: list of (page_number, text) pairs, or a plain string
+        max_tokens: token budget per chunk, defaults to the model's max sequence length
+        overlap_tokens: tokens shared between consecutive chunks
+        Returns (document_text, chunks); each chunk is a dict with text,
+        character offsets (start, end), page_start, page_end and tokens.
+        """
+        if isinstance(pages, str):
+            pages = [(1, pages)]
+        with tracer.span('chunking'):
+            return self._chunker(max_tokens, overlap_tokens).chunk(pages)
 
-    def index_document(self, text):
+    def index_document(self, pages, doc_id=None, filename=None, progress=None,
+                       page_hashes=None, plan=None):
         """
-        Process and index the document for semantic search
+        Process and index the document for semantic search.
+        pages: list of (page_number, text) pairs, or a plain string.
+        page_hashes: content hash of every PDF page, kept for later revisions.
+        plan: ReindexPlan against an earlier revision; pages then only holds
+        the pages it asked for, and the kept chunks reuse their embeddings.
+        Chunks are encoded in batches and become searchable as each batch
+        finishes; progress(encoded, total) is called after every batch.
+        Returns the IndexedDocument, or None if the text could not be indexed.
         """
         if not self.loaded:
-            return False
+            return None
         
+        document = None
         try:
-            # Clean the text
-            text = text.strip()
-            if not text:
-                return False
+            if isinstance(pages, str):
+                pages = [(1, pages)]
+            pages = [(number, text.strip()) for number, text in pages if text.strip()]
+            
+            reused = None
+            if plan is not None:
+                # Keep the unchanged chunks and chunk only the re-extracted pages
+                with tracer.span('chunking'):
+                    page_offsets, chunks, chunk_info, reused = plan.splice(pages, self._chunker().chunk)
+                text_length = page_offsets[-1][1] + page_offsets[-1][2] if page_offsets else 0
+            else:
+                if not pages:
+                    return None
+                
+                # Split into chunks that fit the embedding model
+                text, chunk_info = self.chunk_document(pages)
+                chunks = [chunk.pop('text') for chunk in chunk_info]
+                page_offsets = page_table((number, len(page_text)) for number, page_text in pages)
+                text_length = len(text)
+                
+                if doc_id is None:
+                    doc_id = hash_bytes(text.encode('utf-8'))
             
-            # Split into meaningful chunks
-            self.document_chunks = self.chunk_document(text, chunk_size=300, overlap=100)
+            # Answers about an earlier version of this document are stale
+            self.answer_cache.invalidate(doc_id)
             
-            if not self.document_chunks:
+            if not chunks:
                 print("Warning: No chunks created from document")
-                return False
+                return None
             
-            print(f"📚 Document indexed into {len(self.document_chunks)} chunks")
+            if plan is not None:
+                print(f"📚 Document indexed into {len(chunks)} chunks "
+                      f"({plan.chunks_reused} reused from {plan.previous.doc_id[:12]})")
+            else:
+                print(f"📚 Document indexed into {len(chunks)} chunks")
             
-            # Encode all chunks
-            self.document_embeddings = self.sentence_model.encode(
-                self.document_chunks,
-                convert_to_tensor=True,
-                show_progress_bar=False
+            reader_tokens = self._tokenize_chunks(
+                chunks, reused, plan.previous.reader_tokens if plan is not None else None
             )
             
-            return True
+            dimension = self.sentence_model.get_sentence_embedding_dimension()
+            document = IndexedDocument(
+                doc_id,
+                chunks,
+                self._new_index(dimension, capacity=len(chunks)),
+                filename=filename,
+                text_length=text_length,
+                chunk_info=chunk_info,
+                page_hashes=page_hashes,
+                page_offsets=page_offsets,
+                reader_tokens=reader_tokens,
+                lexical=BM25Index(chunks)
+            )
+            self.documents.put(document)
+            
+            if reused is None:
+                self._encode_chunks(document, progress=progress)
+            else:
+                self._encode_chunks(document, reused, plan.previous.embeddings, progress=progress)
+            
+            if self.embedding_cache is not None:
+                try:
+                    # Serve from the cache files from now on: the OS shares their
+                    # pages between worker processes and only the codes or graph
+                    # of an approximate index stay on the heap
+                    cached = self.save_document(document)
+                    if cached is not None:
+                        meta, embeddings = cached
+                        document.index.attach_vectors(embeddings)
+                        document.chunks = meta['chunks']
+                        document.chunk_info = meta['chunk_info']
+                        document.reader_tokens = self._cached_reader_tokens(meta)
+                        document.lexical = meta['lexical']
+                except Exception as e:
+                    print(f"✗ Could not write embedding cache: {e}")
+            
+            self.documents.update_size(doc_id)
+            return document
         except Exception as e:
             print(f"Error indexing document: {e}")
-            return False
+            if document is not None:
+                self.documents.remove(document.doc_id)
+            return None
+
+    def save_document(self, document):
+        """
+        Write a fully encoded document, with its vector index, to the on-disk
+        cache the server loads. Returns the cached (metadata, memory-mapped
+        embeddings), or None when the cache is disabled.
+        """
+        if self.embedding_cache is None:
+            return None
+        self.embedding_cache.save(
+            document.doc_id,
+            document.chunks,
+            document.embeddings,
+            filename=document.filename,
+            text_length=document.text_length,
+            chunk_info=document.chunk_info,
+            reader_tokens=document.reader_tokens,
+            reader_tokenizer=Config.READER_MODEL_NAME,
+            lexical=document.lexical,
+            page_hashes=document.page_hashes,
+            page_offsets=document.page_offsets,
+            created_at=document.created_at
+        )
+        if Config.VECTOR_INDEX_BACKEND != 'exact':
+            document.index.save(
+                self.embedding_cache.index_path(document.doc_id, Config.VECTOR_INDEX_BACKEND),
+                include_vectors=False
+            )
+        cached = self.embedding_cache.load(document.doc_id)
+        if cached is not None:
+            self._register(cached[0])
+        return cached
+
+    def _tokenize_chunks(self, chunks, reused=None, previous_tokens=None):
+        """
+        ChunkTokens of the chunks under the reader's tokenizer, reusing the
+        tokens of kept chunks; None if the tokenizer is unavailable, in which
+        case the reader tokenizes chunks when it reads them.
+        """
+        try:
+            with tracer.span('tokenization'):
+                tokenized = [None] * len(chunks)
+                if reused is not None and previous_tokens is not None:
+                    for i, position in enumerate(reused):
+                        if position is not None:
+                            tokenized[i] = previous_tokens[position]
+                pending = [i for i in range(len(chunks)) if tokenized[i] is None]
+                for i, tokens in zip(pending, self.reader.tokenize([chunks[i] for i in pending])):
+                    tokenized[i] = tokens
+                return ChunkTokens.from_chunks(tokenized)
+        except Exception as e:
+            print(f"✗ Could not tokenize chunks for the reader: {e}")
+            return None
+
+    def _encode_chunks(self, document, reused=None, previous_embeddings=None, progress=None):
+        """
+        Encode a document's chunks in batches and add them to its index in chunk order.
+        reused[i], when given, is the row of chunk i in previous_embeddings, or
+        None if the chunk is new and has to be encoded.
+        """
+        chunks = document.chunks
+        pending = [i for i in range(len(chunks)) if reused is None or reused[i] is None]
+        batch_size = Config.ENCODE_BATCH_SIZE
+        
+        # Encode chunks in batches; normalized so a dot product is the cosine similarity
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)] or [[]]
+        added = 0
+        for number, batch in enumerate(batches):
+            vectors = None
+            if batch:
+                with tracer.span('encoding'):
+                    vectors = self.sentence_model.encode(
+                        [chunks[i] for i in batch],
+                        batch_size=batch_size,
+                        convert_to_numpy=True,
+                        normalize_embeddings=True,
+                        show_progress_bar=False
+                    )
+            
+            # Reused chunks before the end of a batch go in with it; the last batch takes the rest
+            stop = len(chunks) if number == len(batches) - 1 else batch[-1] + 1
+            ids = np.arange(added, stop)
+            if reused is None:
+                rows = vectors
+            else:
+                rows = np.empty((len(ids), document.index.dimension), dtype=np.float32)
+                is_new = np.array([reused[i] is None for i in ids], dtype=bool)
+                if vectors is not None:
+                    rows[is_new] = vectors
+                if not is_new.all():
+                    rows[~is_new] = previous_embeddings[[reused[i] for i in ids[~is_new]]]
+            document.index.add(ids, rows)
+            added = stop
+            if progress:
+                progress(document.indexed_count, len(chunks))
+        # Backends that cluster the vectors train on the complete document
+        document.index.finalize()
 
-    def find_relevant_chunks(self, question, top_k=5):
+    def plan_reindex(self, previous_doc_id, page_hashes):
+        """ReindexPlan reusing an earlier revision of a document, or None if it has no page hashes"""
+        previous = self.get_document(previous_doc_id) if previous_doc_id else None
+        if previous is None or not previous.is_complete or not previous.page_hashes:
+            return None
+        return ReindexPlan(previous, page_hashes)
+
+    def find_previous_version(self, filename, doc_id=None):
+        """doc_id of the most recently indexed other document with this filename, or None"""
+        if self.embedding_cache is not None:
+            # Fully indexed documents, whichever worker process indexed them
+            return self.embedding_cache.find_by_filename(filename, exclude=doc_id)
+        
+        best = None
+        for document in self.documents.documents():
+            if document.filename == filename and document.doc_id != doc_id:
+                if best is None or document.created_at > best[0]:
+                    best = (document.created_at, document.doc_id)
+        return best[1] if best else None
+
+    def get_document(self, doc_id=None):
+        """Look up an indexed document, defaulting to the most recently used one"""
+        if not doc_id:
+            document = self.documents.latest()
+            if document is not None or not self.catalog:
+                return document
+            # Nothing loaded yet: the most recently indexed cached document
+            doc_id = max(list(self.catalog.values()), key=lambda meta: meta['created_at'])['doc_id']
+        
+        document = self.documents.get(doc_id)
+        if document is None and self.embedding_cache is not None:
+            # Evicted or indexed by an earlier process: reload from disk
+            cached = self.embedding_cache.load(doc_id)
+            if cached is not None:
+                self._register(cached[0])
+                document = self.documents.put(self._document_from_cache(*cached))
+        return document
+
+    def encode_questions(self, questions):
+        """Encode questions in one batch; rows are normalized float32 vectors"""
+        with tracer.span('encoding'):
+            return self.sentence_model.encode(
+                list(questions),
+                batch_size=max(1, len(questions)),
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            ).astype(np.float32)
+
+    def find_relevant_chunks(self, question, doc_id=None, top_k=5, question_embedding=None):
         """
-        Find the most relevant chunks using semantic similarity
+        Find the most relevant chunks by fusing semantic similarity with BM25.
+        Pass question_embedding to reuse a vector from encode_questions().
         """
-        if not self.loaded or self.document_embeddings is None:
+        document = self.get_document(doc_id)
+        if not self.loaded or document is None:
+            return []
+        
+        if document.indexed_count == 0:
             return []
         
         try:
-            # Encode the question
-            question_embedding = self.sentence_model.encode(question, convert_to_tensor=True)
-            
-            # Find similar chunks
-            cos_scores = util.pytorch_cos_sim(question_embedding, self.document_embeddings)[0]
-            top_results = torch.topk(cos_scores, k=min(top_k, len(self.document_chunks)))
+            # Keyword-heavy questions with a decisive BM25 match skip the embedding pass
+            if question_embedding is None:
+                shortcut = self._lexical_shortcut(document, question, top_k)
+                if shortcut is not None:
+                    return shortcut
+                question_embedding = self.encode_questions([question])[0]
             
-            relevant_chunks = []
-            for score, idx in zip(top_results[0], top_results[1]):
-                chunk = self.document_chunks[int(idx)]
-                confidence = float(score)
-                relevant_chunks.append({
-                    'text': chunk,
-                    'confidence': confidence
-                })
-            
-            return relevant_chunks
+            with tracer.span('retrieval'):
+                return self._retrieve(document, question, question_embedding, top_k)
         except Exception as e:
             print(f"Error finding relevant chunks: {e}")
             return []
 
-    def answer_question(self, question, context):
+    def _retrieve(self, document, question, question_embedding, top_k):
+        """Search one document with an already encoded question"""
+        if not Config.HYBRID_RETRIEVAL:
+            # Find similar chunks through the document's vector index
+            top_ids, top_scores = document.index.search(question_embedding, k=top_k)
+            return [
+                self._chunk_result(document, int(idx), float(score))
+                for idx, score in zip(top_ids, top_scores)
+            ]
+        
+        # Hybrid: fuse semantic and BM25 candidates, then report the cosine similarity
+        candidates = top_k * Config.HYBRID_CANDIDATE_FACTOR
+        semantic = document.index.search(question_embedding, k=candidates)
+        lexical_ids, lexical_scores = document.lexical.search(question, k=candidates)
+        embedded = lexical_ids < document.indexed_count
+        lexical = (lexical_ids[embedded], lexical_scores[embedded])
+        
+        cosine = dict(zip(semantic[0].tolist(), semantic[1].tolist()))
+        bm25 = dict(zip(lexical[0].tolist(), lexical[1].tolist()))
+        relevant_chunks = []
+        for idx, fused_score in self.ranker.fuse(lexical, semantic)[:top_k]:
+            if idx not in cosine:
+                cosine[idx] = float(np.dot(document.embeddings[idx], question_embedding))
+            relevant_chunks.append(self._chunk_result(
+                document,
+                idx,
+                cosine[idx],
+                score=fused_score,
+                bm25=bm25.get(idx, 0.0)
+            ))
+        
+        return relevant_chunks
+
+    def _lexical_shortcut(self, document, question, top_k):
+        """
+        Chunks for a question whose BM25 match is decisive, or None when the
+        semantic pass is needed. Confidence is the BM25 score relative to the best hit.
+        """
+        if not Config.HYBRID_RETRIEVAL:
+            return None
+        
+        with tracer.span('retrieval'):
+            ids, scores = document.lexical.search(question, k=top_k)
+        if not self.ranker.is_decisive(scores):
+            return None
+        
+        top = float(scores[0])
+        return [
+            self._chunk_result(document, int(idx), float(score) / top, bm25=float(score))
+            for idx, score in zip(ids, scores)
+        ]
+
+    def _chunk_result(self, document, index, confidence, **scores):
+        """Retrieval result for one chunk, with its location in the document"""
+        result = {
+            'text': document.chunks[index],
+            'confidence': confidence,
+            'doc_id': document.doc_id,
+            'chunk': index
+        }
+        result.update(scores)
+        if document.chunk_info:
+            info = document.chunk_info[index]
+            result['start'] = info['start']
+            result['end'] = info['end']
+            result['page_start'] = info['page_start']
+            result['page_end'] = info['page_end']
+        return result
+
+    def answer_question(self, question, doc_id=None, report_stage=False):
         """
         Generate a comprehensive answer by combining relevant chunks
         """
+        return self.answer_questions([(question, doc_id)], report_stage=report_stage)[0]
+
+    def answer_questions(self, requests, report_stage=False):
+        """
+        Answer many (question, doc_id) pairs at once. Questions are encoded in
+        a single sentence_model.encode call and all reader inputs go through
+        one batched reader call. Returns the answers in request order, or
+        (answer, answered_by) pairs with report_stage, where answered_by is
+        'cache' or the cascade stage that produced the answer.
+        """
         if not self.loaded:
-            return "Error: Model not loaded. Please load the model first."
-        
-        if not question or not context:
-            return "Error: Both question and context are required."
+            answers = ["Error: Model not loaded. Please load the model first."] * len(requests)
+            return [(answer, 'error') for answer in answers] if report_stage else answers
         
+        answers = [None] * len(requests)
+        stages = ['error'] * len(requests)
         try:
-            # Index the document if not already done
-            if not self.document_chunks:
-                success = self.index_document(context)
-                if not success:
-                    return "Error: Could not process the PDF. Please try uploading again."
+            answers = self._answer_questions(requests, answers, stages)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            answers = [a if a is not None else f"Error generating answer: {str(e)}" for a in answers]
+        return list(zip(answers, stages)) if report_stage else answers
+
+    def _answer_questions(self, requests, answers, stages):
+        """Fill in answers and stages for answer_questions(); unanswered entries stay None"""
+        valid = []
+        documents = {}
+        for i, (question, doc_id) in enumerate(requests):
+            document = self.get_document(doc_id) if question else None
+            if not question:
+                answers[i] = "Error: A question is required."
+            elif document is None:
+                answers[i] = "Error: Document not found. Please upload the PDF again."
+            else:
+                documents[i] = document
+                # Repeated questions are answered straight from the cache
+                cached = self.answer_cache.get(document.doc_id, question)
+                if cached is not None:
+                    answers[i] = cached
+                    stages[i] = 'cache'
+                    self._count_stage('cache')
+                else:
+                    valid.append(i)
+        
+        if not valid:
+            return answers
+        
+        # Questions with a decisive keyword match need no embedding
+        check_deadline('retrieval')
+        top_k = Config.RETRIEVAL_TOP_K
+        found = {}
+        embeddings = {}
+        to_encode = []
+        for i in valid:
+            shortcut = self._lexical_shortcut(documents[i], requests[i][0], top_k)
+            if shortcut is not None:
+                found[i] = shortcut
+            else:
+                to_encode.append(i)
+        
+        # Find relevant chunks, unless a near-duplicate question was already answered
+        if to_encode:
+            check_deadline('encoding')
+            question_embeddings = self.encode_questions([requests[i][0] for i in to_encode])
+            for i, question_embedding in zip(to_encode, question_embeddings):
+                question = requests[i][0]
+                embeddings[i] = question_embedding
+                similar = self.answer_cache.get_similar(documents[i].doc_id, question_embedding)
+                if similar is not None:
+                    answers[i] = similar
+                    stages[i] = 'cache'
+                    self._count_stage('cache')
+                    continue
+                found[i] = self.find_relevant_chunks(
+                    question,
+                    doc_id=documents[i].doc_id,
+                    top_k=top_k,
+                    question_embedding=question_embedding
+                )
+        
+        pending = []
+        for i in valid:
+            if i not in found:
+                continue
+            question = requests[i][0]
+            if not found[i]:
+                answers[i] = f"I couldn't find any information in the PDF related to: '{question}'. Please try a different question."
+                stages[i] = 'retrieval'
+                self._count_stage('retrieval')
+            else:
+                pending.append((i, question, found[i]))
+        
+        # Build comprehensive answers from relevant chunks
+        records = self._cascade([(question, chunks) for _, question, chunks in pending])
+        for (i, question, _), record in zip(pending, records):
+            answers[i] = record['answer']
+            stages[i] = record['answered_by']
+            # Answers over a partially indexed document may still change
+            if documents[i].is_complete:
+                self.answer_cache.put(documents[i].doc_id, question, record['answer'], embeddings.get(i))
+        
+        return answers
+
+    # Document metadata filters accepted by select_documents()
+    CORPUS_FILTERS = ('filename', 'created_after', 'created_before')
+
+    def select_documents(self, doc_ids=None, filters=None):
+        """
+        Documents a corpus query may search, chosen from metadata alone:
+        only the documents that pass the filters are loaded.
+        doc_ids: restrict to these documents (loaded from the cache if need be)
+        filters: 'filename' (shell-style pattern), 'created_after' and
+        'created_before' (Unix timestamps)
+        """
+        filters = filters or {}
+        unknown = set(filters) - set(self.CORPUS_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        
+        # Cached documents, and loaded ones that are still being encoded
+        candidates = dict(self.catalog)
+        for document in self.documents.documents():
+            candidates[document.doc_id] = {
+                'doc_id': document.doc_id,
+                'filename': document.filename,
+                'created_at': document.created_at,
+            }
+        if doc_ids:
+            candidates = {
+                doc_id: candidates.get(doc_id) or self._metadata_of(doc_id)
+                for doc_id in dict.fromkeys(doc_ids)
+            }
+        
+        selected = []
+        for doc_id, meta in candidates.items():
+            if meta is None:
+                continue
+            if 'filename' in filters and not fnmatch(meta['filename'] or '', filters['filename']):
+                continue
+            if 'created_after' in filters and meta['created_at'] < float(filters['created_after']):
+                continue
+            if 'created_before' in filters and meta['created_at'] >= float(filters['created_before']):
+                continue
+            document = self.get_document(doc_id)
+            if document is not None and document.indexed_count > 0:
+                selected.append(document)
+        return selected
+
+    def _metadata_of(self, doc_id):
+        """Catalog metadata of a document, loading it if this process has not seen it"""
+        document = self.get_document(doc_id)
+        if document is None:
+            return None
+        return {'doc_id': doc_id, 'filename': document.filename, 'created_at': document.created_at}
+
+    def list_documents(self):
+        """Summaries of every known document; cached ones not loaded yet report no resident bytes"""
+        summaries = {document.doc_id: dict(document.summary(), loaded=True) for document in self.documents.documents()}
+        for doc_id, meta in list(self.catalog.items()):
+            if doc_id not in summaries:
+                summaries[doc_id] = {
+                    'doc_id': doc_id,
+                    'filename': meta['filename'],
+                    'text_length': meta['text_length'],
+                    'chunks': meta['chunks'],
+                    'indexed_chunks': meta['chunks'],
+                    'index_backend': Config.VECTOR_INDEX_BACKEND,
+                    'resident_bytes': 0,
+                    'loaded': False,
+                }
+        return list(summaries.values())
+
+    def search_corpus(self, question, documents, top_k=5, question_embedding=None):
+        """
+        Best chunks across many documents. Every document is searched for its
+        own candidates; the per-document lists, already sorted, are merged
+        with a heap into global semantic and BM25 candidate lists, which are
+        then fused as for a single document.
+        """
+        if not documents:
+            return []
+        if question_embedding is None:
+            check_deadline('encoding')
+            question_embedding = self.encode_questions([question])[0]
+        
+        hybrid = Config.HYBRID_RETRIEVAL
+        candidates = top_k * Config.HYBRID_CANDIDATE_FACTOR if hybrid else top_k
+        semantic_streams, lexical_streams = [], []
+        with tracer.span('retrieval'):
+            for position, document in enumerate(documents):
+                check_deadline('retrieval')
+                ids, scores = document.index.search(question_embedding, k=candidates)
+                semantic_streams.append([(float(score), position, int(i)) for i, score in zip(ids, scores)])
+                if hybrid:
+                    ids, scores = document.lexical.search(question, k=candidates)
+                    lexical_streams.append([
+                        (float(score), position, int(i))
+                        for i, score in zip(ids, scores) if i < document.indexed_count
+                    ])
             
-            # Find relevant chunks
-            relevant_chunks = self.find_relevant_chunks(question, top_k=5)
+            # Heap fan-in of the per-document lists, best first
+            def fan_in(streams):
+                return list(islice(heapq.merge(*streams, key=lambda hit: -hit[0]), candidates))
+            semantic = fan_in(semantic_streams)
+            lexical = fan_in(lexical_streams)
             
-            if not relevant_chunks:
-                return f"I couldn't find any information in the PDF related to: '{question}'. Please try a different question."
+            # Fuse under corpus-wide ids: one per (document, chunk) pair
+            keys = list(dict.fromkeys((position, i) for _, position, i in semantic + lexical))
+            key_ids = {key: n for n, key in enumerate(keys)}
+            def as_arrays(hits):
+                return (
+                    np.array([key_ids[(position, i)] for _, position, i in hits], dtype=np.int64),
+                    np.array([score for score, _, _ in hits], dtype=np.float32)
+                )
+            cosine = {key_ids[(position, i)]: score for score, position, i in semantic}
+            bm25 = {key_ids[(position, i)]: score for score, position, i in lexical}
+            if hybrid:
+                ranked = self.ranker.fuse(as_arrays(lexical), as_arrays(semantic))[:top_k]
+            else:
+                ranked = [(n, cosine[n]) for n in range(min(top_k, len(semantic)))]
             
-            # Build a comprehensive answer from relevant chunks
-            answer = self._build_answer(question, relevant_chunks)
+            relevant_chunks = []
+            for n, fused_score in ranked:
+                position, i = keys[n]
+                document = documents[position]
+                if n not in cosine:
+                    cosine[n] = float(np.dot(document.embeddings[i], question_embedding))
+                scores = {'score': fused_score, 'bm25': bm25.get(n, 0.0)} if hybrid else {}
+                chunk = self._chunk_result(document, i, cosine[n], **scores)
+                chunk['filename'] = document.filename
+                relevant_chunks.append(chunk)
+            return relevant_chunks
+
+    def answer_corpus(self, question, doc_ids=None, filters=None, top_k=5):
+        """
+        Answer a question from whichever documents hold the answer. The reader
+        runs once, over the globally best chunks. Returns a dict with the
+        answer, the stage that produced it, the document and pages it came
+        from, and every source chunk.
+        """
+        documents = self.select_documents(doc_ids, filters)
+        relevant_chunks = self.search_corpus(question, documents, top_k=top_k)
+        result = {
+            'answer': None,
+            'answered_by': 'retrieval',
+            'answer_source': None,
+            'sources': [
+                {key: chunk.get(key) for key in (
+                    'doc_id', 'filename', 'page_start', 'page_end', 'chunk', 'confidence', 'text'
+                )}
+                for chunk in relevant_chunks
+            ],
+            'documents_searched': len(documents),
+        }
+        if not relevant_chunks:
+            result['answer'] = f"I couldn't find any information in the indexed PDFs related to: '{question}'. Please try a different question."
+            self._count_stage('retrieval')
+            return result
+        
+        record = self._cascade([(question, relevant_chunks)])[0]
+        result['answer'] = record['answer']
+        result['answered_by'] = record['answered_by']
+        if record['chunk'] is not None:
+            result['answer_source'] = {
+                key: record['chunk'].get(key) for key in ('doc_id', 'filename', 'page_start', 'page_end')
+            }
+            result['answer_source']['highlight'] = record['highlight']
+        return result
+
+    def stream_answer(self, question, doc_id=None, top_k=5):
+        """
+        Answer one question step by step, yielding (event, data) pairs as
+        soon as each part exists: 'chunks' after retrieval, then 'answer'
+        with the extracted span and where it is, and 'confidence', and finally 'done' with
+        the same text answer_question() returns and the cascade stage that
+        produced it. Failures, including a passed request deadline,
+        yield 'error'.
+        """
+        document = self.get_document(doc_id) if question else None
+        if not question:
+            yield 'error', {'error': "A question is required."}
+            return
+        if document is None:
+            yield 'error', {'error': "Document not found. Please upload the PDF again."}
+            return
+        
+        try:
+            cached = self.answer_cache.get(document.doc_id, question)
+            question_embedding = None
+            relevant_chunks = None
+            if cached is None:
+                relevant_chunks = self._lexical_shortcut(document, question, top_k)
+            if cached is None and relevant_chunks is None:
+                check_deadline('encoding')
+                question_embedding = self.encode_questions([question])[0]
+                cached = self.answer_cache.get_similar(document.doc_id, question_embedding)
+            if cached is not None:
+                self._count_stage('cache')
+                yield 'done', {'answer': cached, 'answered_by': 'cache', 'cached': True}
+                return
             
-            return answer
+            if relevant_chunks is None:
+                check_deadline('retrieval')
+                relevant_chunks = self.find_relevant_chunks(
+                    question,
+                    doc_id=document.doc_id,
+                    top_k=top_k,
+                    question_embedding=question_embedding
+                )
+            yield 'chunks', {'chunks': relevant_chunks}
             
+            if not relevant_chunks:
+                answer = f"I couldn't find any information in the PDF related to: '{question}'. Please try a different question."
+                answered_by = 'retrieval'
+                self._count_stage(answered_by)
+            else:
+                record = self._cascade([(question, relevant_chunks)])[0]
+                answer, answered_by = record['answer'], record['answered_by']
+                if record['span'] is not None:
+                    yield 'answer', {'answer': record['span'], 'source': answered_by, 'highlight': record['highlight']}
+                    yield 'confidence', {'confidence': record['confidence'], 'source': answered_by}
+            
+            if document.is_complete:
+                self.answer_cache.put(document.doc_id, question, answer, question_embedding)
+            yield 'done', {'answer': answer, 'answered_by': answered_by, 'cached': False}
+        except DeadlineExceeded as e:
+            yield 'error', {'error': str(e), 'deadline_exceeded': True, 'stage': e.stage}
         except Exception as e:
-            return f"Error generating answer: {str(e)}"
+            yield 'error', {'error': f"Error generating answer: {str(e)}"}
 
     def _build_answer(self, question, relevant_chunks):
         """
         Build a comprehensive answer from relevant chunks
         """
+        return self._build_answers([(question, relevant_chunks)])[0]
+
+    def _build_answers(self, items):
+        """Build answers for a list of (question, relevant_chunks) pairs"""
+        return [record['answer'] for record in self._cascade(items)]
+
+    def _cascade(self, items):
+        """
+        Answer (question, relevant_chunks) pairs through a cascade of
+        increasingly expensive stages, batching each stage over all pairs,
+        and stop at the first stage that is sure:
+          retrieval - nothing retrieved is similar enough; the reader is skipped
+          reranker  - the cross-encoder finds nothing relevant, or one clearly
+                      relevant chunk that becomes the answer; the reader is skipped
+          reader    - the extractive reader found a confident span
+          summary   - the reader was unsure; the best chunks are summarized
+        Returns one dict per pair with answer, answered_by, span (the bare
+        answer text, if any), confidence, chunk (where the answer came from)
+        and, for reader answers, highlight (where the span is in the document).
+        """
+        records = [None] * len(items)
+        ranked = [chunks for _, chunks in items]
+        
+        # Stage 1: bi-encoder retrieval
+        remaining = []
+        for i, (question, chunks) in enumerate(items):
+            answer = self._retrieval_exit(question, chunks)
+            if answer is not None:
+                records[i] = self._record(answer, 'retrieval')
+            else:
+                remaining.append(i)
+        
+        # Stage 2: cross-encoder over the top retrieved chunks, one pass for all questions
+        if self.reranker is not None and remaining:
+            check_deadline('reranking')
+            reranked = self.reranker.rerank(
+                [(items[i][0], ranked[i][:Config.RERANK_TOP_K]) for i in remaining]
+            )
+            undecided = []
+            for i, chunks in zip(remaining, reranked):
+                ranked[i] = chunks
+                top = chunks[0]['rerank_score']
+                runner_up = chunks[1]['rerank_score'] if len(chunks) > 1 else 0.0
+                if top < Config.RERANK_MIN_SCORE:
+                    records[i] = self._record(
+                        f"The PDF does not seem to contain information about: '{items[i][0]}'",
+                        'reranker'
+                    )
+                elif top >= Config.RERANK_DECISIVE_SCORE and top - runner_up >= Config.RERANK_DECISIVE_MARGIN:
+                    with tracer.span('formatting'):
+                        answer = self._summarize_chunks(items[i][0], chunks, relevance=top)
+                    records[i] = self._record(answer, 'reranker', chunks[0]['text'], top, chunks[0])
+                else:
+                    undecided.append(i)
+            remaining = undecided
+        
+        # Stage 3: the extractive reader over the best chunks
+        if remaining:
+            check_deadline('reader')
+            contexts = [ranked[i][:Config.READER_CONTEXT_CHUNKS] for i in remaining]
+            results = self._read([items[i][0] for i in remaining], contexts)
+            for i, result in zip(remaining, results):
+                records[i] = self._format_answer(items[i][0], ranked[i], result)
+        
+        for record in records:
+            self._count_stage(record['answered_by'])
+        return records
+
+    @staticmethod
+    def _record(answer, answered_by, span=None, confidence=None, chunk=None, highlight=None):
+        return {
+            'answer': answer,
+            'answered_by': answered_by,
+            'span': span,
+            'confidence': confidence,
+            'chunk': chunk,
+            'highlight': highlight,
+        }
+
+    def _count_stage(self, answered_by):
+        with self._cascade_lock:
+            self.cascade_counts[answered_by] += 1
+
+    def cascade_stats(self):
+        """How many answers each cascade stage produced"""
+        with self._cascade_lock:
+            stats = {'answered_by': dict(self.cascade_counts)}
+        stats['reranker'] = self.reranker.metrics() if self.reranker is not None else None
+        return stats
+
+    def _retrieval_exit(self, question, relevant_chunks):
+        """Answer when the retrieved chunks are too weak to bother the reader, else None"""
         if not relevant_chunks:
             return "No relevant information found."
         
         # Check if all chunks have low confidence
         avg_confidence = sum(c['confidence'] for c in relevant_chunks) / len(relevant_chunks)
         
-        if avg_confidence < 0.3:
+        if avg_confidence < Config.RETRIEVAL_MIN_CONFIDENCE:
             return f"Found some information but confidence is low. The PDF may not contain clear information about: '{question}'"
-        
-        # Combine top chunks
-        combined_context = "\n".join([chunk['text'] for chunk in relevant_chunks[:3]])
-        
-        # Use the question-answering pipeline if available
+        return None
+
+    def _chunk_tokens(self, chunk):
+        """Reader (ids, offsets) of a retrieved chunk, from its document's index when cached"""
+        document = self.get_document(chunk['doc_id'])
+        tokens = document.reader_tokens if document is not None else None
+        if tokens is not None and chunk['chunk'] < len(tokens):
+            return tokens[chunk['chunk']]
+        return self.reader.tokenize([chunk['text']])[0]
+
+    def _read(self, questions, contexts):
+        """
+        Run the shared reader over each question's context chunks, on their
+        pre-computed tokens; None where it failed
+        """
         try:
-            from transformers import pipeline
-            qa_pipeline = pipeline(
-                "question-answering",
-                model="deepset/roberta-base-squad2",
-                device=-1
-            )
-            
-            # Try to get a specific answer
-            result = qa_pipeline(
-                question=question,
-                context=combined_context,
-                max_answer_len=300,
-                min_answer_len=20
-            )
-            
-            answer = result['answer'].strip()
-            score = result['score']
-            
-            if score > 0.5:
-                return f"**Answer:** {answer}\n\n**Confidence:** {score:.1%}"
-            else:
-                # Fallback to chunk summary
-                return self._summarize_chunks(question, relevant_chunks)
-                
+            with tracer.span('reader'):
+                return self.reader.answer_spans(
+                    list(questions),
+                    [[self._chunk_tokens(chunk) for chunk in chunks] for chunks in contexts],
+                    max_answer_len=Config.READER_MAX_ANSWER_TOKENS
+                )
         except Exception as e:
             # Fallback: return best matching chunk with context
-            return self._summarize_chunks(question, relevant_chunks)
+            print(f"✗ Reader failed: {e}")
+            return [None] * len(questions)
+
+    def _highlight(self, chunk, start, end):
+        """Location of a span given by character offsets within a chunk's text"""
+        highlight = {
+            'doc_id': chunk['doc_id'],
+            'chunk': chunk['chunk'],
+            'chunk_start': start,
+            'chunk_end': end,
+            'start': None,
+            'end': None,
+            'page': chunk.get('page_start'),
+        }
+        if 'start' in chunk:
+            highlight['start'] = chunk['start'] + start
+            highlight['end'] = chunk['start'] + end
+            document = self.documents.get(chunk['doc_id'])
+            page = document.page_at(highlight['start']) if document is not None else None
+            if page is not None:
+                highlight['page'] = page
+        return highlight
+
+    def _format_answer(self, question, relevant_chunks, result):
+        """Cascade record from a reader result, or a chunk summary when the reader is unsure"""
+        with tracer.span('formatting'):
+            if result is not None and result['score'] > Config.READER_MIN_SCORE:
+                # Token offsets point straight at the span in the chunk it came from
+                source = relevant_chunks[result['context']]
+                answer = source['text'][result['start']:result['end']].strip()
+                return self._record(
+                    f"**Answer:** {answer}\n\n**Confidence:** {result['score']:.1%}",
+                    'reader', answer, float(result['score']), source,
+                    self._highlight(source, result['start'], result['end'])
+                )
+            # Fallback to chunk summary
+            best = relevant_chunks[0]
+            return self._record(
+                self._summarize_chunks(question, relevant_chunks),
+                'summary', best['text'], float(best['confidence']), best
+            )
 
-    def _summarize_chunks(self, question, relevant_chunks):
+    def _summarize_chunks(self, question, relevant_chunks, relevance=None):
         """
         Summarize relevant chunks into a descriptive answer
         """
         best_chunk = relevant_chunks[0]
         text = best_chunk['text']
-        confidence = best_chunk['confidence']
+        confidence = best_chunk['confidence'] if relevance is None else relevance
         
         # Enhance with additional context
         answer_parts = [
@@ -0,0 +1,146 @@
+"""
+Bounded cache of generated answers.
+
+Answers are keyed by (doc_id, normalized question). A question that is not
+an exact match can still hit when its embedding is close enough to a cached
+question about the same document. Entries expire after a TTL, the least
+recently used ones are evicted when the cache is full, and every entry for a
+document is dropped when that document is re-indexed.
+"""
+
+from collections import OrderedDict
+import re
+import threading
+import time
+
+import numpy as np
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    question = re.sub(r'\s+', ' ', question.lower()).strip()
+    return question.rstrip('?!. ')
+
+
+class AnswerCache:
+    """TTL + LRU answer cache with near-duplicate question lookup"""
+
+    def __init__(self, max_entries=1024, ttl=3600, similarity_threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()  # (doc_id, question) -> (answer, created, embedding)
+        self._by_doc = {}  # doc_id -> set of keys
+        self._matrices = {}  # doc_id -> (keys, embedding matrix) for near-duplicate search
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.exact_misses = 0  # get() lookups that found nothing; some then hit in get_similar()
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_doc.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_doc[key[0]]
+        self._matrices.pop(key[0], None)
+
+    def _expired(self, created):
+        return self.ttl and time.time() - created > self.ttl
+
+    def get(self, doc_id, question):
+        """Cached answer for exactly this question, or None; called once per question asked"""
+        key = (doc_id, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.exact_misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_similar(self, doc_id, question_embedding):
+        """
+        Cached answer for the most similar earlier question above the
+        threshold, or None; only called after get() missed for the question
+        """
+        with self._lock:
+            if doc_id not in self._by_doc:
+                return None
+
+            cached = self._matrices.get(doc_id)
+            if cached is None:
+                keys = [k for k in self._by_doc[doc_id] if self._entries[k][2] is not None]
+                if not keys:
+                    return None
+                matrix = np.stack([self._entries[k][2] for k in keys])
+                cached = self._matrices[doc_id] = (keys, matrix)
+
+            keys, matrix = cached
+            similarities = matrix @ question_embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            key = keys[best]
+            entry = self._entries[key]
+            if self._expired(entry[1]):
+                self._drop(key)
+                self.expirations += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.similar_hits += 1
+            return entry[0]
+
+    def put(self, doc_id, question, answer, question_embedding=None):
+        """Store a freshly generated answer"""
+        key = (doc_id, normalize_question(question))
+        with self._lock:
+            self._drop(key)
+            embedding = None
+            if question_embedding is not None:
+                embedding = np.asarray(question_embedding, dtype=np.float32)
+            self._entries[key] = (answer, time.time(), embedding)
+            self._by_doc.setdefault(doc_id, set()).add(key)
+            self._matrices.pop(doc_id, None)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, doc_id):
+        """Forget every answer about a document"""
+        with self._lock:
+            for key in list(self._by_doc.get(doc_id, ())):
+                self._drop(key)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            # Every question is looked up once with get(); a near-duplicate
+            # hit answers a question whose exact lookup missed
+            lookups = self.hits + self.exact_misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.exact_misses - self.similar_hits,
+                'hit_rate': (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,138 @@
+"""
+Micro-batching of concurrent requests.
+
+Requests that arrive within a short window are merged into one call of a
+batch handler, so the encoder and reader run one forward pass over many
+questions instead of one pass per question.
+
+Each item keeps the deadline of the request that submitted it. Items whose
+deadline passed while queued are dropped before the handler runs, and the
+caller stops waiting once its own deadline is spent.
+
+Worker threads start on the first submit and are restarted in a forked child,
+so a batcher can be created before a pre-forking server forks its workers.
+"""
+
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import os
+import queue
+import threading
+import time
+
+from admission import DeadlineExceeded, current_deadline, deadline_scope
+from tracing import tracer
+
+
+class MicroBatcher:
+    """Collects submitted items and hands them to a handler in batches"""
+
+    def __init__(self, handler, max_batch_size=16, max_wait=0.01, workers=1, name='batcher'):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+        self.name = name
+        self.workers = max(1, int(workers))
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._pid = None  # Process the worker threads were started in
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.dropped = 0  # Items whose deadline passed while queued
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._stats_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent's threads did not come along, nor can its queue be trusted
+                self._queue = queue.Queue()
+            for index in range(self.workers):
+                threading.Thread(
+                    target=self._run,
+                    name=f'{self.name}-{index}',
+                    daemon=True
+                ).start()
+            self._pid = os.getpid()
+
+    def submit(self, item, timeout=None):
+        """Queue one item and block until its batch has been processed"""
+        self._ensure_started()
+        future = Future()
+        deadline = current_deadline()
+        # The handler runs on a worker thread; carry the caller's trace and deadline along
+        self._queue.put((item, future, tracer.current(), deadline))
+        if deadline is None:
+            return future.result(timeout=timeout)
+        try:
+            return future.result(timeout=deadline.remaining() if timeout is None else min(timeout, deadline.remaining()))
+        except FutureTimeout:
+            if deadline.expired:
+                raise deadline.exceeded(f'{self.name}_batch')
+            raise
+
+    def _collect(self):
+        """Wait for one item, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            live = []
+            for entry in batch:
+                deadline = entry[3]
+                if deadline is not None and deadline.expired:
+                    # Its caller has given up already, and counted the deadline as exceeded
+                    entry[1].set_exception(DeadlineExceeded(f'{self.name}_batch'))
+                else:
+                    live.append(entry)
+            if live:
+                self._handle(live)
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.dropped += len(batch) - len(live)
+
+    def _handle(self, batch):
+        items = [item for item, _, _, _ in batch]
+        traces = [trace for _, _, item_traces, _ in batch for trace in item_traces]
+        # The batch is abandoned only once every item's deadline has passed
+        deadlines = [deadline for _, _, _, deadline in batch]
+        deadline = None if None in deadlines else max(deadlines, key=lambda d: d.expires_at)
+        try:
+            with tracer.attach(traces), deadline_scope(deadline):
+                results = self.handler(items)
+            for (_, future, _, _), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future, _, _ in batch:
+                future.set_exception(e)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'name': self.name,
+                'queued': self._queue.qsize(),
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'dropped': self.dropped,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_seconds': self.max_wait,
+            }
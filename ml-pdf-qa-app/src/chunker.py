@@ -0,0 +1,141 @@
+"""
+Token-aware document chunking.
+
+Sentences are tokenized once with the embedding model's own tokenizer, and
+chunk boundaries are found with prefix sums over the sentence token counts,
+so each chunk fits the model's max sequence length instead of being silently
+truncated. Every chunk records its character offsets in the document text and
+the pages it was taken from.
+"""
+
+from bisect import bisect_left, bisect_right
+import re
+
+# A sentence runs up to terminal punctuation followed by whitespace
+SENTENCE = re.compile(r'\S.*?(?:[.!?](?=\s)|$)', re.S)
+
+
+class TokenChunker:
+    """Single-pass chunker with a token budget and token overlap"""
+
+    def __init__(self, tokenizer=None, max_tokens=256, overlap_tokens=32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max(1, int(max_tokens))
+        self.overlap_tokens = max(0, min(int(overlap_tokens), self.max_tokens - 1))
+
+    def count_tokens(self, texts):
+        """Token count of each text, without special tokens"""
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [len(text.split()) for text in texts]
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )
+        return [len(ids) for ids in encoded['input_ids']]
+
+    @staticmethod
+    def join_pages(pages):
+        """
+        Document text for a list of (page_number, text) pairs, plus the
+        (start offset, page number) of each page within it
+        """
+        parts = []
+        page_starts = []
+        offset = 0
+        for page_number, page_text in pages:
+            page_starts.append((offset, page_number))
+            parts.append(page_text)
+            offset += len(page_text) + 1  # pages are joined with '\n'
+        return "\n".join(parts), page_starts
+
+    def _sentence_spans(self, text, page_starts):
+        """(start, end, page_number) for every non-blank sentence"""
+        spans = []
+        for index, (page_start, page_number) in enumerate(page_starts):
+            page_end = page_starts[index + 1][0] - 1 if index + 1 < len(page_starts) else len(text)
+            for match in SENTENCE.finditer(text, page_start, page_end):
+                start, end = match.span()
+                # Trim surrounding whitespace so offsets point at real text
+                while start < end and text[start].isspace():
+                    start += 1
+                while end > start and text[end - 1].isspace():
+                    end -= 1
+                if start < end:
+                    spans.append((start, end, page_number))
+        return spans
+
+    def _split_long(self, text, spans, counts):
+        """Break sentences longer than the budget into word runs that fit"""
+        result_spans = []
+        result_counts = []
+        for (start, end, page), count in zip(spans, counts):
+            if count <= self.max_tokens:
+                result_spans.append((start, end, page))
+                result_counts.append(count)
+                continue
+
+            words = [m.span() for m in re.finditer(r'\S+', text[start:end])]
+            # Words per piece, scaled by this sentence's tokens-per-word ratio
+            per_piece = max(1, int(len(words) * self.max_tokens / count * 0.9))
+            pieces = []
+            for i in range(0, len(words), per_piece):
+                group = words[i:i + per_piece]
+                pieces.append((start + group[0][0], start + group[-1][1], page))
+            piece_counts = self.count_tokens([text[s:e] for s, e, _ in pieces])
+            result_spans.extend(pieces)
+            result_counts.extend(piece_counts)
+        return result_spans, result_counts
+
+    def chunk(self, pages):
+        """
+        Split pages into chunks. Returns (document_text, chunks) where each
+        chunk is a dict with text, start, end, page_start, page_end and tokens.
+        """
+        text, page_starts = self.join_pages(pages)
+        spans = self._sentence_spans(text, page_starts)
+        if not spans:
+            return text, []
+
+        counts = self.count_tokens([text[s:e] for s, e, _ in spans])
+        spans, counts = self._split_long(text, spans, counts)
+
+        # prefix[i] = tokens in sentences [0, i)
+        prefix = [0]
+        for count in counts:
+            prefix.append(prefix[-1] + count)
+
+        chunks = []
+        n = len(spans)
+        first = 0
+        while first < n:
+            # Furthest end with prefix[end] - prefix[first] <= max_tokens
+            last = bisect_right(prefix, prefix[first] + self.max_tokens) - 1
+            last = max(last, first + 1)
+
+            start_char = spans[first][0]
+            end_char = spans[last - 1][1]
+            chunks.append({
+                'text': text[start_char:end_char],
+                'start': start_char,
+                'end': end_char,
+                'page_start': spans[first][2],
+                'page_end': spans[last - 1][2],
+                'tokens': prefix[last] - prefix[first],
+            })
+
+            if last >= n:
+                break
+            # Earliest sentence whose tail up to `last` fits in the overlap
+            next_first = bisect_left(prefix, prefix[last] - self.overlap_tokens)
+            next_first = min(max(next_first, first + 1), last)
+            # Drop the overlap when the next sentence would not fit beside it,
+            # rather than emit a chunk holding nothing but the overlap
+            if prefix[last + 1] - prefix[next_first] > self.max_tokens:
+                next_first = last
+            first = next_first
+
+        return text, chunks
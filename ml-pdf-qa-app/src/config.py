@@ -1,9 +1,106 @@
 # Configuration settings for the PDF QA application
+import os
 
 class Config:
     PDF_UPLOAD_FOLDER = 'uploads/'
     ALLOWED_EXTENSIONS = {'pdf'}
     MODEL_PATH = 'models/qa_model.bin'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB limit for uploaded files
+    MAX_CONTENT_LENGTH = 2 * 1024 * 1024 * 1024  # 2 GB limit for uploads; they are streamed to disk, not held in memory
     SECRET_KEY = 'your_secret_key_here'  # Change this to a random secret key for production
-    DEBUG = True  # Set to False in production
\ No newline at end of file
+    DEBUG = True  # Set to False in production
+
+    # Reader (extractive QA) models
+    READER_MODEL_NAME = 'deepset/roberta-base-squad2'
+    LEGACY_READER_MODEL_NAME = 'distilbert-base-cased-distilled-squad'
+    READER_POOL_SIZE = 2  # Reader instances shared by all request threads
+    READER_BACKEND = 'pytorch'  # 'pytorch' or 'onnx-int8' (needs optimum[onnxruntime])
+    READER_ONNX_DIR = 'models/onnx/'  # Where exported/quantized ONNX readers are kept
+    READER_WARM_UP = True  # Load the first reader in the background at startup
+
+    # Document index
+    MAX_INDEXED_DOCUMENTS = 50  # Least recently used documents are evicted beyond this
+    MAX_INDEX_BYTES = 512 * 1024 * 1024  # Memory budget for chunks + embeddings
+
+    # Embeddings and chunking
+    EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+    CHUNK_MAX_TOKENS = None  # Tokens per chunk; None = the embedding model's max sequence length
+    CHUNK_OVERLAP_TOKENS = 64  # Tokens shared between consecutive chunks
+    EMBEDDING_CACHE_DIR = 'models/embeddings/'  # On-disk index cache, None to disable
+    EMBEDDING_CACHE_DTYPE = 'float32'  # 'float32' or 'float16' (half the disk and page cache)
+    ENCODE_BATCH_SIZE = 64  # Chunks per sentence_model.encode call
+
+    # Background ingestion
+    INGESTION_WORKERS = 2  # Documents extracted and indexed concurrently
+    MAX_TRACKED_JOBS = 1000  # Finished jobs kept for /jobs lookups
+    INGESTION_MAX_PENDING = 16  # Jobs queued or running; further uploads are shed with 429
+    INGESTION_MAX_QUEUE_WAIT = 600  # Estimated seconds before a new job starts; beyond it uploads get 503
+
+    # PDF extraction
+    PDF_EXTRACT_WORKERS = -1  # Processes for page extraction: -1 = all cores, 1 = in-process
+    PDF_PAGES_PER_TASK = 16  # Pages handed to a worker process at a time
+
+    # Micro-batching of concurrent /ask requests
+    ASK_MICRO_BATCHING = True  # Merge concurrent /ask calls into shared encoder/reader batches
+    ASK_BATCH_MAX_SIZE = 16  # Most questions merged into one batch
+    ASK_BATCH_MAX_WAIT_MS = 10  # How long the first question waits for others to join
+    ASK_BATCH_MAX_QUESTIONS = 64  # Most questions accepted by one /ask_batch call
+
+    # Admission control and deadlines for questions (/ask, /ask_stream, /ask_batch, /ask_corpus)
+    ASK_MAX_CONCURRENT = 32  # Question requests answered at once; at least ASK_BATCH_MAX_SIZE to fill batches
+    ASK_MAX_QUEUED = 64  # Requests waiting for a slot; further ones are shed with 429
+    ASK_MAX_QUEUE_WAIT = 2.0  # Seconds a request may wait for a slot before it is shed with 503
+    REQUEST_TIMEOUT = 30.0  # Default deadline in seconds; clients may send X-Request-Timeout
+    REQUEST_TIMEOUT_MAX = 120.0  # Longest deadline a client may ask for
+
+    # Vector index used for chunk retrieval
+    VECTOR_INDEX_BACKEND = 'exact'  # 'exact', 'ivf', 'hnsw', or quantized 'int8' / 'binary'
+    VECTOR_INDEX_PARAMS = {
+        'ivf': {'target_recall': 0.9},  # nprobe is tuned to reach this recall@10; set 'nprobe' to fix it
+        'hnsw': {'m': 16, 'ef_construction': 100, 'ef_search': 64},  # Higher ef_search = higher recall
+        'int8': {'rescore_factor': 4},  # Candidates rescored in full precision per result wanted
+        'binary': {'rescore_factor': 10},
+    }
+
+    # Hybrid BM25 + embedding retrieval
+    HYBRID_RETRIEVAL = True  # Fuse BM25 keyword scores with semantic scores
+    HYBRID_ALPHA = 0.6  # Weight of the semantic score in the fused ranking
+    HYBRID_CANDIDATE_FACTOR = 2  # Candidates taken from each retriever per requested chunk
+    LEXICAL_DECISIVE_RATIO = 2.0  # A top BM25 hit this far ahead of the rest skips the embedding pass
+    LEXICAL_DECISIVE_MIN_SCORE = 3.0  # ...as long as it scores at least this much
+    LEXICAL_DECISIVE_MAX_HITS = 2  # ...and at most this many chunks (overlapping neighbours) come close
+
+    # Answer cascade: bi-encoder retrieval -> optional cross-encoder reranker -> reader
+    RETRIEVAL_TOP_K = 5  # Chunks retrieved per question
+    RETRIEVAL_MIN_CONFIDENCE = 0.3  # Mean similarity below this answers "not found" without the reader
+    RERANKER_ENABLED = False  # Rerank retrieved chunks with a small cross-encoder
+    RERANKER_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+    RERANK_TOP_K = 5  # Retrieved chunks scored by the reranker
+    RERANK_MIN_SCORE = 0.05  # No chunk above this relevance: "not found" without the reader
+    RERANK_DECISIVE_SCORE = 0.9  # A top chunk at least this relevant...
+    RERANK_DECISIVE_MARGIN = 0.4  # ...and this far ahead of the runner-up is the answer; the reader is skipped
+    READER_CONTEXT_CHUNKS = 3  # Best chunks concatenated into the reader's context
+    READER_MAX_ANSWER_TOKENS = 300  # Longest span the reader may extract
+    READER_MIN_SCORE = 0.5  # Reader spans below this fall back to a summary of the best chunks
+
+    # Corpus-wide questions (/ask_corpus)
+    CORPUS_TOP_K = 5  # Chunks kept across all documents after the fan-in
+    CORPUS_MAX_TOP_K = 50  # Largest top_k a request may ask for
+
+    # Answer cache
+    ANSWER_CACHE_SIZE = 1024  # Answers kept across all documents (least recently used evicted)
+    ANSWER_CACHE_TTL = 3600  # Seconds before a cached answer expires (0 = never)
+    ANSWER_CACHE_SIMILARITY = 0.95  # Cosine similarity for a rephrased question to reuse an answer
+
+    # Tracing and metrics
+    TRACING_ENABLED = True  # Per-stage spans and latency histograms, served at /metrics
+    TRACE_SLOW_REQUEST_SECONDS = 2.0  # Requests slower than this are logged and kept in /stats
+    TRACE_PROFILE_SLOW_REQUESTS = False  # Sample stacks of in-flight requests to profile slow ones
+    TRACE_PROFILE_INTERVAL_MS = 10  # Sampling interval of the profiler
+    TRACE_SLOW_REQUESTS_KEPT = 20  # Recent slow requests kept with their spans and profiles
+
+    # Startup
+    LOAD_MODELS_IN_BACKGROUND = True  # Bind the port at once and load models on a background thread
+
+    # Multi-process serving (see gunicorn.conf.py)
+    MULTIPROCESS = os.environ.get('PDFQA_MULTIPROCESS') == '1'  # Load models before the server forks its workers
+    SHARED_REGISTRY_DIR = 'models/registry/'  # Claims and job status shared by worker processes
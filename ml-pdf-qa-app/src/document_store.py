@@ -0,0 +1,184 @@
+"""
+In-memory store of indexed documents keyed by content hash.
+
+Each uploaded PDF is identified by the SHA-256 of its bytes, so identical
+files map to the same entry no matter what they were called. The store keeps
+many documents at once and evicts the least recently used ones when it goes
+over its document count or memory budget.
+"""
+
+from bisect import bisect_right
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from embedding_cache import MappedTexts
+from lexical_index import BM25Index
+
+
+def hash_bytes(data):
+    """SHA-256 hex digest used as a document id"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_path, block_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexedDocument:
+    """
+    Chunks and their vector index for one document.
+    While a document is still being encoded only the chunks added to the
+    index so far have embeddings; those are already searchable.
+    """
+
+    def __init__(self, doc_id, chunks, index, filename=None, text_length=0,
+                 chunk_info=None, page_hashes=None, page_offsets=None, created_at=None,
+                 reader_tokens=None, lexical=None):
+        self.doc_id = doc_id
+        self.chunks = chunks
+        self.chunk_info = chunk_info  # Per chunk: start, end, page_start, page_end, tokens
+        self.index = index  # VectorIndex whose ids are chunk positions
+        self.filename = filename
+        self.text_length = text_length
+        self.page_hashes = page_hashes  # Content hash of every PDF page, for incremental re-indexing
+        self.page_offsets = page_offsets  # [page_number, offset, length] of each page with text
+        self.reader_tokens = reader_tokens  # ChunkTokens under the reader's tokenizer, or None
+        self.created_at = created_at or time.time()
+        # BM25 index over the chunks; built here unless it was loaded from the cache
+        self.lexical = lexical if lexical is not None else BM25Index(chunks)
+
+    @property
+    def embeddings(self):
+        """Embedding matrix in chunk order (chunk i is row i)"""
+        return self.index.vectors[:self.index.size]
+
+    def page_at(self, offset):
+        """Page number holding a character offset of the document text, or None"""
+        if not self.page_offsets:
+            return None
+        position = bisect_right([start for _, start, _ in self.page_offsets], offset) - 1
+        return self.page_offsets[max(position, 0)][0]
+
+    @property
+    def indexed_count(self):
+        return self.index.size
+
+    @property
+    def is_complete(self):
+        return self.indexed_count >= len(self.chunks)
+
+    @property
+    def nbytes(self):
+        """Approximate resident size of the document index"""
+        size = self.index.nbytes
+        if not isinstance(self.chunks, MappedTexts):
+            size += sum(len(chunk) for chunk in self.chunks)
+        if self.reader_tokens is not None:
+            size += self.reader_tokens.nbytes
+        size += self.lexical.nbytes
+        return size
+
+    def summary(self):
+        return {
+            'doc_id': self.doc_id,
+            'filename': self.filename,
+            'text_length': self.text_length,
+            'chunks': len(self.chunks),
+            'indexed_chunks': self.indexed_count,
+            'index_backend': self.index.backend,
+            'resident_bytes': self.nbytes,
+        }
+
+
+class DocumentStore:
+    """Thread-safe LRU store of IndexedDocument objects"""
+
+    def __init__(self, max_documents=100, max_bytes=None):
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self._documents = OrderedDict()
+        self._sizes = {}  # doc_id -> bytes accounted for it in _bytes
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, doc_id):
+        with self._lock:
+            return doc_id in self._documents
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+    def get(self, doc_id):
+        """Return a document and mark it as recently used, or None"""
+        with self._lock:
+            document = self._documents.get(doc_id)
+            if document is not None:
+                self._documents.move_to_end(doc_id)
+            return document
+
+    def put(self, document):
+        """Add or replace a document, evicting old ones if over budget"""
+        with self._lock:
+            self._documents.pop(document.doc_id, None)
+            self._bytes -= self._sizes.pop(document.doc_id, 0)
+
+            self._documents[document.doc_id] = document
+            self._sizes[document.doc_id] = document.nbytes
+            self._bytes += self._sizes[document.doc_id]
+            self._evict()
+        return document
+
+    def update_size(self, doc_id):
+        """Re-measure a document whose index grew or shrank since it was added"""
+        with self._lock:
+            document = self._documents.get(doc_id)
+            if document is None:
+                return
+            self._bytes -= self._sizes[doc_id]
+            self._sizes[doc_id] = document.nbytes
+            self._bytes += self._sizes[doc_id]
+            self._evict()
+
+    def remove(self, doc_id):
+        with self._lock:
+            document = self._documents.pop(doc_id, None)
+            self._bytes -= self._sizes.pop(doc_id, 0)
+            return document
+
+    def latest(self):
+        """Most recently used document, or None if the store is empty"""
+        with self._lock:
+            if not self._documents:
+                return None
+            return next(reversed(self._documents.values()))
+
+    def documents(self):
+        with self._lock:
+            return list(self._documents.values())
+
+    def _evict(self):
+        # Never evict the document that was just added
+        while len(self._documents) > 1 and (
+            (self.max_documents and len(self._documents) > self.max_documents) or
+            (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            doc_id, document = self._documents.popitem(last=False)
+            self._bytes -= self._sizes.pop(doc_id, 0)
+            print(f"🗑️ Evicted document {doc_id[:12]} from index")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self._documents),
+                'bytes': self._bytes,
+                'max_documents': self.max_documents,
+                'max_bytes': self.max_bytes,
+            }
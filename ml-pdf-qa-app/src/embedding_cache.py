@@ -0,0 +1,325 @@
+"""
+On-disk cache of chunk texts and embedding matrices for indexed documents.
+
+Entries are keyed by document hash, embedding model name, chunking
+parameters and CACHE_FORMAT, so changing any of them never serves stale
+vectors; bump CACHE_FORMAT whenever the files of an entry change. Each entry is
+a raw embedding file, the chunk texts back to back in one UTF-8 file with an
+offsets file, a chunk location table, the chunks' reader token ids and
+character offsets, the BM25 postings, and a JSON sidecar with the shapes and
+document metadata. Everything is loaded back with numpy.memmap, so a
+restarted worker can answer questions straight away, the OS only pages in
+what is searched, and worker processes share one copy of each page.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from lexical_index import BM25Index
+from reader_tokens import ChunkTokens
+
+# Version of the on-disk layout, part of every key
+CACHE_FORMAT = 1
+
+# Columns of the chunk location table
+CHUNK_INFO_FIELDS = ('start', 'end', 'page_start', 'page_end', 'tokens')
+
+
+class MappedTexts:
+    """Read-only sequence of strings stored back to back in a memory-mapped UTF-8 file"""
+
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('chunk index out of range')
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return bytes(self._data[start:end]).decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class MappedChunkInfo:
+    """Read-only sequence of chunk location dicts backed by a memory-mapped table"""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return len(self._table)
+
+    def __getitem__(self, index):
+        return dict(zip(CHUNK_INFO_FIELDS, self._table[index].tolist()))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def _write_atomic(path, array):
+    tmp = path + '.tmp'
+    np.ascontiguousarray(array).tofile(tmp)
+    os.replace(tmp, path)
+
+
+def _map(path, dtype, shape):
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+
+class EmbeddingCache:
+    """Directory of memory-mappable document indexes"""
+
+    def __init__(self, cache_dir, model_name, chunk_params, dtype='float32'):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.chunk_params = dict(chunk_params)
+        self.dtype = np.dtype(dtype)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, doc_id):
+        """Cache key for a document under the current model and chunking settings"""
+        params = json.dumps(self.chunk_params, sort_keys=True)
+        raw = f"{doc_id}|{self.model_name}|{params}|{self.dtype.name}|{CACHE_FORMAT}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.json', base + '.emb'
+
+    def _chunk_paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.txt', base + '.off', base + '.info'
+
+    def _token_paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.tok', base + '.tokoff', base + '.tokidx'
+
+    def _lexical_paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.bm25terms', base + '.bm25off', base + '.bm25ids', base + '.bm25tf', base + '.bm25len'
+
+    def _name_dir(self, filename):
+        """Directory of the filename index holding one small file per entry with that filename"""
+        digest = hashlib.sha256(filename.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'names', digest)
+
+    def _index_name(self, key, meta):
+        """Record an entry under its filename, for find_by_filename()"""
+        if not meta.get('filename'):
+            return
+        directory = self._name_dir(meta['filename'])
+        path = os.path.join(directory, key)
+        os.makedirs(directory, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'doc_id': meta['doc_id'], 'created_at': meta.get('created_at', 0)}, f)
+        os.replace(tmp, path)
+
+    def find_by_filename(self, filename, exclude=None):
+        """doc_id of the newest entry under the current settings with this filename, or None"""
+        directory = self._name_dir(filename)
+        if not os.path.isdir(directory):
+            return None
+        best = None
+        for key in os.listdir(directory):
+            if key.endswith('.tmp') or not os.path.exists(self._paths(key)[0]):
+                continue  # Removed, or still being written
+            try:
+                with open(os.path.join(directory, key), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except Exception:
+                continue
+            if entry['doc_id'] == exclude or key != self.key(entry['doc_id']):
+                continue
+            if best is None or entry['created_at'] > best[0]:
+                best = (entry['created_at'], entry['doc_id'])
+        return best[1] if best else None
+
+    def index_path(self, doc_id, backend):
+        """Where a persisted vector index (graph or lists, without vectors) is kept"""
+        return os.path.join(self.cache_dir, f"{self.key(doc_id)}.{backend}.npz")
+
+    def __contains__(self, doc_id):
+        meta_path, _ = self._paths(self.key(doc_id))
+        return os.path.exists(meta_path)
+
+    def save(self, doc_id, chunks, embeddings, chunk_info=None, reader_tokens=None,
+             reader_tokenizer=None, lexical=None, **metadata):
+        """
+        Write a document's chunks and embeddings; the JSON sidecar is written last.
+        reader_tokens: ChunkTokens of the chunks under the reader_tokenizer model
+        lexical: BM25Index over the chunks; entries saved without one are cache misses
+        """
+        key = self.key(doc_id)
+        meta_path, emb_path = self._paths(key)
+        text_path, offsets_path, info_path = self._chunk_paths(key)
+
+        matrix = np.ascontiguousarray(embeddings, dtype=self.dtype)
+        _write_atomic(emb_path, matrix)
+
+        encoded = [chunk.encode('utf-8') for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+        _write_atomic(text_path, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        _write_atomic(offsets_path, offsets)
+        if chunk_info is not None:
+            table = np.array(
+                [[info[field] for field in CHUNK_INFO_FIELDS] for info in chunk_info],
+                dtype=np.int64
+            ).reshape(len(chunk_info), len(CHUNK_INFO_FIELDS))
+            _write_atomic(info_path, table)
+        if reader_tokens is not None:
+            for path, array in zip(self._token_paths(key), (
+                np.asarray(reader_tokens.ids, dtype=np.int32),
+                np.asarray(reader_tokens.offsets, dtype=np.int32),
+                np.asarray(reader_tokens.bounds, dtype=np.int64)
+            )):
+                _write_atomic(path, array)
+        lexical_arrays = lexical.to_arrays() if lexical is not None else None
+        if lexical_arrays is not None:
+            terms, *arrays = lexical_arrays
+            _write_atomic(self._lexical_paths(key)[0], np.frombuffer(terms, dtype=np.uint8))
+            for path, array in zip(self._lexical_paths(key)[1:], arrays):
+                _write_atomic(path, array)
+
+        meta = {
+            'doc_id': doc_id,
+            'model_name': self.model_name,
+            'chunk_params': self.chunk_params,
+            'dtype': self.dtype.name,
+            'shape': list(matrix.shape),
+            'chunk_count': len(encoded),
+            'text_bytes': int(offsets[-1]),
+            'has_chunk_info': chunk_info is not None,
+            'reader_tokenizer': reader_tokenizer if reader_tokens is not None else None,
+            'reader_token_count': int(reader_tokens.bounds[-1]) if reader_tokens is not None else None,
+            'bm25': {
+                'k1': lexical.k1,
+                'b': lexical.b,
+                'term_bytes': len(lexical_arrays[0]),
+                'terms': len(lexical_arrays[1]) - 1,
+                'postings': len(lexical_arrays[2]),
+            } if lexical_arrays is not None else None,
+        }
+        meta.update(metadata)
+
+        tmp_meta = meta_path + '.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+        self._index_name(key, meta)
+        return key
+
+    def _load_entry(self, meta_path, emb_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        embeddings = _map(emb_path, meta['dtype'], tuple(meta['shape']))
+        key = os.path.basename(meta_path)[:-len('.json')]
+
+        text_path, offsets_path, info_path = self._chunk_paths(key)
+        count = meta['chunk_count']
+        meta['chunks'] = MappedTexts(
+            _map(text_path, np.uint8, (meta['text_bytes'],)),
+            _map(offsets_path, np.int64, (count + 1,))
+        )
+        meta['chunk_info'] = None
+        if meta['has_chunk_info']:
+            meta['chunk_info'] = MappedChunkInfo(
+                _map(info_path, np.int64, (count, len(CHUNK_INFO_FIELDS)))
+            )
+
+        # None when the reader's tokenizer was unavailable at index time
+        meta['reader_tokens'] = None
+        if meta['reader_token_count'] is not None:
+            ids_path, token_offsets_path, bounds_path = self._token_paths(key)
+            tokens = meta['reader_token_count']
+            meta['reader_tokens'] = ChunkTokens(
+                _map(ids_path, np.int32, (tokens,)),
+                _map(token_offsets_path, np.int32, (tokens, 2)),
+                _map(bounds_path, np.int64, (len(meta['chunks']) + 1,))
+            )
+
+        bm25 = meta['bm25']
+        if bm25 is None:
+            raise ValueError('entry has no BM25 index')
+        terms_path, offsets_path, ids_path, tfs_path, lengths_path = self._lexical_paths(key)
+        meta['lexical'] = BM25Index.from_arrays(
+            _map(terms_path, np.uint8, (bm25['term_bytes'],)),
+            _map(offsets_path, np.int64, (bm25['terms'] + 1,)),
+            _map(ids_path, np.uint32, (bm25['postings'],)),
+            _map(tfs_path, np.uint16, (bm25['postings'],)),
+            _map(lengths_path, np.uint32, (len(meta['chunks']),)),
+            k1=bm25['k1'],
+            b=bm25['b']
+        )
+        return meta, embeddings
+
+    def load(self, doc_id):
+        """Return (metadata, memmapped embeddings) for a document, or None on a miss"""
+        meta_path, emb_path = self._paths(self.key(doc_id))
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            return self._load_entry(meta_path, emb_path)
+        except Exception as e:
+            print(f"✗ Ignoring unreadable cache entry {meta_path}: {e}")
+            return None
+
+    def read_meta(self, key):
+        """JSON sidecar of a cache entry, without mapping any of its files"""
+        meta_path, _ = self._paths(key)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def catalog(self, known=None):
+        """
+        Yield (key, metadata) for every entry matching the current settings.
+        Only the JSON sidecars are read; nothing is memory-mapped.
+        known: set of keys already seen, skipped without opening their
+        sidecar; every key read is added to it, so repeated calls only read
+        entries written since
+        """
+        known = set() if known is None else known
+        for name in sorted(os.listdir(self.cache_dir)):
+            if not name.endswith('.json') or name[:-len('.json')] in known:
+                continue
+            key = name[:-len('.json')]
+            try:
+                meta = self.read_meta(key)
+            except Exception as e:
+                print(f"✗ Ignoring unreadable cache entry {name}: {e}")
+                continue
+            known.add(key)
+            if key != self.key(meta['doc_id']):
+                continue  # Built with another model, chunking configuration or format
+            yield key, meta
+
+    def remove(self, doc_id):
+        key = self.key(doc_id)
+        try:
+            filename = self.read_meta(key).get('filename')
+            if filename:
+                os.remove(os.path.join(self._name_dir(filename), key))
+        except (OSError, ValueError):
+            pass
+        prefix = key + '.'
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,155 @@
+"""
+Page-level incremental re-indexing of revised documents.
+
+Pages of a new revision are matched to the pages of the previous one by
+content hash (PDFProcessor.page_hashes()), in order, so inserted or deleted
+pages only shift the pages after them. A chunk of the previous revision is
+kept, together with its embedding, when every page it covers is unchanged.
+Only pages that changed, or that the kept chunks do not fully cover, are
+extracted, chunked and encoded again.
+"""
+
+from bisect import bisect_right
+from difflib import SequenceMatcher
+
+
+def page_table(lengths):
+    """
+    [page_number, offset, length] of every page in the text TokenChunker.join_pages builds.
+    lengths: (page_number, text_length) pairs in page order
+    """
+    table = []
+    offset = 0
+    for page_number, length in lengths:
+        table.append([page_number, offset, length])
+        offset += length + 1
+    return table
+
+
+def match_pages(previous_hashes, page_hashes):
+    """{new page number: previous page number} for every unchanged page"""
+    matcher = SequenceMatcher(None, previous_hashes, page_hashes, autojunk=False)
+    mapping = {}
+    for previous_start, start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            mapping[start + offset + 1] = previous_start + offset + 1
+    return mapping
+
+
+def _runs(numbers):
+    """Split sorted page numbers into runs of consecutive pages"""
+    runs = []
+    for number in numbers:
+        if runs and runs[-1][-1] == number - 1:
+            runs[-1].append(number)
+        else:
+            runs.append([number])
+    return runs
+
+
+class ReindexPlan:
+    """Which chunks of the previous revision to keep and which pages to extract again"""
+
+    def __init__(self, previous, page_hashes):
+        """previous: IndexedDocument of the earlier revision, with page hashes and offsets"""
+        self.previous = previous
+        self.page_hashes = page_hashes
+        self.page_map = match_pages(previous.page_hashes, page_hashes)
+        self._new_page = {old: new for new, old in self.page_map.items()}
+        self._previous_pages = {number: (offset, length) for number, offset, length in previous.page_offsets}
+
+        # Chunks whose pages are all unchanged and still adjacent
+        self.kept = []
+        for position, info in enumerate(previous.chunk_info):
+            first, last = info['page_start'], info['page_end']
+            if all(page in self._new_page for page in range(first, last + 1)) and \
+                    self._new_page[last] - self._new_page[first] == last - first:
+                self.kept.append(position)
+
+        # Consecutive chunks overlap or are only separated by whitespace, so a
+        # run of kept chunks covers the previous text without gaps
+        starts, ends = [], []
+        previous_position = None
+        for position in self.kept:
+            info = previous.chunk_info[position]
+            if previous_position == position - 1:
+                ends[-1] = max(ends[-1], info['end'])
+            else:
+                starts.append(info['start'])
+                ends.append(info['end'])
+            previous_position = position
+
+        def covered(old_page):
+            offset, length = self._previous_pages[old_page]
+            run = bisect_right(starts, offset) - 1
+            return run >= 0 and ends[run] >= offset + length
+
+        # Changed pages, and unchanged pages with text the kept chunks miss
+        self.pages_to_extract = [
+            number for number in range(1, len(page_hashes) + 1)
+            if number not in self.page_map or (
+                self.page_map[number] in self._previous_pages and not covered(self.page_map[number])
+            )
+        ]
+        self.chunks_reused = len(self.kept)
+        self.chunks_encoded = 0
+
+    def stats(self):
+        pages_total = len(self.page_hashes)
+        return {
+            'previous_doc_id': self.previous.doc_id,
+            'pages_total': pages_total,
+            'pages_unchanged': len(self.page_map),
+            'pages_skipped': pages_total - len(self.pages_to_extract),
+            'chunks_reused': self.chunks_reused,
+            'chunks_encoded': self.chunks_encoded,
+        }
+
+    def splice(self, pages, chunk):
+        """
+        Combine the kept chunks with chunks of the freshly extracted pages.
+        pages: (page_number, text) of the extracted pages that contain text
+        chunk: callable turning a list of pages into (text, chunk dicts)
+        Returns (page_offsets, chunks, chunk_info, reused) in document order;
+        reused[i] is the previous chunk position of chunk i, or None if it is new.
+        """
+        texts = dict(pages)
+        lengths = {}
+        for number, old_page in self.page_map.items():
+            if number not in texts and old_page in self._previous_pages:
+                lengths[number] = self._previous_pages[old_page][1]
+        for number, text in texts.items():
+            lengths[number] = len(text)
+
+        offsets = page_table(sorted(lengths.items()))
+        start_of = {number: offset for number, offset, _ in offsets}
+
+        entries = []
+        for position in self.kept:
+            info = dict(self.previous.chunk_info[position])
+            first, last = self._new_page[info['page_start']], self._new_page[info['page_end']]
+            info['start'] = start_of[first] + info['start'] - self._previous_pages[info['page_start']][0]
+            info['end'] = start_of[last] + info['end'] - self._previous_pages[info['page_end']][0]
+            info['page_start'], info['page_end'] = first, last
+            entries.append((info, self.previous.chunks[position], position))
+
+        # Consecutive extracted pages are chunked together, offsets moved into the new text
+        for run in _runs(sorted(texts)):
+            _, new_chunks = chunk([(number, texts[number]) for number in run])
+            run_start_of = {
+                number: offset for number, offset, _ in page_table((n, len(texts[n])) for n in run)
+            }
+            for info in new_chunks:
+                text = info.pop('text')
+                info['start'] += start_of[info['page_start']] - run_start_of[info['page_start']]
+                info['end'] += start_of[info['page_end']] - run_start_of[info['page_end']]
+                entries.append((info, text, None))
+
+        entries.sort(key=lambda entry: (entry[0]['start'], entry[0]['end']))
+        self.chunks_encoded = sum(1 for _, _, position in entries if position is None)
+        return (
+            offsets,
+            [text for _, text, _ in entries],
+            [info for info, _, _ in entries],
+            [position for _, _, position in entries],
+        )
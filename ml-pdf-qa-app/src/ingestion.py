@@ -0,0 +1,360 @@
+"""
+Background ingestion of uploaded PDFs.
+
+/upload only stores the file and queues a job; extraction and indexing run on
+a small thread pool. Each job records its stage, progress and per-stage
+timings so clients can poll /jobs/<id>, and chunks become searchable batch by
+batch while the job is still encoding. A job that names a previous revision
+of the document only extracts and encodes the pages that changed.
+
+The queue is bounded: once max_pending jobs are queued, running or reserved,
+or the estimated wait for a new one exceeds max_queue_wait, reserve() sheds
+the upload with Overloaded before its body is read. The reservation holds a
+place until submit() turns it into a job or release() gives it back, so
+uploads admitted together never overfill the queue.
+
+With a SharedRegistry, worker processes of one server also see each other's
+jobs: a document is ingested by only one of them, and any worker can report
+the status of any job.
+"""
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import math
+import threading
+import time
+import uuid
+
+from admission import Overloaded
+from pdf_processor import PDFProcessor
+from tracing import tracer
+
+
+class IngestionJob:
+    """Status of one document moving through extraction and indexing"""
+
+    QUEUED = 'queued'
+    EXTRACTING = 'extracting'
+    WAITING = 'waiting_for_model'
+    ENCODING = 'encoding'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, doc_id, file_path, filename, on_update=None, previous_doc_id=None):
+        self.job_id = uuid.uuid4().hex
+        self.doc_id = doc_id
+        self.file_path = file_path
+        self.filename = filename
+        self.previous_doc_id = previous_doc_id  # Earlier revision whose unchanged pages are reused
+        self.incremental = None  # Work skipped thanks to the previous revision
+        self.stage = self.QUEUED
+        self.error = None
+
+        self.pages_total = 0
+        self.pages_extracted = 0
+        self.chunks_total = 0
+        self.chunks_encoded = 0
+        self.text_length = 0
+
+        self.created_at = time.time()
+        self.finished_at = None
+        self.timings = {}
+        self._stage_started = time.perf_counter()
+        self.on_update = on_update  # Called with the job after every stage or progress change
+
+    @property
+    def finished(self):
+        return self.stage in (self.DONE, self.FAILED)
+
+    def enter_stage(self, stage):
+        """Close the timing of the current stage and start the next one"""
+        now = time.perf_counter()
+        self.timings[self.stage] = round(now - self._stage_started, 4)
+        self._stage_started = now
+        self.stage = stage
+        if self.finished:
+            self.finished_at = time.time()
+        self.updated()
+
+    def updated(self):
+        if self.on_update is not None:
+            self.on_update(self)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'doc_id': self.doc_id,
+            'filename': self.filename,
+            'stage': self.stage,
+            'error': self.error,
+            'progress': {
+                'pages_extracted': self.pages_extracted,
+                'pages_total': self.pages_total,
+                'chunks_encoded': self.chunks_encoded,
+                'chunks_total': self.chunks_total,
+            },
+            'text_length': self.text_length,
+            'previous_doc_id': self.previous_doc_id,
+            'incremental': self.incremental,
+            'timings': dict(self.timings),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class RemoteJob:
+    """Read-only view of a job run by another worker process"""
+
+    def __init__(self, status):
+        self.status = status
+        self.job_id = status['job_id']
+        self.doc_id = status['doc_id']
+
+    @property
+    def finished(self):
+        return self.status['stage'] in (IngestionJob.DONE, IngestionJob.FAILED)
+
+    def to_dict(self):
+        return dict(self.status)
+
+
+class Reservation:
+    """Place in the ingestion queue held by an upload while its body is read"""
+
+    def __init__(self):
+        self.held = True
+
+
+class IngestionQueue:
+    """Runs ingestion jobs on a thread pool and keeps their status"""
+
+    def __init__(self, qa_model, max_workers=2, max_jobs=1000, registry=None, max_pending=16, max_queue_wait=600):
+        self.qa_model = qa_model
+        self.max_jobs = max_jobs
+        self.max_workers = max_workers
+        self.max_pending = max_pending  # Jobs queued or running before uploads are shed
+        self.max_queue_wait = max_queue_wait  # Estimated seconds a new job may wait before uploads are shed
+        self.registry = registry  # SharedRegistry when several worker processes serve the app
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='ingest'
+        )
+        self._jobs = OrderedDict()
+        self._active = {}  # doc_id -> job, so one document is never ingested twice at once
+        self._reserved = 0  # Places held by uploads still being received
+        self._lock = threading.Lock()
+        self._running = 0
+        self._completed = 0
+        self._job_seconds = 0.0
+        self.rejected = Counter()  # reason -> uploads shed
+
+    def _pending(self):
+        return len(self._active) + self._reserved
+
+    def _estimated_wait(self):
+        """Seconds until a job queued now would start, from the mean job duration"""
+        mean = self._job_seconds / self._completed if self._completed else 0.0
+        return mean * self._pending() / self.max_workers
+
+    def _check_capacity(self):
+        """Raise Overloaded if a new job should not be queued right now; call with the lock held"""
+        wait = self._estimated_wait()
+        retry_after = min(60, max(1, math.ceil(wait)))
+        if self._pending() >= self.max_pending:
+            self.rejected['queue_full'] += 1
+            raise Overloaded('Too many documents waiting for ingestion', status=429,
+                             retry_after=retry_after, reason='queue_full')
+        if wait > self.max_queue_wait:
+            self.rejected['queue_timeout'] += 1
+            raise Overloaded('Ingestion queue is too far behind', status=503,
+                             retry_after=retry_after, reason='queue_timeout')
+
+    def reserve(self):
+        """Hold a place for a job before its upload is received; raises Overloaded when full"""
+        with self._lock:
+            self._check_capacity()
+            self._reserved += 1
+        return Reservation()
+
+    def release(self, reservation):
+        """Give back a place that submit() did not use"""
+        with self._lock:
+            if reservation.held:
+                reservation.held = False
+                self._reserved -= 1
+
+    def submit(self, doc_id, file_path, filename, previous_doc_id=None, reservation=None):
+        """
+        Queue a document for ingestion, or return the job already working on it.
+        previous_doc_id: an earlier revision to reuse unchanged pages from
+        reservation: a place taken by reserve(); without one, capacity is checked
+        here and Overloaded raised when the queue is full
+        """
+        with self._lock:
+            job = self._active.get(doc_id)
+            if job is not None:
+                return job
+            if reservation is None or not reservation.held:
+                self._check_capacity()
+
+            job = IngestionJob(doc_id, file_path, filename, previous_doc_id=previous_doc_id)
+            if self.registry is not None:
+                owner = self.registry.claim(doc_id, job.job_id)
+                if owner is not None:
+                    # Its status file may not be written yet
+                    return self._remote_job(owner) or RemoteJob(
+                        {'job_id': owner, 'doc_id': doc_id, 'stage': IngestionJob.QUEUED}
+                    )
+                job.on_update = self._publish
+                self._publish(job)
+
+            if reservation is not None and reservation.held:
+                reservation.held = False
+                self._reserved -= 1
+            self._jobs[job.job_id] = job
+            self._active[doc_id] = job
+            self._trim()
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.registry is not None:
+            job = self._remote_job(job_id)
+        return job
+
+    def active_job(self, doc_id):
+        with self._lock:
+            job = self._active.get(doc_id)
+        if job is None and self.registry is not None:
+            owner = self.registry.owner(doc_id)
+            if owner is not None:
+                job = self._remote_job(owner)
+        return job
+
+    def _remote_job(self, job_id):
+        status = self.registry.job(job_id)
+        return RemoteJob(status) if status is not None else None
+
+    def _publish(self, job):
+        try:
+            self.registry.publish(job.to_dict())
+        except OSError as e:
+            print(f"✗ Could not publish status of job {job.job_id}: {e}")
+
+    def _trim(self):
+        # Forget the oldest finished jobs once we track too many
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((j for j in self._jobs.values() if j.finished), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest.job_id]
+
+    def _run(self, job):
+        start = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            with tracer.trace('ingest'):
+                self._ingest(job)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._job_seconds += time.perf_counter() - start
+
+    def _ingest(self, job):
+        try:
+            job.enter_stage(IngestionJob.EXTRACTING)
+
+            def on_page(done, total):
+                job.pages_extracted = done
+                job.pages_total = total
+                job.updated()
+
+            processor = PDFProcessor(job.file_path)
+            try:
+                page_hashes = processor.page_hashes()
+            except Exception as e:
+                print(f"✗ Could not hash pages of {job.filename}: {e}")
+                page_hashes = None
+
+            # A revision only needs the pages that changed since the previous one
+            plan = None
+            if job.previous_doc_id and page_hashes and self.qa_model.loaded:
+                plan = self.qa_model.plan_reindex(job.previous_doc_id, page_hashes)
+
+            if plan is not None:
+                pages = processor.extract_pages(progress=on_page, page_numbers=plan.pages_to_extract)
+            else:
+                pages = processor.extract_pages(progress=on_page)
+                if not pages:
+                    raise ValueError('Could not extract text from PDF')
+            job.text_length = sum(len(text) for _, text in pages)
+
+            # Extraction does not need the models, so it may finish while they are loading
+            if not self.qa_model.loaded:
+                job.enter_stage(IngestionJob.WAITING)
+                if not self.qa_model.wait_until_loaded():
+                    raise ValueError('Models failed to load')
+                # The on-disk cache may already hold this document
+                document = self.qa_model.get_document(job.doc_id)
+                if document is not None and document.is_complete:
+                    job.chunks_encoded = job.chunks_total = len(document.chunks)
+                    job.enter_stage(IngestionJob.DONE)
+                    return
+
+            job.enter_stage(IngestionJob.ENCODING)
+
+            def on_batch(done, total):
+                job.chunks_encoded = done
+                job.chunks_total = total
+                job.updated()
+
+            document = self.qa_model.index_document(
+                pages,
+                doc_id=job.doc_id,
+                filename=job.filename,
+                progress=on_batch,
+                page_hashes=page_hashes,
+                plan=plan
+            )
+            if document is None:
+                raise ValueError('Could not process PDF for Q&A')
+            job.text_length = document.text_length
+
+            if plan is not None:
+                job.incremental = plan.stats()
+            job.enter_stage(IngestionJob.DONE)
+            if plan is not None:
+                print(f"📥 Re-indexed {job.filename}: {job.incremental['pages_skipped']}/"
+                      f"{job.incremental['pages_total']} pages and {job.incremental['chunks_reused']} chunks "
+                      f"reused in {sum(job.timings.values()):.2f}s")
+            else:
+                print(f"📥 Ingested {job.filename} ({job.chunks_total} chunks) in "
+                      f"{sum(job.timings.values()):.2f}s")
+        except Exception as e:
+            job.error = str(e)
+            job.enter_stage(IngestionJob.FAILED)
+            print(f"✗ Ingestion of {job.filename} failed: {e}")
+        finally:
+            with self._lock:
+                if self._active.get(job.doc_id) is job:
+                    del self._active[job.doc_id]
+            if self.registry is not None:
+                self.registry.release(job.doc_id, job.job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': len(self._active),
+                'reserved': self._reserved,
+                'running': self._running,
+                'queued': max(0, len(self._active) - self._running),
+                'max_pending': self.max_pending,
+                'rejected': dict(self.rejected),
+                'estimated_wait_seconds': round(self._estimated_wait(), 3),
+                'tracked': len(self._jobs),
+            }
@@ -0,0 +1,199 @@
+"""
+BM25 inverted index and hybrid lexical/semantic ranking.
+
+Postings are kept in compact `array` buffers (document ids as uint32, term
+frequencies as uint16) and scored with NumPy, so a query only touches the
+postings of its own terms. An index can be flattened to a few arrays and
+rebuilt over them, memory-mapped, without re-tokenizing the texts. Tokens keep internal hyphens, dots and slashes,
+so part numbers and error codes such as "W-017" or "E1.2" stay whole.
+"""
+
+from array import array
+import math
+import re
+import sys
+import threading
+
+import numpy as np
+
+TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+def tokenize(text):
+    """Lowercased word, number and identifier tokens"""
+    return TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """Append-only BM25 index over a list of texts; ids are list positions"""
+
+    def __init__(self, texts=(), k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> (array of ids, array of term frequencies)
+        self.doc_lengths = array('I')
+        self.total_length = 0
+        self._lock = threading.Lock()
+        self.add(texts)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @property
+    def nbytes(self):
+        """Heap memory of the postings and term dictionary; memory-mapped postings are not counted"""
+        size = sys.getsizeof(self.postings)
+        for term, entry in self.postings.items():
+            size += sys.getsizeof(term)
+            for buffer in entry:
+                if not isinstance(buffer, np.memmap):
+                    size += buffer.itemsize * len(buffer)
+        if not isinstance(self.doc_lengths, np.memmap):
+            size += self.doc_lengths.itemsize * len(self.doc_lengths)
+        return size
+
+    def to_arrays(self):
+        """
+        The index as flat arrays: (terms, offsets, ids, tfs, doc_lengths), with
+        the terms UTF-8 encoded and separated by newlines, and the postings of
+        term i at ids[offsets[i]:offsets[i + 1]]. See from_arrays().
+        """
+        with self._lock:
+            terms = sorted(self.postings)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(self.postings[term][0]) for term in terms])
+            ids = np.empty(int(offsets[-1]), dtype=np.uint32)
+            tfs = np.empty(int(offsets[-1]), dtype=np.uint16)
+            for term, start, end in zip(terms, offsets[:-1].tolist(), offsets[1:].tolist()):
+                ids[start:end] = self.postings[term][0]
+                tfs[start:end] = self.postings[term][1]
+            doc_lengths = np.array(self.doc_lengths, dtype=np.uint32)
+        return '\n'.join(terms).encode('utf-8'), offsets, ids, tfs, doc_lengths
+
+    @classmethod
+    def from_arrays(cls, terms, offsets, ids, tfs, doc_lengths, k1=1.5, b=0.75):
+        """Index over arrays written from to_arrays(); they may be memory-mapped and are not copied"""
+        index = cls(k1=k1, b=b)
+        names = bytes(terms).decode('utf-8').split('\n') if len(terms) else []
+        bounds = np.asarray(offsets).tolist()
+        for i, term in enumerate(names):
+            index.postings[term] = (ids[bounds[i]:bounds[i + 1]], tfs[bounds[i]:bounds[i + 1]])
+        index.doc_lengths = doc_lengths
+        index.total_length = int(np.sum(doc_lengths, dtype=np.int64))
+        return index
+
+    def _thaw(self):
+        """Copy postings restored by from_arrays() into growable buffers"""
+        self.postings = {
+            term: (array('I', np.asarray(ids).tobytes()), array('H', np.asarray(tfs).tobytes()))
+            for term, (ids, tfs) in self.postings.items()
+        }
+        self.doc_lengths = array('I', np.asarray(self.doc_lengths).tobytes())
+
+    def add(self, texts):
+        """Index more texts; they get the next consecutive ids"""
+        with self._lock:
+            if not isinstance(self.doc_lengths, array):
+                self._thaw()
+            for text in texts:
+                doc_id = len(self.doc_lengths)
+                tokens = tokenize(text)
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    entry = self.postings.get(term)
+                    if entry is None:
+                        entry = self.postings[term] = (array('I'), array('H'))
+                    entry[0].append(doc_id)
+                    entry[1].append(min(tf, 65535))
+                self.doc_lengths.append(len(tokens))
+                self.total_length += len(tokens)
+
+    def idf(self, term):
+        entry = self.postings.get(term)
+        if entry is None:
+            return 0.0
+        n = len(self.doc_lengths)
+        df = len(entry[0])
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query):
+        """Dense BM25 score for every indexed text"""
+        # Buffers exported by frombuffer cannot be resized, so block add() meanwhile
+        with self._lock:
+            n = len(self.doc_lengths)
+            scores = np.zeros(n, dtype=np.float32)
+            if n == 0:
+                return scores
+
+            lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)[:n].astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / max(self.total_length / n, 1e-9))
+            for term in set(tokenize(query)):
+                entry = self.postings.get(term)
+                if entry is None:
+                    continue
+                ids = np.frombuffer(entry[0], dtype=np.uint32)
+                tfs = np.frombuffer(entry[1], dtype=np.uint16).astype(np.float32)
+                scores[ids] += self.idf(term) * tfs * (self.k1 + 1.0) / (tfs + norm[ids])
+                del ids, tfs
+        return scores
+
+    def search(self, query, k=5):
+        """Return (ids, scores) of the k best matching texts with a positive score"""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, len(hits))
+        best = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return best.astype(np.int64), scores[best]
+
+
+class HybridRanker:
+    """
+    Fuses BM25 and embedding similarity. When the lexical match is decisive
+    (a strong top hit that only a few chunks come close to) the semantic
+    pass can be skipped altogether.
+    """
+
+    def __init__(self, alpha=0.5, decisive_ratio=2.0, decisive_min_score=3.0, decisive_max_hits=2):
+        self.alpha = alpha  # Weight of the semantic score in the fused score
+        self.decisive_ratio = decisive_ratio
+        self.decisive_min_score = decisive_min_score
+        # Overlapping chunks repeat the same match, so allow a couple of near-ties
+        self.decisive_max_hits = decisive_max_hits
+
+    def is_decisive(self, lexical_scores):
+        if len(lexical_scores) == 0:
+            return False
+        top = float(lexical_scores[0])
+        if top < self.decisive_min_score:
+            return False
+        close = int(np.count_nonzero(np.asarray(lexical_scores) * self.decisive_ratio >= top))
+        return close <= self.decisive_max_hits
+
+    @staticmethod
+    def _normalize(scores):
+        scores = np.asarray(scores, dtype=np.float32)
+        if len(scores) == 0:
+            return scores
+        low, high = float(scores.min()), float(scores.max())
+        if high - low < 1e-9:
+            return np.ones_like(scores)
+        return (scores - low) / (high - low)
+
+    def fuse(self, lexical, semantic):
+        """
+        Combine (ids, scores) candidate lists from both retrievers.
+        Returns [(id, fused_score)] sorted best first.
+        """
+        fused = {}
+        lexical_ids, lexical_scores = lexical
+        semantic_ids, semantic_scores = semantic
+        for i, score in zip(lexical_ids.tolist(), self._normalize(lexical_scores).tolist()):
+            fused[i] = fused.get(i, 0.0) + (1.0 - self.alpha) * score
+        for i, score in zip(semantic_ids.tolist(), self._normalize(semantic_scores).tolist()):
+            fused[i] = fused.get(i, 0.0) + self.alpha * score
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)
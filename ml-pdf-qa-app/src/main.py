@@ -1,28 +1,194 @@
-from flask import Flask, request, jsonify, render_template
-from pdf_processor import PDFProcessor
+from flask import Blueprint, Flask, Request, Response, g, request, jsonify, render_template, stream_with_context
+from admission import AdmissionController, Deadline, DeadlineExceeded, Overloaded, deadline_scope, deadline_stats
 from advanced_qa_model import AdvancedQAModel
+from batcher import MicroBatcher
+from ingestion import IngestionQueue
+from reader_pool import all_reader_metrics
+from shared_registry import SharedRegistry
+from tracing import format_labelled_metric, format_metric, traced, tracer
+from upload_store import UploadStore
 from config import Config
-import os
+import functools
+import json
 
-app = Flask(__name__, template_folder='templates')
-app.config.from_object(Config)
+# Services shared by the routes; built by create_app()
+upload_store = None
+qa_model = None
+registry = None
+ingestion = None
+ask_batcher = None
+ask_admission = None
 
-# Store the extracted text globally (for demo purposes)
-extracted_text = ""
+class UploadRequest(Request):
+    """Streams uploaded files into the upload store, hashing them on the way, instead of buffering them"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload = upload_store.open_temp()
+        self.__dict__.setdefault('uploads', []).append(upload)
+        return upload
+    
+    def upload(self, file):
+        """HashingFile of an uploaded file; spooled here if the form parser did not stream it"""
+        upload = upload_store.spool(file.stream)
+        if upload is not file.stream:
+            self.__dict__.setdefault('uploads', []).append(upload)
+        return upload
+    
+    def close(self):
+        # Also reached when the body was cut off before the form was parsed
+        super().close()
+        for upload in self.__dict__.get('uploads', ()):
+            upload.close()
+
+bp = Blueprint('pdfqa', __name__)
+
+def create_app():
+    """Load the models, start the background services and return the Flask app"""
+    global upload_store, qa_model, registry, ingestion, ask_batcher, ask_admission
+    
+    # Uploaded PDFs, stored once per content under their doc_id
+    upload_store = UploadStore(Config.PDF_UPLOAD_FOLDER)
+    upload_store.remove_stale()
+    
+    tracer.configure(
+        enabled=Config.TRACING_ENABLED,
+        slow_threshold=Config.TRACE_SLOW_REQUEST_SECONDS,
+        profile_slow=Config.TRACE_PROFILE_SLOW_REQUESTS,
+        profile_interval=Config.TRACE_PROFILE_INTERVAL_MS / 1000.0,
+        keep_slow=Config.TRACE_SLOW_REQUESTS_KEPT
+    )
+    
+    # Initialize Advanced QA model
+    qa_model = AdvancedQAModel(Config.MODEL_PATH)
+    print("Loading Advanced QA model with semantic search...")
+    if Config.MULTIPROCESS:
+        # Loaded before the workers fork, so they share the model weights copy-on-write
+        qa_model.load_model(preload=True)
+    elif Config.LOAD_MODELS_IN_BACKGROUND:
+        # The server binds its port at once; /readyz reports when models are usable
+        qa_model.start_loading()
+    else:
+        qa_model.load_model()
+    
+    # Worker processes share which documents are being ingested and every job's status
+    registry = None
+    if Config.MULTIPROCESS:
+        registry = SharedRegistry(Config.SHARED_REGISTRY_DIR, max_jobs=Config.MAX_TRACKED_JOBS)
+    
+    # Extraction and indexing run in the background, off the request thread
+    ingestion = IngestionQueue(
+        qa_model,
+        max_workers=Config.INGESTION_WORKERS,
+        max_jobs=Config.MAX_TRACKED_JOBS,
+        registry=registry,
+        max_pending=Config.INGESTION_MAX_PENDING,
+        max_queue_wait=Config.INGESTION_MAX_QUEUE_WAIT
+    )
+    
+    # Concurrent questions share one encoder pass and one reader pass
+    ask_batcher = MicroBatcher(
+        functools.partial(qa_model.answer_questions, report_stage=True),
+        max_batch_size=Config.ASK_BATCH_MAX_SIZE,
+        max_wait=Config.ASK_BATCH_MAX_WAIT_MS / 1000.0,
+        workers=Config.READER_POOL_SIZE,
+        name='ask'
+    )
+    
+    # Questions beyond these limits are shed at once rather than queued without bound
+    ask_admission = AdmissionController(
+        'ask',
+        max_active=Config.ASK_MAX_CONCURRENT,
+        max_queued=Config.ASK_MAX_QUEUED,
+        max_wait=Config.ASK_MAX_QUEUE_WAIT
+    )
+    
+    app = Flask(__name__, template_folder='templates')
+    app.config.from_object(Config)
+    app.request_class = UploadRequest
+    app.register_blueprint(bp)
+    return app
+
+def model_not_loaded():
+    """503 for requests that need the models while they are still loading"""
+    progress = qa_model.load_progress()
+    if progress['stage'] == 'failed':
+        error = f"Model failed to load: {progress['error']}"
+    else:
+        error = 'Model is still loading. Please try again in a moment.'
+    response = jsonify({'error': error, 'model': progress})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def shed(error):
+    """429/503 with Retry-After for a request shed by admission control or out of time"""
+    if isinstance(error, Overloaded):
+        status, retry_after, reason = error.status, error.retry_after, error.reason
+    else:
+        status, retry_after, reason = 503, ask_admission.retry_after(), 'deadline'
+        print(f"✗ {error}")
+    response = jsonify({'error': str(error), 'reason': reason})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
+def request_deadline():
+    """Deadline of this request: X-Request-Timeout seconds if sent, at most REQUEST_TIMEOUT_MAX"""
+    try:
+        seconds = float(request.headers.get('X-Request-Timeout') or Config.REQUEST_TIMEOUT)
+    except ValueError:
+        seconds = Config.REQUEST_TIMEOUT
+    return Deadline(min(max(seconds, 0.0), Config.REQUEST_TIMEOUT_MAX))
 
-# Initialize Advanced QA model
-print("Loading Advanced QA model with semantic search...")
-qa_model = AdvancedQAModel(Config.MODEL_PATH)
-model_loaded = qa_model.load_model()
+def admitted(view):
+    """Run a question view under ask admission control and the request's deadline; 503 while models load"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not qa_model.loaded:
+            return model_not_loaded()
+        deadline = request_deadline()
+        try:
+            with ask_admission.admit(deadline), deadline_scope(deadline):
+                return view(*args, **kwargs)
+        except (Overloaded, DeadlineExceeded) as e:
+            return shed(e)
+    return wrapper
 
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def home():
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is serving; includes model load progress"""
+    return jsonify({'status': 'ok', 'model': qa_model.load_progress()}), 200
+
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once models are loaded and the reader is warm, 503 before"""
+    progress = qa_model.load_progress()
+    status = 200 if progress['ready'] else 503
+    return jsonify({'ready': progress['ready'], 'model': progress}), status
+
+@bp.before_request
+def reserve_upload():
+    """Shed an upload before its body is read if ingestion is too far behind"""
+    if request.endpoint != 'pdfqa.upload_pdf':
+        return None
+    try:
+        g.upload_reservation = ingestion.reserve()
+    except Overloaded as e:
+        return shed(e)
+    return None
+
+@bp.teardown_request
+def release_upload(error=None):
+    # The place goes back unless the upload became a job
+    reservation = g.pop('upload_reservation', None)
+    if reservation is not None:
+        ingestion.release(reservation)
+
+@bp.route('/upload', methods=['POST'])
+@traced('upload')
 def upload_pdf():
-    global extracted_text
-    
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     
@@ -35,65 +201,341 @@ def upload_pdf():
         return jsonify({'error': 'File is not a PDF'}), 400
     
     try:
-        # Save the uploaded PDF file
-        upload_folder = Config.PDF_UPLOAD_FOLDER
-        os.makedirs(upload_folder, exist_ok=True)
-        file_path = os.path.join(upload_folder, file.filename)
-        file.save(file_path)
+        # The body was streamed to a temp file and hashed while the form was parsed
+        upload = request.upload(file)
+        doc_id = upload.hexdigest()
+        
+        # Identical content is already being ingested: report that job
+        job = ingestion.active_job(doc_id)
+        if job is not None:
+            return jsonify({
+                'message': 'File is already being indexed',
+                'doc_id': doc_id,
+                'job_id': job.job_id,
+                'filename': file.filename,
+                'cached': True
+            }), 202
         
-        # Extract text from the PDF
-        pdf_processor = PDFProcessor(file_path)
-        extracted_text = pdf_processor.extract_text()
+        # Identical content was already indexed: skip extraction and encoding
+        document = qa_model.get_document(doc_id)
+        if document is not None:
+            return jsonify({
+                'message': 'File already indexed',
+                'doc_id': doc_id,
+                'filename': file.filename,
+                'text_length': document.text_length,
+                'chunks': len(document.chunks),
+                'cached': True
+            }), 200
         
-        if not extracted_text:
-            return jsonify({'error': 'Could not extract text from PDF'}), 400
+        # Move the upload into the content-addressed store; identical content is kept once
+        with tracer.span('save'):
+            doc_id, file_path = upload_store.commit(upload)
         
-        # Index the document for semantic search
-        indexing_success = qa_model.index_document(extracted_text)
+        # A revision of an indexed document (named explicitly, or uploaded under the
+        # same filename) only re-extracts and re-encodes the pages that changed
+        previous_doc_id = request.form.get('previous_doc_id')
+        if not previous_doc_id and qa_model.loaded:
+            previous_doc_id = qa_model.find_previous_version(file.filename, doc_id)
         
-        if not indexing_success:
-            return jsonify({'error': 'Could not process PDF for Q&A'}), 400
+        # Extract and index in the background, in the place reserved before the body was read
+        job = ingestion.submit(doc_id, file_path, file.filename, previous_doc_id=previous_doc_id,
+                               reservation=g.upload_reservation)
         
         return jsonify({
-            'message': 'File uploaded and indexed successfully!',
+            'message': 'File uploaded, indexing started',
+            'doc_id': doc_id,
+            'job_id': job.job_id,
             'filename': file.filename,
-            'text_length': len(extracted_text),
-            'chunks': len(qa_model.document_chunks),
-            'preview': extracted_text[:200] + '...'
-        }), 200
+            'previous_doc_id': previous_doc_id,
+            'cached': False
+        }), 202
+    except Overloaded as e:
+        return shed(e)
     except Exception as e:
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
-@app.route('/ask', methods=['POST'])
-def ask_question():
-    global extracted_text
-    
-    if not model_loaded:
-        return jsonify({'error': 'Model is still loading. Please try again in a moment.'}), 503
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = ingestion.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job_id'}), 404
+    return jsonify(job.to_dict()), 200
+
+def find_askable_document(doc_id):
+    """(document, None) when questions can be asked about it, else (None, error response)"""
+    document = qa_model.get_document(doc_id)
+    if document is None:
+        if doc_id and ingestion.active_job(doc_id):
+            return None, (jsonify({'error': 'PDF is still being processed. Please try again in a moment'}), 409)
+        if doc_id:
+            return None, (jsonify({'error': 'Unknown doc_id. Please upload the PDF again'}), 404)
+        return None, (jsonify({'error': 'No PDF uploaded. Please upload a PDF first'}), 400)
     
+    if document.indexed_count == 0:
+        return None, (jsonify({'error': 'PDF is still being processed. Please try again in a moment'}), 409)
+    return document, None
+
+@bp.route('/ask', methods=['POST'])
+@traced('ask')
+@admitted
+def ask_question():
     try:
         data = request.json
         question = data.get('question', '').strip()
+        doc_id = data.get('doc_id')
         
         if not question:
             return jsonify({'error': 'No question provided'}), 400
         
-        if not extracted_text:
-            return jsonify({'error': 'No PDF uploaded. Please upload a PDF first'}), 400
+        document, error = find_askable_document(doc_id)
+        if error is not None:
+            return error
         
         # Log for debugging
         print(f"\n� Question: {question}")
-        print(f"📄 PDF has {len(qa_model.document_chunks)} chunks indexed")
+        print(f"📄 PDF {document.doc_id[:12]} has {document.indexed_count}/{len(document.chunks)} chunks indexed")
         
         # Generate answer using the advanced QA model
-        answer = qa_model.answer_question(question, extracted_text)
+        if Config.ASK_MICRO_BATCHING:
+            answer, answered_by = ask_batcher.submit((question, document.doc_id))
+        else:
+            answer, answered_by = qa_model.answer_question(question, doc_id=document.doc_id, report_stage=True)
+        
+        print(f"✅ Answer generated by {answered_by}\n")
+        
+        return jsonify({
+            'question': question,
+            'doc_id': document.doc_id,
+            'answer': answer,
+            'answered_by': answered_by,
+            'partial': not document.is_complete
+        }), 200
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return jsonify({'error': f'Failed to answer question: {str(e)}'}), 500
+
+@bp.route('/ask_stream', methods=['GET', 'POST'])
+def ask_stream():
+    """
+    Streaming /ask over Server-Sent Events: 'chunks' as soon as retrieval
+    finishes, then 'answer', 'confidence' and a final 'done' event
+    """
+    if not qa_model.loaded:
+        return model_not_loaded()
+    
+    data = request.get_json(silent=True) or request.args
+    question = (data.get('question') or '').strip()
+    doc_id = data.get('doc_id')
+    
+    if not question:
+        return jsonify({'error': 'No question provided'}), 400
+    
+    document, error = find_askable_document(doc_id)
+    if error is not None:
+        return error
+    
+    # The slot is held until the stream ends, not just until this view returns
+    deadline = request_deadline()
+    try:
+        slot = ask_admission.acquire(deadline)
+    except Overloaded as e:
+        return shed(e)
+    
+    def events():
+        # The body is produced after this view returns, so trace it here
+        with tracer.trace('ask_stream'), deadline_scope(deadline):
+            yield sse('question', {'question': question, 'doc_id': document.doc_id, 'partial': not document.is_complete})
+            for event, payload in qa_model.stream_answer(question, doc_id=document.doc_id):
+                yield sse(event, payload)
+    
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(slot.release)
+    return response
+
+def sse(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('/ask_batch', methods=['POST'])
+@traced('ask_batch')
+@admitted
+def ask_batch():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        default_doc_id = data.get('doc_id')
+        questions = data.get('questions')
+        
+        if not isinstance(questions, list) or not questions:
+            return jsonify({'error': 'questions must be a non-empty list'}), 400
+        
+        if len(questions) > Config.ASK_BATCH_MAX_QUESTIONS:
+            return jsonify({'error': f'At most {Config.ASK_BATCH_MAX_QUESTIONS} questions per batch'}), 400
+        
+        # Each entry is either a question string or {"question": ..., "doc_id": ...}
+        pairs = []
+        for index, entry in enumerate(questions):
+            if isinstance(entry, dict):
+                question, doc_id = entry.get('question'), entry.get('doc_id') or default_doc_id
+            else:
+                question, doc_id = entry, default_doc_id
+            if not isinstance(question, str) or not question.strip():
+                return jsonify({'error': f'questions[{index}] must be a non-empty string'}), 400
+            if doc_id is not None and not isinstance(doc_id, str):
+                return jsonify({'error': f'doc_id of questions[{index}] must be a string'}), 400
+            pairs.append((question.strip(), doc_id))
         
-        print(f"✅ Answer generated\n")
+        # Resolve the default document once so every answer names its doc_id
+        resolved = []
+        for question, doc_id in pairs:
+            document = qa_model.get_document(doc_id)
+            resolved.append((question, document.doc_id if document else doc_id))
         
-        return jsonify({'question': question, 'answer': answer}), 200
+        answers = qa_model.answer_questions(resolved, report_stage=True)
+        
+        return jsonify({
+            'answers': [
+                {'question': question, 'doc_id': doc_id, 'answer': answer, 'answered_by': answered_by}
+                for (question, doc_id), (answer, answered_by) in zip(resolved, answers)
+            ]
+        }), 200
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return jsonify({'error': f'Failed to answer questions: {str(e)}'}), 500
+
+def corpus_filter_error(filters):
+    """Why /ask_corpus filters are malformed, or None; unknown names are left to select_documents"""
+    if not isinstance(filters, dict):
+        return 'filters must be an object'
+    if 'filename' in filters and not isinstance(filters['filename'], str):
+        return 'filters.filename must be a string'
+    for name in ('created_after', 'created_before'):
+        value = filters.get(name)
+        if name in filters and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f'filters.{name} must be a Unix timestamp'
+    return None
+
+@bp.route('/ask_corpus', methods=['POST'])
+@traced('ask_corpus')
+@admitted
+def ask_corpus():
+    """Ask a question across every indexed document, or a filtered subset of them"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        question = data.get('question') or ''
+        doc_ids = data.get('doc_ids')
+        filters = data.get('filters')
+        if filters is None:
+            filters = {}
+        top_k = data.get('top_k', Config.CORPUS_TOP_K)
+        if isinstance(top_k, str) and top_k.strip().isdigit():
+            top_k = int(top_k)
+        
+        if not isinstance(question, str) or not question.strip():
+            return jsonify({'error': 'No question provided'}), 400
+        question = question.strip()
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or not 1 <= top_k <= Config.CORPUS_MAX_TOP_K:
+            return jsonify({'error': f'top_k must be an integer between 1 and {Config.CORPUS_MAX_TOP_K}'}), 400
+        if doc_ids is not None and (not isinstance(doc_ids, list) or not all(isinstance(d, str) for d in doc_ids)):
+            return jsonify({'error': 'doc_ids must be a list of strings'}), 400
+        error = corpus_filter_error(filters)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        if Config.MULTIPROCESS:
+            # Include documents other workers indexed since this one last looked
+            qa_model.load_cached_documents(only_new=True)
+        
+        try:
+            result = qa_model.answer_corpus(question, doc_ids=doc_ids, filters=filters, top_k=top_k)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        result['question'] = question
+        return jsonify(result), 200
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         return jsonify({'error': f'Failed to answer question: {str(e)}'}), 500
 
+@bp.route('/documents', methods=['GET'])
+def list_documents():
+    if Config.MULTIPROCESS:
+        # Pick up documents other workers indexed since this one last looked
+        qa_model.load_cached_documents(only_new=True)
+    return jsonify({'documents': qa_model.list_documents()}), 200
+
+@bp.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'model': qa_model.load_progress(),
+        'readers': all_reader_metrics(),
+        'documents': qa_model.documents.stats(),
+        'ingestion': ingestion.stats(),
+        'ask_batching': ask_batcher.stats(),
+        'admission': {
+            'ask': ask_admission.stats(),
+            'deadline_exceeded': deadline_stats(),
+        },
+        'answer_cache': qa_model.answer_cache.stats(),
+        'cascade': qa_model.cascade_stats(),
+        'tracing': tracer.stats()
+    }), 200
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage histograms and service gauges"""
+    documents = qa_model.documents.stats()
+    cache = qa_model.answer_cache.stats()
+    batching = ask_batcher.stats()
+    admission = ask_admission.stats()
+    ingesting = ingestion.stats()
+    body = tracer.prometheus() + ''.join([
+        format_metric('pdfqa_documents', documents['documents'], 'Documents held in the index'),
+        format_metric('pdfqa_index_bytes', documents['bytes'], 'Bytes used by indexed documents'),
+        format_metric('pdfqa_ingestion_active', ingesting['active'], 'Ingestion jobs queued or running'),
+        format_metric('pdfqa_ask_queue_depth', batching['queued'], 'Questions waiting for a micro-batch'),
+        format_metric('pdfqa_answer_cache_hits_total', cache['hits'] + cache['similar_hits'], 'Answers served from the cache', 'counter'),
+        format_metric('pdfqa_answer_cache_misses_total', cache['misses'], 'Questions not answered from the cache', 'counter'),
+        format_labelled_metric('pdfqa_answers_total', [
+            ({'stage': stage}, count) for stage, count in sorted(qa_model.cascade_stats()['answered_by'].items())
+        ], 'Answers by the cascade stage that produced them', 'counter'),
+        # Queue depth and shedding per queue, for autoscaling
+        format_labelled_metric('pdfqa_queue_depth', [
+            ({'queue': 'ask'}, admission['queued']),
+            ({'queue': 'ingestion'}, ingesting['queued']),
+        ], 'Requests waiting to be admitted'),
+        format_labelled_metric('pdfqa_in_flight', [
+            ({'queue': 'ask'}, admission['active']),
+            ({'queue': 'ingestion'}, ingesting['running']),
+        ], 'Requests being processed'),
+        format_labelled_metric('pdfqa_rejected_total', [
+            ({'queue': queue, 'reason': reason}, count)
+            for queue, rejected in (('ask', admission['rejected']), ('ingestion', ingesting['rejected']))
+            for reason, count in sorted(rejected.items())
+        ], 'Requests shed by admission control', 'counter'),
+        format_labelled_metric('pdfqa_deadline_exceeded_total', [
+            ({'stage': stage}, count) for stage, count in sorted(deadline_stats().items())
+        ], 'Requests abandoned at a pipeline stage because their deadline had passed', 'counter'),
+    ])
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+# Spawned PDF extraction workers re-import this module as __mp_main__ and need no app
+if __name__ != '__mp_main__':
+    app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
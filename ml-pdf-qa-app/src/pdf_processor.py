@@ -1,38 +1,215 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+from tracing import tracer
+
+
+def _clean_page_text(text):
+    """Clean and normalize the extracted text of one page"""
+    # Remove excessive whitespace while preserving paragraph structure
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Remove excessive newlines
+    text = re.sub(r'[ \t]+', ' ', text)  # Remove extra spaces and tabs
+    text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
+
+    # Preserve some structure by keeping line breaks for readability
+    text = text.replace('. ', '.\n')  # Add newlines after sentences
+
+    return text.strip()
+
+
+# Page entries that affect the extracted text; /Resources holds fonts and XObjects
+PAGE_TEXT_KEYS = ('/Contents', '/Resources', '/Rotate')
+
+
+def _digest_object(obj, memo, active):
+    """
+    SHA-256 digest of a PDF object with indirect references resolved and
+    streams decoded. memo caches indirect objects by reference; references
+    being hashed (active) stand in for themselves so cycles terminate.
+    """
+    from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+    if isinstance(obj, IndirectObject):
+        reference = (obj.idnum, obj.generation)
+        if reference in memo:
+            return memo[reference]
+        if reference in active:
+            return repr(reference).encode('ascii')
+        active.add(reference)
+        memo[reference] = _digest_object(obj.get_object(), memo, active)
+        active.discard(reference)
+        return memo[reference]
+
+    digest = hashlib.sha256(type(obj).__name__.encode('ascii'))
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj):
+            if key == '/Parent':
+                continue  # Back-reference into the page tree
+            digest.update(key.encode('utf-8'))
+            digest.update(_digest_object(obj.raw_get(key), memo, active))
+        if isinstance(obj, StreamObject):
+            digest.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            digest.update(_digest_object(item, memo, active))
+    else:
+        digest.update(repr(obj).encode('utf-8', 'backslashreplace'))
+    return digest.digest()
+
+
+def _extract_page(page):
+    """(cleaned_text, extraction_seconds, cleaning_seconds) for one PyPDF2 page"""
+    start = time.perf_counter()
+    page_text = page.extract_text() or ""
+    extracted = time.perf_counter()
+    text = _clean_page_text(page_text)
+    return text, extracted - start, time.perf_counter() - extracted
+
+
+def _extract_page_range(file_path, indexes):
+    """
+    Extract the pages at the given 0-based indexes; runs inside worker processes.
+    Returns (page_number, text, extraction_seconds, cleaning_seconds) tuples.
+    """
+    from PyPDF2 import PdfReader
+
+    pages = []
+    with open(file_path, "rb") as file:
+        reader = PdfReader(file)
+        for index in indexes:
+            pages.append((index + 1, *_extract_page(reader.pages[index])))
+    return pages
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(workers):
+    """Process pool shared by every PDFProcessor in this process"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Spawned, not forked: the server process holds model threads and locks
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pool
+
+
 class PDFProcessor:
-    def __init__(self, file_path):
+    def __init__(self, file_path, workers=None, pages_per_task=None):
+        from config import Config
+
         self.file_path = file_path
+        self.workers = Config.PDF_EXTRACT_WORKERS if workers is None else workers
+        self.pages_per_task = pages_per_task or Config.PDF_PAGES_PER_TASK
+
+    def page_count(self):
+        from PyPDF2 import PdfReader
+
+        with open(self.file_path, "rb") as file:
+            return len(PdfReader(file).pages)
+
+    def page_hashes(self):
+        """
+        SHA-256 of everything a page's text is extracted from, in page order:
+        its content streams, rotation and resources, with fonts, ToUnicode
+        maps and Form XObjects (and their own resources) resolved. Pages
+        whose hash is unchanged between two revisions extract to the same
+        text, so changed pages are found without extracting any text.
+        """
+        from PyPDF2 import PdfReader
 
-    def extract_text(self):
+        hashes = []
+        memo = {}  # Objects shared between pages, such as fonts, are hashed once
+        with open(self.file_path, "rb") as file:
+            for page in PdfReader(file).pages:
+                digest = hashlib.sha256()
+                for key in PAGE_TEXT_KEYS:
+                    digest.update(key.encode('ascii'))
+                    if key in page:
+                        digest.update(_digest_object(page.raw_get(key), memo, set()))
+                hashes.append(digest.hexdigest())
+        return hashes
+
+    def iter_pages(self, progress=None, page_numbers=None):
+        """
+        Yield (page_number, cleaned_text) for every page, in order.
+        Page numbers start at 1; page_numbers restricts extraction to those
+        pages. With workers > 1, page ranges are extracted in parallel
+        processes; only a few ranges are in flight at a time so memory stays
+        flat on very large PDFs.
+        progress(pages_done, pages_total) is called after each page.
+        """
+        if page_numbers is None:
+            indexes = list(range(self.page_count()))
+        else:
+            indexes = sorted(number - 1 for number in set(page_numbers))
+        total_pages = len(indexes)
+        workers = self.workers or 1
+        if workers == -1:
+            workers = os.cpu_count() or 1
+
+        if workers <= 1 or total_pages <= self.pages_per_task:
+            pages = self._iter_pages_serial(indexes)
+        else:
+            pages = self._iter_pages_parallel(indexes, workers)
+
+        for done, (page_number, text, extraction, cleaning) in enumerate(pages, start=1):
+            tracer.observe('extraction', extraction)
+            tracer.observe('cleaning', cleaning)
+            if progress:
+                progress(done, total_pages)
+            yield page_number, text
+
+    def _iter_pages_serial(self, indexes):
         from PyPDF2 import PdfReader
-        import re
 
-        text = ""
+        with open(self.file_path, "rb") as file:
+            reader = PdfReader(file)
+            for index in indexes:
+                yield (index + 1, *_extract_page(reader.pages[index]))
+
+    def _iter_pages_parallel(self, indexes, workers):
+        pool = _get_process_pool(workers)
+        ranges = [
+            indexes[start:start + self.pages_per_task]
+            for start in range(0, len(indexes), self.pages_per_task)
+        ]
+        max_in_flight = workers * 2
+
+        pending = []
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                pending.append(pool.submit(_extract_page_range, self.file_path, ranges[next_range]))
+                next_range += 1
+
+            # Yield in page order; later ranges keep running meanwhile
+            for page in pending.pop(0).result():
+                yield page
+
+    def extract_pages(self, progress=None, page_numbers=None):
+        """List of (page_number, cleaned_text) for pages that contain text"""
+        pages = []
         try:
-            with open(self.file_path, "rb") as file:
-                reader = PdfReader(file)
-                
-                # Extract text from all pages
-                for page_num, page in enumerate(reader.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                # Clean up the text
-                text = self._clean_text(text)
-                
+            for page_number, text in self.iter_pages(progress=progress, page_numbers=page_numbers):
+                if text:
+                    pages.append((page_number, text))
         except Exception as e:
             print(f"Error reading PDF file: {e}")
-        
-        return text.strip()
-
-    def _clean_text(self, text):
-        """Clean and normalize extracted text"""
-        # Remove excessive whitespace while preserving paragraph structure
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Remove excessive newlines
-        text = re.sub(r'[ \t]+', ' ', text)  # Remove extra spaces and tabs
-        text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
-        
-        # Preserve some structure by keeping line breaks for readability
-        text = text.replace('. ', '.\n')  # Add newlines after sentences
-        
-        return text
+        return pages
+
+    def extract_text(self, progress=None):
+        """
+        Extract and clean the text of every page.
+        progress(pages_done, pages_total) is called after each page.
+        """
+        return "\n".join(text for _, text in self.extract_pages(progress=progress)).strip()
@@ -1,4 +1,6 @@
-from transformers import pipeline
+from reader_pool import get_reader_pool
+from lexical_index import BM25Index
+from config import Config
 import re
 
 class QAModel:
@@ -6,54 +8,54 @@ class QAModel:
         self.model_path = model_path
         self.model = None
         self.qa_pipeline = None
+        self._indexed_context = None  # (context, sentences, BM25Index)
 
     def load_model(self):
         """Load the pre-trained QA model from Hugging Face"""
         try:
-            # Using distilbert-based QA model (lightweight and fast)
-            self.qa_pipeline = pipeline(
-                "question-answering",
-                model="distilbert-base-cased-distilled-squad",
-                device=-1  # Use CPU (-1) or GPU (0) if available
-            )
+            # Using distilbert-based QA model (lightweight and fast),
+            # shared with every other user of the same model in this process
+            self.qa_pipeline = get_reader_pool(Config.LEGACY_READER_MODEL_NAME)
+            self.qa_pipeline.warm_up()
             print("✓ QA Model loaded successfully!")
             return True
         except Exception as e:
             print(f"✗ Error loading model: {e}")
             return False
 
-    def find_relevant_passages(self, context, question, num_passages=3, passage_length=512):
-        """
-        Find the most relevant passages from context based on the question.
-        Uses keyword matching and semantic similarity.
-        """
+    def _passage_index(self, context):
+        """Sentences of the context and their BM25 index, built once per context"""
+        # Keyed on the context itself, so contexts with equal hashes never share an index
+        cached = self._indexed_context
+        if cached is not None and cached[0] == context:
+            return cached[1], cached[2]
+        
         # Split context into sentences
         sentences = re.split(r'(?<=[.!?])\s+', context)
         
         # Filter out very short sentences
         sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
         
+        index = BM25Index(sentences)
+        self._indexed_context = (context, sentences, index)
+        return sentences, index
+
+    def find_relevant_passages(self, context, question, num_passages=3, passage_length=512):
+        """
+        Find the most relevant passages from context based on the question.
+        Ranks sentences with BM25 over an inverted index built once per context.
+        """
+        sentences, index = self._passage_index(context)
+        
         if not sentences:
             return context[:passage_length]
         
-        # Extract keywords from question
-        question_words = set(question.lower().split())
-        # Remove common stop words
-        stop_words = {'what', 'where', 'when', 'why', 'how', 'is', 'are', 'the', 'a', 'an', 'in', 'on', 'at', 'to', 'for', 'of', 'and', 'or', 'but', 'this', 'that', 'these', 'those', 'as', 'by'}
-        question_words = question_words - stop_words
-        
-        # Score sentences based on keyword matches
-        sentence_scores = []
-        for i, sentence in enumerate(sentences):
-            score = sum(1 for word in question_words if word in sentence.lower())
-            sentence_scores.append((i, sentence, score))
-        
-        # Sort by score (descending) and get top passages
-        sentence_scores.sort(key=lambda x: x[2], reverse=True)
-        top_sentences = sorted(sentence_scores[:num_passages], key=lambda x: x[0])  # Re-sort by original order
+        # Score sentences with BM25 and keep the best ones
+        top_ids, _ = index.search(question, k=num_passages)
+        top_sentences = sorted(top_ids.tolist())  # Re-sort by original order
         
         # Combine top sentences into a passage
-        passage = ' '.join([s[1] for s in top_sentences])
+        passage = ' '.join(sentences[i] for i in top_sentences)
         
         # If passage is too long, truncate it
         if len(passage) > passage_length:
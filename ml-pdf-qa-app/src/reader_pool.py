@@ -0,0 +1,289 @@
+"""
+Process-wide pool of question-answering reader models.
+
+Loading a transformers QA pipeline costs seconds and hundreds of MB, so each
+model is loaded once per process and shared by every request thread. A pool
+holds a bounded number of reader instances; callers check one out, run
+inference and hand it back, so two threads never share one pipeline at the
+same time.
+
+Chunks are tokenized for the reader once, at index time (see
+reader_tokens.py); answer_spans() runs the pooled models straight on those
+token ids.
+"""
+
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from reader_tokens import build_windows, select_answers, tokenize_texts
+
+
+class ReaderPool:
+    """Bounded, lazily loaded pool of QA pipelines for a single model"""
+
+    def __init__(self, model_name, size=1, backend='pytorch', device=-1):
+        self.model_name = model_name
+        self.size = max(1, int(size))
+        self.backend = backend
+        self.device = device
+
+        self._available = queue.Queue(maxsize=self.size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._tokenizer = None
+        self._tokenizer_lock = threading.Lock()
+
+        self.load_seconds = []
+        self.inference_count = 0
+        self.inference_items = 0
+        self.inference_seconds = 0.0
+        self.max_inference_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def _create_pipeline(self):
+        """Build one reader pipeline for the configured backend"""
+        from transformers import pipeline
+
+        if self.backend == 'onnx-int8':
+            return self._create_onnx_pipeline()
+
+        return pipeline(
+            "question-answering",
+            model=self.model_name,
+            device=self.device
+        )
+
+    def _create_onnx_pipeline(self):
+        """Export the model to ONNX and apply dynamic int8 quantization"""
+        import os
+        from transformers import AutoTokenizer, pipeline
+        from optimum.onnxruntime import ORTModelForQuestionAnswering, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from config import Config
+
+        export_dir = os.path.join(
+            Config.READER_ONNX_DIR,
+            self.model_name.replace('/', '__')
+        )
+        quantized_path = os.path.join(export_dir, 'model_quantized.onnx')
+
+        if not os.path.exists(quantized_path):
+            model = ORTModelForQuestionAnswering.from_pretrained(self.model_name, export=True)
+            model.save_pretrained(export_dir)
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=export_dir, quantization_config=qconfig)
+
+        model = ORTModelForQuestionAnswering.from_pretrained(
+            export_dir,
+            file_name='model_quantized.onnx'
+        )
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return pipeline("question-answering", model=model, tokenizer=tokenizer)
+
+    def _load_one(self):
+        start = time.perf_counter()
+        reader = self._create_pipeline()
+        elapsed = time.perf_counter() - start
+        with self._metrics_lock:
+            self.load_seconds.append(elapsed)
+        print(f"✓ Reader '{self.model_name}' ({self.backend}) loaded in {elapsed:.2f}s")
+        return reader
+
+    @property
+    def tokenizer(self):
+        """The reader's fast tokenizer, loaded on first use without loading a model"""
+        if self._tokenizer is None:
+            with self._tokenizer_lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+        return self._tokenizer
+
+    def tokenize(self, texts):
+        """(ids, offsets) of each text under the reader's tokenizer, without special tokens"""
+        tokenizer = self.tokenizer
+        # Fast tokenizers must not be called from two threads at once
+        with self._tokenizer_lock:
+            return tokenize_texts(tokenizer, texts)
+
+    def warm_up(self, instances=1):
+        """Load reader instances up front so the first questions do not pay for them"""
+        self.tokenizer  # Loaded up front too, so forked workers share it
+        readers = [self.acquire() for _ in range(min(instances, self.size))]
+        for reader in readers:
+            self.release(reader)
+        return True
+
+    def acquire(self, timeout=None):
+        """Check out a reader, creating a new one if the pool is not full yet"""
+        start = time.perf_counter()
+        try:
+            reader = self._available.get_nowait()
+        except queue.Empty:
+            reader = None
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    reader = self._load_one()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                reader = self._available.get(timeout=timeout)
+
+        with self._metrics_lock:
+            self.wait_seconds += time.perf_counter() - start
+        return reader
+
+    def release(self, reader):
+        """Return a reader to the pool"""
+        self._available.put_nowait(reader)
+
+    def __call__(self, **kwargs):
+        """
+        Run the QA pipeline on a pooled reader instance.
+        question/context may be lists to run a whole batch in one call.
+        """
+        reader = self.acquire()
+        try:
+            start = time.perf_counter()
+            result = reader(**kwargs)
+            elapsed = time.perf_counter() - start
+        finally:
+            self.release(reader)
+
+        question = kwargs.get('question')
+        self._record_inference(len(question) if isinstance(question, (list, tuple)) else 1, elapsed)
+        return result
+
+    def answer_spans(self, questions, contexts, max_answer_len=300):
+        """
+        Extract an answer for each question from its pre-tokenized contexts,
+        all windows in one forward pass.
+        contexts: per question, the (ids, offsets) of each context chunk
+        Returns per question a dict with score, context (index of the chunk
+        holding the answer) and the start/end character offsets in that
+        chunk's text, or None when there was nothing to read.
+        """
+        tokenizer = self.tokenizer
+        question_ids = [ids for ids, _ in self.tokenize(questions)]
+        windows = build_windows(tokenizer, question_ids, contexts)
+        if not windows:
+            return [None] * len(questions)
+
+        # Pad every window to the longest one
+        width = max(len(window['input_ids']) for window in windows)
+        pad = tokenizer.pad_token_id or 0
+        input_ids, attention_mask, token_type_ids = [], [], []
+        for window in windows:
+            padding = width - len(window['input_ids'])
+            input_ids.append(window['input_ids'] + [pad] * padding)
+            attention_mask.append([1] * len(window['input_ids']) + [0] * padding)
+            token_type_ids.append(window['token_type_ids'] + [0] * padding)
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in tokenizer.model_input_names:
+            inputs['token_type_ids'] = token_type_ids
+        inputs = {name: np.asarray(rows, dtype=np.int64) for name, rows in inputs.items()}
+
+        reader = self.acquire()
+        try:
+            start = time.perf_counter()
+            outputs = self._forward(reader, inputs)
+            start_logits = _to_numpy(outputs.start_logits)
+            end_logits = _to_numpy(outputs.end_logits)
+            elapsed = time.perf_counter() - start
+        finally:
+            self.release(reader)
+
+        self._record_inference(len(questions), elapsed)
+        return select_answers(windows, start_logits, end_logits, contexts, max_answer_len=max_answer_len)
+
+    def _forward(self, reader, inputs):
+        """Run a pipeline's model on padded int64 arrays"""
+        if not _is_torch_module(reader.model):
+            # ONNX Runtime (and other non-torch) models take numpy arrays as they are
+            return reader.model(**inputs)
+
+        import torch
+
+        tensors = {name: torch.from_numpy(array) for name, array in inputs.items()}
+        device = getattr(reader, 'device', None)
+        if device is not None:
+            tensors = {name: tensor.to(device) for name, tensor in tensors.items()}
+        with torch.no_grad():
+            return reader.model(**tensors)
+
+    def _record_inference(self, items, elapsed):
+        with self._metrics_lock:
+            self.inference_count += 1
+            self.inference_items += items
+            self.inference_seconds += elapsed
+            self.max_inference_seconds = max(self.max_inference_seconds, elapsed)
+
+    def metrics(self):
+        """Load-time and inference-time statistics for this pool"""
+        with self._metrics_lock:
+            count = self.inference_count
+            return {
+                'model': self.model_name,
+                'backend': self.backend,
+                'pool_size': self.size,
+                'instances_loaded': len(self.load_seconds),
+                'load_seconds': list(self.load_seconds),
+                'inference_count': count,
+                'inference_items': self.inference_items,
+                'inference_seconds_total': self.inference_seconds,
+                'inference_seconds_avg': self.inference_seconds / count if count else 0.0,
+                'inference_seconds_max': self.max_inference_seconds,
+                'wait_seconds_total': self.wait_seconds,
+            }
+
+
+def _is_torch_module(model):
+    # A torch model can only exist once torch is imported, so never import it here
+    torch = sys.modules.get('torch')
+    return torch is not None and isinstance(model, torch.nn.Module)
+
+
+def _to_numpy(tensor):
+    if hasattr(tensor, 'detach'):
+        tensor = tensor.detach().cpu().numpy()
+    return np.asarray(tensor, dtype=np.float32)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_reader_pool(model_name=None, size=None, backend=None):
+    """Return the shared reader pool for a model, creating it on first use"""
+    from config import Config
+
+    model_name = model_name or Config.READER_MODEL_NAME
+    size = size or Config.READER_POOL_SIZE
+    backend = backend or Config.READER_BACKEND
+
+    key = (model_name, backend)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ReaderPool(model_name, size=size, backend=backend)
+            _pools[key] = pool
+        return pool
+
+
+def all_reader_metrics():
+    """Metrics for every reader pool created in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.metrics() for pool in pools]
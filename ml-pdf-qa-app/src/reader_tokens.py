@@ -0,0 +1,162 @@
+"""
+Reader tokenization of chunks, computed once at index time.
+
+The extractive reader used to tokenize the same chunk texts again for every
+question. Chunks are now tokenized with the reader's own tokenizer when a
+document is indexed, and the token ids with their character offsets are
+cached next to the embeddings. At question time the reader's input windows
+are assembled from these ids, and the token offsets of an answer span point
+straight at its characters in the chunk - and from there in the document and
+its pages - without searching the text for the answer.
+"""
+
+import numpy as np
+
+
+class ChunkTokens:
+    """Token ids and character offsets of every chunk of a document, stored flat"""
+
+    def __init__(self, ids, offsets, bounds):
+        self.ids = ids  # int32 (tokens,)
+        self.offsets = offsets  # int32 (tokens, 2): [start, end) of each token in its chunk text
+        self.bounds = bounds  # int64 (chunks + 1,): chunk i holds tokens bounds[i]:bounds[i + 1]
+
+    @classmethod
+    def from_chunks(cls, tokenized):
+        """Build from one (ids, offsets) pair per chunk"""
+        lengths = [len(ids) for ids, _ in tokenized]
+        bounds = np.zeros(len(tokenized) + 1, dtype=np.int64)
+        bounds[1:] = np.cumsum(lengths)
+        ids = np.zeros(int(bounds[-1]), dtype=np.int32)
+        offsets = np.zeros((int(bounds[-1]), 2), dtype=np.int32)
+        for i, (chunk_ids, chunk_offsets) in enumerate(tokenized):
+            ids[bounds[i]:bounds[i + 1]] = chunk_ids
+            offsets[bounds[i]:bounds[i + 1]] = chunk_offsets
+        return cls(ids, offsets, bounds)
+
+    def __len__(self):
+        return len(self.bounds) - 1
+
+    def __getitem__(self, index):
+        """(ids, offsets) of one chunk"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('chunk index out of range')
+        start, end = int(self.bounds[index]), int(self.bounds[index + 1])
+        return self.ids[start:end], self.offsets[start:end]
+
+    @property
+    def nbytes(self):
+        """Heap bytes held; memory-mapped arrays live in the page cache instead"""
+        return sum(
+            array.nbytes for array in (self.ids, self.offsets, self.bounds)
+            if not isinstance(array, np.memmap)
+        )
+
+
+def tokenize_texts(tokenizer, texts):
+    """(ids, offsets) int32 arrays of each text, without special tokens; needs a fast tokenizer"""
+    if not texts:
+        return []
+    encoded = tokenizer(
+        list(texts),
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False
+    )
+    return [
+        (np.asarray(ids, dtype=np.int32), np.asarray(offsets, dtype=np.int32).reshape(-1, 2))
+        for ids, offsets in zip(encoded['input_ids'], encoded['offset_mapping'])
+    ]
+
+
+def build_windows(tokenizer, question_ids, contexts, max_length=384, stride=128, max_question_tokens=64):
+    """
+    Reader input windows for pre-tokenized questions and contexts.
+    question_ids: token ids of each question
+    contexts: per question, the (ids, offsets) of each context chunk
+    Long contexts are split into overlapping windows like the transformers
+    QA pipeline does (doc stride). Returns one dict per window with
+    input_ids, token_type_ids, question (index), context (index within the
+    question's contexts), context_start (position of the first context token)
+    and token_start (index of that token within the context).
+    """
+    windows = []
+    for q, (ids_q, question_contexts) in enumerate(zip(question_ids, contexts)):
+        ids_q = [int(i) for i in ids_q[:max_question_tokens]]
+        budget = max(1, max_length - len(ids_q) - tokenizer.num_special_tokens_to_add(pair=True))
+        step = max(1, budget - min(stride, budget // 2))
+        for c, (ids_c, _) in enumerate(question_contexts):
+            for token_start in range(0, max(1, len(ids_c) - budget + step), step):
+                piece = [int(i) for i in ids_c[token_start:token_start + budget]]
+                if not piece:
+                    break
+                input_ids = tokenizer.build_inputs_with_special_tokens(ids_q, piece)
+                special = tokenizer.get_special_tokens_mask(ids_q, piece)
+                trailing = 0  # Special tokens after the context
+                while special[len(special) - 1 - trailing]:
+                    trailing += 1
+                windows.append({
+                    'input_ids': input_ids,
+                    'token_type_ids': tokenizer.create_token_type_ids_from_sequences(ids_q, piece),
+                    'question': q,
+                    'context': c,
+                    'context_start': len(input_ids) - trailing - len(piece),
+                    'token_start': token_start,
+                    'length': len(piece),
+                })
+    return windows
+
+
+def _softmax(logits):
+    exp = np.exp(logits - logits.max())
+    return exp / exp.sum()
+
+
+def best_span(start_logits, end_logits, context_start, length, max_answer_len):
+    """
+    (score, first token, last token) of the best answer span in one window,
+    token positions relative to the window's context. Scores are the product
+    of start and end probabilities over the context and [CLS], as in the
+    transformers QA pipeline without impossible answers.
+    """
+    keep = np.zeros(len(start_logits), dtype=bool)
+    keep[0] = True
+    keep[context_start:context_start + length] = True
+    start = _softmax(np.where(keep, start_logits, -10000.0))[context_start:context_start + length]
+    end = _softmax(np.where(keep, end_logits, -10000.0))[context_start:context_start + length]
+
+    # Spans end at or after their start and run at most max_answer_len tokens
+    scores = np.tril(np.triu(np.outer(start, end)), max_answer_len - 1)
+    first, last = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return float(scores[first, last]), int(first), int(last)
+
+
+def select_answers(windows, start_logits, end_logits, contexts, max_answer_len=300):
+    """
+    Best span per question over all its windows, as a dict with score,
+    context (index of the chunk it is in) and start/end character offsets
+    within that chunk's text; None for a question without windows.
+    """
+    answers = [None] * len(contexts)
+    for window, starts, ends in zip(windows, start_logits, end_logits):
+        score, first, last = best_span(
+            np.asarray(starts, dtype=np.float32),
+            np.asarray(ends, dtype=np.float32),
+            window['context_start'],
+            window['length'],
+            max_answer_len
+        )
+        best = answers[window['question']]
+        if best is not None and best['score'] >= score:
+            continue
+        _, offsets = contexts[window['question']][window['context']]
+        answers[window['question']] = {
+            'score': score,
+            'context': window['context'],
+            'start': int(offsets[window['token_start'] + first][0]),
+            'end': int(offsets[window['token_start'] + last][1]),
+        }
+    return answers
@@ -0,0 +1,82 @@
+"""
+Cross-encoder reranking of retrieved chunks.
+
+The bi-encoder used for retrieval embeds the question and each chunk
+separately; a cross-encoder reads them together, so it judges relevance much
+better while still costing a fraction of the extractive reader. Scores are
+passed through a sigmoid so the cascade thresholds are probabilities rather
+than model-specific logits.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from tracing import tracer
+
+
+class CrossEncoderReranker:
+    """Scores (question, chunk) pairs with a sentence_transformers CrossEncoder"""
+
+    def __init__(self, model_name, max_length=512, batch_size=32):
+        from sentence_transformers import CrossEncoder
+
+        start = time.perf_counter()
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.pairs = 0
+        self.seconds = 0.0
+        print(f"✓ Reranker '{model_name}' loaded in {time.perf_counter() - start:.2f}s")
+
+    def score(self, pairs):
+        """Relevance in [0, 1] for each (question, text) pair"""
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        start = time.perf_counter()
+        with tracer.span('reranking'):
+            logits = self.model.predict(
+                [list(pair) for pair in pairs],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+        logits = np.asarray(logits, dtype=np.float32)
+        if logits.ndim == 2:
+            logits = logits[:, -1]  # Models with several labels: the last one means relevant
+        with self._lock:
+            self.calls += 1
+            self.pairs += len(pairs)
+            self.seconds += time.perf_counter() - start
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def rerank(self, items):
+        """
+        Rerank the chunks of several questions in one forward pass.
+        items: (question, chunks) pairs; returns the chunk lists sorted by
+        'rerank_score', which is added to every chunk dict (as a copy).
+        """
+        pairs = [(question, chunk['text']) for question, chunks in items for chunk in chunks]
+        scores = self.score(pairs).tolist()
+        ranked = []
+        offset = 0
+        for _, chunks in items:
+            rescored = [
+                dict(chunk, rerank_score=score)
+                for chunk, score in zip(chunks, scores[offset:offset + len(chunks)])
+            ]
+            offset += len(chunks)
+            ranked.append(sorted(rescored, key=lambda chunk: -chunk['rerank_score']))
+        return ranked
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'model': self.model_name,
+                'calls': self.calls,
+                'pairs': self.pairs,
+                'seconds_total': self.seconds,
+            }
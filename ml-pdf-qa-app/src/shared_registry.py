@@ -0,0 +1,136 @@
+"""
+Registry of ingestion work shared by the worker processes of one server.
+
+When the app runs under a pre-forking server every worker has its own
+ingestion queue. The registry is a directory on local disk that they all see:
+a claim file per document being ingested, so identical uploads to different
+workers are only indexed once, and a status file per job, so /jobs/<id>
+answers no matter which worker receives the poll. Indexed documents
+themselves are shared through the embedding cache files.
+"""
+
+import json
+import os
+import time
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedRegistry:
+    """Claim and job status files in a directory shared by worker processes"""
+
+    def __init__(self, directory, max_jobs=1000, publish_interval=0.5):
+        self.directory = directory
+        self.max_jobs = max_jobs
+        self.publish_interval = publish_interval  # Seconds between progress-only updates of a job
+        self._claims_dir = os.path.join(directory, 'claims')
+        self._jobs_dir = os.path.join(directory, 'jobs')
+        os.makedirs(self._claims_dir, exist_ok=True)
+        os.makedirs(self._jobs_dir, exist_ok=True)
+        self._published = {}  # job_id -> (stage, time) of the last write
+
+    def _claim_path(self, doc_id):
+        return os.path.join(self._claims_dir, doc_id)
+
+    def _job_path(self, job_id):
+        return os.path.join(self._jobs_dir, job_id + '.json')
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path, data):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def claim(self, doc_id, job_id):
+        """
+        Mark a document as being ingested by job_id.
+        Returns None on success, or the job_id of the live job that holds it.
+        """
+        path = self._claim_path(doc_id)
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                owner = self._read(path)
+                if owner is None:
+                    time.sleep(0.01)  # Being written by the worker that just claimed it
+                    owner = self._read(path)
+                if owner is not None and _pid_alive(owner['pid']):
+                    return owner['job_id']
+                # Left behind by a worker that died mid-ingestion
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'doc_id': doc_id, 'job_id': job_id, 'pid': os.getpid()}, f)
+            return None
+
+    def release(self, doc_id, job_id):
+        path = self._claim_path(doc_id)
+        owner = self._read(path)
+        if owner is not None and owner['job_id'] == job_id:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def owner(self, doc_id):
+        """job_id of the live job ingesting a document, or None"""
+        owner = self._read(self._claim_path(doc_id))
+        if owner is None or not _pid_alive(owner['pid']):
+            return None
+        return owner['job_id']
+
+    def publish(self, job):
+        """Write a job's status; progress-only updates are throttled"""
+        now = time.monotonic()
+        last = self._published.get(job['job_id'])
+        if last is not None and last[0] == job['stage'] and now - last[1] < self.publish_interval:
+            return
+        self._write(self._job_path(job['job_id']), job)
+        if job['finished_at'] is None:
+            self._published[job['job_id']] = (job['stage'], now)
+        else:
+            self._published.pop(job['job_id'], None)
+            self._trim()
+
+    def job(self, job_id):
+        """Last published status of a job, or None"""
+        if not job_id.isalnum():
+            return None
+        return self._read(self._job_path(job_id))
+
+    def _trim(self):
+        # Forget the oldest jobs once too many are kept
+        names = os.listdir(self._jobs_dir)
+        if len(names) <= self.max_jobs:
+            return
+        paths = [os.path.join(self._jobs_dir, name) for name in names if name.endswith('.json')]
+        try:
+            paths.sort(key=os.path.getmtime)
+        except FileNotFoundError:
+            return  # Another worker is trimming at the same time
+        for path in paths[:len(paths) - self.max_jobs]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,371 @@
+"""
+Lightweight per-request tracing and in-process latency histograms.
+
+A trace covers one request or ingestion job; spans inside it time pipeline
+stages (save, extraction, cleaning, chunking, tokenization, encoding,
+retrieval, reranking, reader, formatting). Every span is also recorded in a
+per-stage histogram, and all histograms are rendered in the Prometheus text
+format for /metrics.
+
+Work handed to another thread (micro-batches, ingestion jobs) keeps its
+trace through current()/attach(). When tracing is disabled, span() and
+trace() return a shared no-op context manager.
+
+With profiling enabled, a sampling thread records the stacks of every thread
+working on an active trace; traces slower than the threshold keep their
+collapsed stacks and are passed to the registered slow-request hooks.
+"""
+
+from bisect import bisect_left
+from collections import Counter, deque
+import functools
+import sys
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        slot = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class _NoopContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopContext()
+
+
+class Trace:
+    """Spans recorded for one request, possibly from several threads"""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.spans = []  # (stage, offset seconds, duration seconds)
+        self.threads = set()
+        self.samples = Counter()  # collapsed stack -> sample count
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, start, seconds):
+        with self._lock:
+            self.spans.append((stage, start - self.start, seconds))
+
+    def to_dict(self, top_stacks=20):
+        with self._lock:
+            spans = list(self.spans)
+        totals = {}
+        for stage, _, seconds in spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        result = {
+            'name': self.name,
+            'seconds': self.seconds,
+            'stages': totals,
+            'spans': [
+                {'stage': stage, 'offset': offset, 'seconds': seconds}
+                for stage, offset, seconds in spans
+            ],
+        }
+        if self.samples:
+            result['profile'] = [
+                {'stack': stack, 'samples': count}
+                for stack, count in self.samples.most_common(top_stacks)
+            ]
+        return result
+
+
+class _Span:
+    __slots__ = ('tracer', 'stage', 'start')
+
+    def __init__(self, tracer, stage):
+        self.tracer = tracer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._record(self.stage, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class _TraceContext:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.trace = Trace(name)
+        self.attached = None
+
+    def __enter__(self):
+        self.attached = self.tracer.attach([self.trace], _register=True)
+        self.attached.__enter__()
+        return self.trace
+
+    def __exit__(self, *exc):
+        self.attached.__exit__(*exc)
+        self.tracer._finish(self.trace)
+        return False
+
+
+class _Attach:
+    def __init__(self, tracer, traces, register):
+        self.tracer = tracer
+        self.traces = tuple(traces)
+        self.register = register
+        self.previous = None
+
+    def __enter__(self):
+        local = self.tracer._local
+        self.previous = getattr(local, 'traces', ())
+        local.traces = self.previous + self.traces
+        thread_id = threading.get_ident()
+        for trace in self.traces:
+            with trace._lock:
+                trace.threads.add(thread_id)
+        if self.register:
+            self.tracer._register(self.traces)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._local.traces = self.previous
+        thread_id = threading.get_ident()
+        for trace in self.traces:
+            with trace._lock:
+                trace.threads.discard(thread_id)
+        return False
+
+
+class Tracer:
+    """Records spans into histograms and the traces active on the calling thread"""
+
+    def __init__(self, enabled=False, slow_threshold=2.0, profile_slow=False,
+                 profile_interval=0.01, keep_slow=20, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.profile_slow = profile_slow
+        self.profile_interval = profile_interval
+        self.buckets = tuple(buckets)
+
+        self.stages = {}  # stage -> Histogram
+        self.requests = {}  # trace name -> Histogram
+        self.slow = deque(maxlen=keep_slow)
+        self.slow_count = 0
+        self.slow_hooks = []
+
+        self._local = threading.local()
+        self._active = set()
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def configure(self, enabled=None, slow_threshold=None, profile_slow=None,
+                  profile_interval=None, keep_slow=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+        if profile_slow is not None:
+            self.profile_slow = profile_slow
+        if profile_interval is not None:
+            self.profile_interval = profile_interval
+        if keep_slow is not None:
+            self.slow = deque(self.slow, maxlen=keep_slow)
+
+    def add_slow_hook(self, hook):
+        """hook(trace_dict) is called for every request slower than slow_threshold"""
+        self.slow_hooks.append(hook)
+
+    def span(self, stage):
+        """Context manager timing one pipeline stage"""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds):
+        """Record a stage duration measured elsewhere, e.g. in a worker process"""
+        if self.enabled:
+            self._record(stage, time.perf_counter() - seconds, seconds)
+
+    def trace(self, name):
+        """Context manager covering one request or job"""
+        if not self.enabled:
+            return _NOOP
+        return _TraceContext(self, name)
+
+    def current(self):
+        """Traces active on this thread, to hand over to another thread"""
+        if not self.enabled:
+            return ()
+        return getattr(self._local, 'traces', ())
+
+    def attach(self, traces, _register=False):
+        """Context manager recording this thread's spans into the given traces"""
+        if not traces:
+            return _NOOP
+        return _Attach(self, traces, _register)
+
+    def _histogram(self, histograms, name):
+        histogram = histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def _record(self, stage, start, seconds):
+        self._histogram(self.stages, stage).observe(seconds)
+        for trace in getattr(self._local, 'traces', ()):
+            trace.add_span(stage, start, seconds)
+
+    def _register(self, traces):
+        with self._lock:
+            self._active.update(traces)
+            if self.profile_slow and self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='trace-sampler', daemon=True)
+                self._sampler.start()
+
+    def _finish(self, trace):
+        trace.seconds = time.perf_counter() - trace.start
+        with self._lock:
+            self._active.discard(trace)
+        self._histogram(self.requests, trace.name).observe(trace.seconds)
+
+        if trace.seconds < self.slow_threshold:
+            return
+        details = trace.to_dict()
+        with self._lock:
+            self.slow_count += 1
+            self.slow.append(details)
+        print(f"🐢 Slow {trace.name} request: {trace.seconds:.2f}s "
+              + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in details['stages'].items()))
+        for hook in self.slow_hooks:
+            try:
+                hook(details)
+            except Exception as e:
+                print(f"✗ Slow request hook failed: {e}")
+
+    def _sample(self):
+        """Sampling profiler: collapse the stack of every thread serving an active trace"""
+        while True:
+            time.sleep(self.profile_interval)
+            if not self.profile_slow:
+                continue
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for trace in active:
+                with trace._lock:
+                    threads = list(trace.threads)
+                for thread_id in threads:
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < 64:
+                        code = frame.f_code
+                        stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                        frame = frame.f_back
+                    with trace._lock:
+                        trace.samples[';'.join(reversed(stack))] += 1
+            del frames
+
+    def stats(self):
+        with self._lock:
+            stages = dict(self.stages)
+            slow = list(self.slow)
+            slow_count = self.slow_count
+        result = {
+            'enabled': self.enabled,
+            'profile_slow': self.profile_slow,
+            'slow_threshold_seconds': self.slow_threshold,
+            'slow_requests': slow_count,
+            'stages': {},
+            'recent_slow': slow,
+        }
+        for stage, histogram in stages.items():
+            _, total, count = histogram.snapshot()
+            result['stages'][stage] = {
+                'count': count,
+                'seconds': total,
+                'mean_ms': total / count * 1000.0 if count else 0.0,
+            }
+        return result
+
+    def prometheus(self, prefix='pdfqa'):
+        """Histograms in the Prometheus text exposition format"""
+        lines = []
+        for metric, label, histograms, help_text in (
+            (f'{prefix}_stage_seconds', 'stage', self.stages, 'Time spent in each pipeline stage'),
+            (f'{prefix}_request_seconds', 'route', self.requests, 'End-to-end request and job latency'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            with self._lock:
+                items = sorted(histograms.items())
+            for name, histogram in items:
+                counts, total, count = histogram.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {count}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {total}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {count}')
+
+        lines.append(f'# HELP {prefix}_slow_requests_total Requests slower than the slow threshold')
+        lines.append(f'# TYPE {prefix}_slow_requests_total counter')
+        lines.append(f'{prefix}_slow_requests_total {self.slow_count}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_metric(name, value, help_text, metric_type='gauge'):
+    """One Prometheus metric family with a single unlabelled sample"""
+    return f'# HELP {name} {help_text}\n# TYPE {name} {metric_type}\n{name} {value}\n'
+
+
+def format_labelled_metric(name, samples, help_text, metric_type='gauge'):
+    """One Prometheus metric family from (labels dict, value) samples"""
+    lines = [f'# HELP {name} {help_text}\n# TYPE {name} {metric_type}\n']
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f'{name}{{{label_text}}} {value}\n')
+    return ''.join(lines)
+
+
+# Process-wide tracer; main.py enables it from Config
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorator running a view inside a trace"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with tracer.trace(name):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,113 @@
+"""
+Content-addressed storage of uploaded PDFs.
+
+Uploaded files are streamed from the request body straight to a temporary
+file next to the store, in the fixed-size blocks the form parser reads, and
+hashed as they are written, so an upload of any size needs neither memory
+for its body nor a second pass to compute its doc_id. Once the upload is
+accepted the temporary file is atomically renamed to <root>/<ab>/<doc_id>.pdf,
+so identical content is stored once whatever its filename, and a file with
+the same name never overwrites a different document. Temporary files of
+rejected or interrupted uploads are removed when the request closes.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+
+class HashingFile:
+    """Writable, readable temporary file that hashes whatever is written to it"""
+
+    def __init__(self, directory):
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='upload-', suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        """SHA-256 hex digest of everything written so far, as hash_file() computes it"""
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, flush ... as the form parser and FileStorage need them
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self):
+        """Close the file, and delete it unless it was moved into the store"""
+        self._file.close()
+        if not self.committed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class UploadStore:
+    """Uploaded PDFs stored under their SHA-256 digest"""
+
+    def __init__(self, root):
+        self.root = root
+        self.temp_dir = os.path.join(root, 'tmp')
+
+    def path_for(self, doc_id):
+        return os.path.join(self.root, doc_id[:2], f'{doc_id}.pdf')
+
+    def __contains__(self, doc_id):
+        return os.path.exists(self.path_for(doc_id))
+
+    def open_temp(self):
+        """A HashingFile to stream one upload into"""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        return HashingFile(self.temp_dir)
+
+    def spool(self, stream, block_size=1024 * 1024):
+        """HashingFile holding a stream; uploads parsed by UploadRequest already are one"""
+        if isinstance(stream, HashingFile):
+            return stream
+        upload = self.open_temp()
+        shutil.copyfileobj(stream, upload, block_size)
+        return upload
+
+    def commit(self, upload):
+        """
+        Move a fully written HashingFile into the store under its digest and
+        return (doc_id, path). Content already stored is kept as it is.
+        """
+        doc_id = upload.hexdigest()
+        path = self.path_for(doc_id)
+        upload.flush()
+        os.fsync(upload.fileno())
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Same filesystem as the temp file, so the rename is atomic
+            os.replace(upload.path, path)
+            upload.committed = True
+        return doc_id, path
+
+    def remove_stale(self, max_age=3600):
+        """Delete temp files left by uploads interrupted over max_age seconds ago"""
+        removed = 0
+        if not os.path.isdir(self.temp_dir):
+            return removed
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.temp_dir):
+            path = os.path.join(self.temp_dir, name)
+            try:
+                if name.endswith('.part') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
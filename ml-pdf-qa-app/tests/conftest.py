@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The application modules import each other as top-level modules; the
+# command-line tools (benchmark.py, bulk_ingest.py) sit one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -0,0 +1,36 @@
+import numpy as np
+
+from answer_cache import AnswerCache
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_every_lookup_counts_once():
+    cache = AnswerCache(similarity_threshold=0.9)
+    assert cache.get('doc', 'What is the warranty?') is None
+    assert cache.get_similar('doc', unit(1, 0)) is None
+    cache.put('doc', 'What is the warranty?', 'Two years.', unit(1, 0))
+
+    assert cache.get('doc', 'what is the warranty') == 'Two years.'
+    assert cache.get('doc', 'How long is the warranty?') is None
+    assert cache.get_similar('doc', unit(1, 0.1)) == 'Two years.'
+    assert cache.get('doc', 'Who makes it?') is None
+    assert cache.get_similar('doc', unit(0, 1)) is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['similar_hits'], stats['misses']) == (1, 1, 2)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_invalidate_and_expiry():
+    cache = AnswerCache(ttl=0.0001)
+    cache.put('doc', 'q', 'a')
+    cache.invalidate('doc')
+    assert cache.get('doc', 'q') is None
+    cache = AnswerCache(ttl=-1)
+    cache.put('doc', 'q', 'a')
+    assert cache.get('doc', 'q') is None
+    assert cache.stats()['expirations'] == 1
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+
+import benchmark
+from bulk_ingest import BulkIndexer, find_pdfs
+from config import Config
+
+
+@pytest.fixture
+def qa_model(tmp_path, monkeypatch):
+    """AdvancedQAModel on the offline benchmark's stand-in models, caching under tmp_path"""
+    encoders = type(sys)('sentence_transformers')
+    encoders.SentenceTransformer = benchmark.HashingEncoder
+    transformers = type(sys)('transformers')
+    transformers.pipeline = lambda task, model=None, **kwargs: benchmark.OverlapReader()
+    transformers.AutoTokenizer = benchmark.WordTokenizer
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', encoders)
+    monkeypatch.setitem(sys.modules, 'transformers', transformers)
+    monkeypatch.setattr(Config, 'EMBEDDING_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(Config, 'READER_MODEL_NAME', 'bulk-ingest-test-reader')
+    monkeypatch.setattr(Config, 'READER_WARM_UP', False)
+    monkeypatch.setattr(Config, 'VECTOR_INDEX_BACKEND', 'ivf')
+
+    from advanced_qa_model import AdvancedQAModel
+
+    model = AdvancedQAModel()
+    assert model.load_model(load_documents=False)
+    return model
+
+
+def extracted(doc_id, *pages):
+    return {
+        'path': f'/archive/{doc_id}.pdf',
+        'doc_id': doc_id,
+        'pages': list(enumerate(pages, start=1)),
+        'page_hashes': [f'{doc_id}-{i}' for i in range(len(pages))],
+    }
+
+
+def test_find_pdfs_is_recursive_and_sorted(tmp_path):
+    for name in ('b/2.PDF', 'b/1.pdf', 'a.pdf', 'notes.txt', 'c/d/3.pdf'):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'%PDF')
+    found = [os.path.relpath(path, tmp_path) for path in find_pdfs(str(tmp_path))]
+    assert found == ['a.pdf', 'b/1.pdf', 'b/2.PDF', 'c/d/3.pdf']
+
+
+def test_documents_are_batched_into_the_cache(qa_model):
+    indexer = BulkIndexer(qa_model, encode_chunks=10 ** 6)
+    indexer.add(extracted('doc-a', 'The pump is primed before start-up.', 'Seals are checked weekly.'))
+    indexer.add(extracted('doc-b', 'The warranty runs for two years.'))
+    assert indexer.documents == 0  # Waiting for one encode call
+    indexer.flush()
+
+    assert (indexer.documents, indexer.pages, indexer.failed) == (2, 3, [])
+    document = qa_model.get_document('doc-b')
+    assert list(document.chunks) == ['The warranty runs for two years.']
+    assert document.reader_tokens is not None
+    assert document.lexical.search('warranty')[0].tolist() == [0]
+
+
+def test_one_bad_document_does_not_stop_the_run(qa_model, monkeypatch):
+    chunk_document = qa_model.chunk_document
+
+    def fussy(pages, **kwargs):
+        if 'corrupt' in pages[0][1]:
+            raise ValueError('unreadable text')
+        return chunk_document(pages, **kwargs)
+
+    monkeypatch.setattr(qa_model, 'chunk_document', fussy)
+    indexer = BulkIndexer(qa_model)
+    indexer.add(extracted('bad', 'A corrupt page.'))
+    indexer.add(extracted('empty', '   '))
+    indexer.add(extracted('good', 'The warranty runs for two years.'))
+    indexer.flush()
+
+    assert indexer.documents == 1
+    assert [(path, error.split(':')[0]) for path, error in indexer.failed] == [
+        ('/archive/bad.pdf', 'Could not chunk document'),
+        ('/archive/empty.pdf', 'Could not extract text from PDF'),
+    ]
+    assert 'good' in qa_model.embedding_cache
@@ -0,0 +1,84 @@
+from chunker import TokenChunker
+
+
+class SubwordTokenizer:
+    """Stand-in for a fast tokenizer: one token per 4 characters of each word"""
+
+    def __call__(self, texts, **kwargs):
+        return {'input_ids': [[0] * sum((len(word) + 3) // 4 for word in text.split()) for text in texts]}
+
+
+PAGES = [
+    (1, "Pumps must be primed before start-up. The intake valve opens first!\n\nCheck the seals."),
+    (2, "  Component W-0017 operates at 150 litres per minute. Is the gauge green? Then proceed."),
+    (3, ""),
+    (4, "Maintenance is due every 500 hours " + "and the filters are replaced " * 40 + "without exception."),
+]
+
+
+def chunk(max_tokens=24, overlap_tokens=6, tokenizer=SubwordTokenizer()):
+    return TokenChunker(tokenizer, max_tokens=max_tokens, overlap_tokens=overlap_tokens).chunk(PAGES)
+
+
+def test_offsets_round_trip_to_the_document_text():
+    text, chunks = chunk()
+    assert text == "\n".join(page_text for _, page_text in PAGES)
+    assert chunks
+    for c in chunks:
+        assert text[c['start']:c['end']] == c['text']
+        assert c['text'] == c['text'].strip()
+
+
+def test_page_offsets_match_the_joined_text():
+    text, page_starts = TokenChunker.join_pages(PAGES)
+    assert [number for _, number in page_starts] == [number for number, _ in PAGES]
+    for (offset, _), (_, page_text) in zip(page_starts, PAGES):
+        assert text[offset:offset + len(page_text)] == page_text
+
+
+def test_chunks_fit_the_budget_and_cover_every_sentence():
+    tokenizer = SubwordTokenizer()
+    text, chunks = chunk(tokenizer=tokenizer)
+    for c in chunks:
+        assert c['tokens'] <= 24
+        assert c['tokens'] == TokenChunker(tokenizer).count_tokens([c['text']])[0]
+    covered = set()
+    for c in chunks:
+        covered.update(range(c['start'], c['end']))
+    assert all(i in covered for i, ch in enumerate(text) if not ch.isspace())
+
+
+def test_chunks_advance_and_overlap():
+    _, chunks = chunk()
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current['start'] > previous['start']
+        assert current['end'] > previous['end']
+        assert current['start'] <= previous['end'] + 2
+
+
+def page_at(offset):
+    """Number of the page whose text holds the character at offset"""
+    _, page_starts = TokenChunker.join_pages(PAGES)
+    for (start, number), (_, page_text) in zip(page_starts, PAGES):
+        if start <= offset < start + len(page_text):
+            return number
+    raise AssertionError(f'offset {offset} is between pages')
+
+
+def test_pages_are_recorded():
+    _, chunks = chunk()
+    for c in chunks:
+        assert c['page_start'] == page_at(c['start'])
+        assert c['page_end'] == page_at(c['end'] - 1)
+    assert {c['page_start'] for c in chunks} == {1, 2, 4}
+
+
+def test_whitespace_tokenizer_fallback():
+    text, chunks = TokenChunker(None, max_tokens=8, overlap_tokens=2).chunk(PAGES)
+    for c in chunks:
+        assert text[c['start']:c['end']] == c['text']
+        assert c['tokens'] == len(c['text'].split())
+
+
+def test_empty_document():
+    assert TokenChunker(None).chunk([(1, "   "), (2, "")]) == ("   \n", [])
@@ -0,0 +1,86 @@
+import numpy as np
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+from lexical_index import BM25Index
+from reader_tokens import ChunkTokens
+
+
+def make_cache(path, model_name='model'):
+    return EmbeddingCache(str(path), model_name, {'max_tokens': 256})
+
+
+def save(cache, doc_id, filename, created_at):
+    chunks = [f"{doc_id} chunk {i}" for i in range(3)]
+    cache.save(doc_id, chunks, np.eye(3, 4, dtype=np.float32), lexical=BM25Index(chunks),
+               filename=filename, created_at=created_at)
+
+
+def test_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    save(cache, 'a', 'manual.pdf', 1)
+    meta, embeddings = cache.load('a')
+    assert list(meta['chunks']) == ['a chunk 0', 'a chunk 1', 'a chunk 2']
+    assert np.array_equal(embeddings, np.eye(3, 4))
+    assert meta['lexical'].search('1')[0].tolist() == [1]
+    assert [key for key, _ in cache.catalog()] == [cache.key('a')]
+
+
+def test_reader_tokens_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    chunks = ['first chunk', 'second']
+    tokens = ChunkTokens.from_chunks([
+        (np.array([5, 6], dtype=np.int32), np.array([[0, 5], [6, 11]], dtype=np.int32)),
+        (np.array([7], dtype=np.int32), np.array([[0, 6]], dtype=np.int32)),
+    ])
+    cache.save('a', chunks, np.eye(2, 4, dtype=np.float32), lexical=BM25Index(chunks),
+               reader_tokens=tokens, reader_tokenizer='reader')
+    meta, _ = cache.load('a')
+    assert meta['reader_tokenizer'] == 'reader'
+    ids, offsets = meta['reader_tokens'][1]
+    assert ids.tolist() == [7] and offsets.tolist() == [[0, 6]]
+
+    # Saved while the reader's tokenizer was unavailable: read chunks are tokenized then
+    cache.save('b', chunks, np.eye(2, 4, dtype=np.float32), lexical=BM25Index(chunks))
+    assert cache.load('b')[0]['reader_tokens'] is None
+
+
+def test_entries_without_bm25_are_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.save('a', ['only chunk'], np.eye(1, 4, dtype=np.float32))
+    assert cache.load('a') is None
+
+
+def test_find_by_filename_returns_the_newest_other_revision(tmp_path):
+    cache = make_cache(tmp_path)
+    save(cache, 'a', 'manual.pdf', 1)
+    save(cache, 'b', 'manual.pdf', 2)
+    save(cache, 'c', 'other.pdf', 3)
+    assert cache.find_by_filename('manual.pdf') == 'b'
+    assert cache.find_by_filename('manual.pdf', exclude='b') == 'a'
+    assert cache.find_by_filename('missing.pdf') is None
+
+    cache.remove('b')
+    assert cache.find_by_filename('manual.pdf') == 'a'
+    # Entries built with other settings are not offered
+    assert make_cache(tmp_path, 'another-model').find_by_filename('manual.pdf') is None
+
+
+def test_entries_of_another_format_are_misses(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    save(cache, 'a', 'manual.pdf', 1)
+    monkeypatch.setattr(embedding_cache, 'CACHE_FORMAT', embedding_cache.CACHE_FORMAT + 1)
+    assert 'a' not in cache
+    assert cache.load('a') is None
+    assert list(cache.catalog()) == []
+    assert cache.find_by_filename('manual.pdf') is None
+
+
+def test_catalog_skips_known_keys(tmp_path):
+    cache = make_cache(tmp_path)
+    save(cache, 'a', 'manual.pdf', 1)
+    known = set()
+    assert len(list(cache.catalog(known))) == 1
+    save(cache, 'b', 'manual.pdf', 2)
+    assert [meta['doc_id'] for _, meta in cache.catalog(known)] == ['b']
+    assert list(cache.catalog(known)) == []
@@ -0,0 +1,96 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+from chunker import TokenChunker
+from incremental import ReindexPlan, match_pages, page_table
+
+CHUNKER = TokenChunker(None, max_tokens=20, overlap_tokens=4)
+
+
+def page(number, version=0):
+    return ' '.join(
+        f"Page {number} sentence {i} revision {version} describes part P-{number}{i}."
+        for i in range(6)
+    )
+
+
+def index(pages):
+    """Previous revision as index_document stores it"""
+    text, chunk_info = CHUNKER.chunk(pages)
+    return SimpleNamespace(
+        doc_id='previous',
+        chunks=[info.pop('text') for info in chunk_info],
+        chunk_info=chunk_info,
+        page_hashes=hashes(pages),
+        page_offsets=page_table((number, len(page_text)) for number, page_text in pages),
+    ), text
+
+
+def hashes(pages):
+    return [hashlib.sha256(page_text.encode('utf-8')).hexdigest() for _, page_text in pages]
+
+
+def renumber(texts):
+    return [(number, text) for number, text in enumerate(texts, start=1)]
+
+
+def splice(previous, revised):
+    plan = ReindexPlan(previous, hashes(revised))
+    extracted = [(number, text) for number, text in revised if number in plan.pages_to_extract and text]
+    return plan, plan.splice(extracted, CHUNKER.chunk)
+
+
+ORIGINAL = renumber([page(n) for n in range(1, 11)])
+REVISIONS = {
+    'unchanged': ORIGINAL,
+    'edited': renumber([page(n, 1 if n == 4 else 0) for n in range(1, 11)]),
+    'inserted': renumber([page(n) for n in range(1, 7)] + ["A new page about pump P-999."] + [page(n) for n in range(7, 11)]),
+    'deleted': renumber([page(n) for n in range(1, 11) if n != 9]),
+    'blank page': renumber([page(n) if n != 5 else '' for n in range(1, 11)]),
+}
+
+
+@pytest.mark.parametrize('revision', sorted(REVISIONS))
+def test_splice_matches_a_fresh_extraction(revision):
+    revised = REVISIONS[revision]
+    previous, _ = index(ORIGINAL)
+    plan, (page_offsets, chunks, chunk_info, reused) = splice(previous, revised)
+
+    with_text = [(number, text) for number, text in revised if text]
+    fresh_text, _ = CHUNKER.chunk(with_text)
+    assert page_offsets == page_table((number, len(text)) for number, text in with_text)
+
+    covered = set()
+    for text, info, position in zip(chunks, chunk_info, reused):
+        # Offsets and pages point into the revised document text
+        assert fresh_text[info['start']:info['end']] == text
+        pages = [number for number, offset, _ in page_offsets if offset <= info['start']]
+        assert info['page_start'] == pages[-1]
+        if position is not None:
+            assert previous.chunks[position] == text
+        covered.update(range(info['start'], info['end']))
+    assert all(i in covered for i, ch in enumerate(fresh_text) if not ch.isspace())
+    assert [info['start'] for info in chunk_info] == sorted(info['start'] for info in chunk_info)
+
+
+def test_unchanged_revision_reuses_everything():
+    previous, _ = index(ORIGINAL)
+    plan, (_, chunks, _, reused) = splice(previous, ORIGINAL)
+    assert plan.pages_to_extract == []
+    assert chunks == previous.chunks
+    assert reused == list(range(len(chunks)))
+
+
+def test_only_changed_pages_are_extracted():
+    previous, _ = index(ORIGINAL)
+    plan, _ = splice(previous, REVISIONS['edited'])
+    assert 4 in plan.pages_to_extract
+    assert len(plan.pages_to_extract) <= 3  # The edited page and at most its neighbours
+    assert plan.chunks_reused > 0
+
+
+def test_pages_are_matched_across_insertions_and_deletions():
+    assert match_pages(['a', 'b', 'c'], ['a', 'x', 'b', 'c']) == {1: 1, 3: 2, 4: 3}
+    assert match_pages(['a', 'b', 'c'], ['a', 'c']) == {1: 1, 2: 3}
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from admission import Overloaded
+from ingestion import IngestionQueue
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    """IngestionQueue whose jobs stay active until the test lets them finish"""
+    finish = threading.Event()
+    queue = IngestionQueue(qa_model=None, max_workers=1, max_pending=2)
+
+    def ingest(job):
+        finish.wait(5)
+        with queue._lock:
+            del queue._active[job.doc_id]
+
+    monkeypatch.setattr(queue, '_ingest', ingest)
+    yield queue
+    finish.set()
+    queue._executor.shutdown(wait=True)
+
+
+def test_reservations_count_against_capacity(queue):
+    first = queue.reserve()
+    queue.reserve()
+    with pytest.raises(Overloaded) as shed:
+        queue.reserve()
+    assert (shed.value.status, shed.value.reason) == (429, 'queue_full')
+
+    queue.release(first)
+    queue.release(first)
+    assert queue.stats()['reserved'] == 1
+    queue.reserve()
+
+
+def test_submit_turns_a_reservation_into_a_job(queue):
+    reservation = queue.reserve()
+    job = queue.submit('doc-a', '/missing.pdf', 'a.pdf', reservation=reservation)
+    queue.release(reservation)
+    assert queue.stats()['reserved'] == 0
+    assert queue.stats()['active'] == 1
+
+    # The same document again is not a new job and takes no place
+    again = queue.reserve()
+    assert queue.submit('doc-a', '/missing.pdf', 'a.pdf', reservation=again) is job
+    assert again.held
+    queue.release(again)
+
+
+def test_submit_without_a_reservation_checks_capacity(queue):
+    held = queue.reserve()
+    queue.submit('doc-a', '/missing.pdf', 'a.pdf')
+    with pytest.raises(Overloaded):
+        queue.submit('doc-b', '/missing.pdf', 'b.pdf')
+    # A reserved place is honoured even though the queue is now full
+    queue.submit('doc-b', '/missing.pdf', 'b.pdf', reservation=held)
+    assert queue.stats()['active'] == 2
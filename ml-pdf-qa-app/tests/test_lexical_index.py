@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+import pytest
+
+from lexical_index import BM25Index, HybridRanker, tokenize
+
+TEXTS = [
+    "The pump P-100 delivers 40 litres per minute.",
+    "Error E1.2 means the pump lost pressure; check valve V/7.",
+    "Replace the filter every 500 hours of operation.",
+    "The pump and the pump housing are cleaned weekly.",
+]
+
+
+def reference_score(texts, query, k1=1.5, b=0.75):
+    """BM25 computed term by term from the definition"""
+    documents = [tokenize(text) for text in texts]
+    average = sum(len(d) for d in documents) / len(documents)
+    scores = []
+    for document in documents:
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in documents)
+            if df == 0:
+                continue
+            idf = math.log(1.0 + (len(documents) - df + 0.5) / (df + 0.5))
+            tf = document.count(term)
+            score += idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * len(document) / average))
+        scores.append(score)
+    return scores
+
+
+def test_tokens_keep_part_numbers_and_codes_whole():
+    assert tokenize("Error E1.2 on P-100, valve V/7!") == ['error', 'e1.2', 'on', 'p-100', 'valve', 'v/7']
+
+
+@pytest.mark.parametrize('query', ['pump', 'pump pressure', 'E1.2', 'filter hours', 'nothing here'])
+def test_scores_match_the_bm25_definition(query):
+    index = BM25Index(TEXTS)
+    assert np.allclose(index.scores(query), reference_score(TEXTS, query), atol=1e-5)
+
+
+def test_search_ranks_best_first_and_skips_non_matches():
+    index = BM25Index(TEXTS)
+    ids, scores = index.search('pump housing', k=10)
+    assert ids[0] == 3
+    assert set(ids.tolist()) == {0, 1, 3}
+    assert np.all(np.diff(scores) <= 0)
+    assert len(index.search('turbine')[0]) == 0
+
+
+def test_added_texts_get_consecutive_ids():
+    index = BM25Index(TEXTS[:2])
+    index.add(TEXTS[2:])
+    assert len(index) == len(TEXTS)
+    assert np.allclose(index.scores('pump filter'), BM25Index(TEXTS).scores('pump filter'))
+
+
+def test_round_trip_through_arrays():
+    index = BM25Index(TEXTS)
+    restored = BM25Index.from_arrays(*index.to_arrays())
+    for query in ['pump', 'E1.2 valve', 'filter']:
+        assert np.array_equal(restored.scores(query), index.scores(query))
+    restored.add(["A new pump."])
+    assert restored.search('new')[0].tolist() == [4]
+
+
+def test_empty_index():
+    index = BM25Index()
+    assert len(index.scores('pump')) == 0
+    assert len(BM25Index.from_arrays(*index.to_arrays())) == 0
+
+
+def test_decisive_lexical_match():
+    ranker = HybridRanker(decisive_ratio=2.0, decisive_min_score=3.0, decisive_max_hits=2)
+    assert ranker.is_decisive(np.array([6.0, 1.0, 0.5]))
+    assert not ranker.is_decisive(np.array([6.0, 5.0, 4.0]))
+    assert not ranker.is_decisive(np.array([2.0]))
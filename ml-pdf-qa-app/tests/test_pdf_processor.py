@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from PyPDF2 import PdfReader
+import pytest
+
+from chunker import TokenChunker
+from incremental import ReindexPlan, page_table
+from pdf_processor import PDFProcessor
+
+canvas = pytest.importorskip('reportlab.pdfgen.canvas')
+
+
+def write_pdf(path, form_text):
+    """Three pages; page 2 draws its only text through a Form XObject"""
+    pdf = canvas.Canvas(str(path), invariant=1)
+    pdf.drawString(72, 720, "Page one is plain text.")
+    pdf.showPage()
+    pdf.beginForm('notice')
+    pdf.drawString(72, 700, form_text)
+    pdf.endForm()
+    pdf.doForm('notice')
+    pdf.showPage()
+    pdf.drawString(72, 720, "Page three is plain text.")
+    pdf.showPage()
+    pdf.save()
+    return str(path)
+
+
+@pytest.fixture
+def revisions(tmp_path):
+    return (
+        write_pdf(tmp_path / 'v1.pdf', "Component W-0017 operates at 150 rpm."),
+        write_pdf(tmp_path / 'v2.pdf', "Component W-0017 operates at 900 rpm."),
+    )
+
+
+def test_editing_only_a_form_xobject_changes_that_page_hash(revisions):
+    v1, v2 = revisions
+    # The page content streams are identical; only the XObject differs
+    pages = [PdfReader(path).pages[1] for path in revisions]
+    assert pages[0].get_contents().get_data() == pages[1].get_contents().get_data()
+
+    before, after = PDFProcessor(v1).page_hashes(), PDFProcessor(v2).page_hashes()
+    assert before[0] == after[0]
+    assert before[1] != after[1]
+    assert before[2] == after[2]
+
+
+def test_hashes_are_stable(revisions):
+    v1, _ = revisions
+    assert PDFProcessor(v1).page_hashes() == PDFProcessor(v1).page_hashes()
+
+
+def test_revised_xobject_page_is_extracted_again(revisions):
+    v1, v2 = revisions
+    pages = PDFProcessor(v1).extract_pages()
+    text, chunk_info = TokenChunker(None, max_tokens=8, overlap_tokens=0).chunk(pages)
+
+    previous = SimpleNamespace(
+        doc_id='v1',
+        page_hashes=PDFProcessor(v1).page_hashes(),
+        page_offsets=page_table((number, len(page_text)) for number, page_text in pages),
+        chunk_info=chunk_info
+    )
+    plan = ReindexPlan(previous, PDFProcessor(v2).page_hashes())
+    assert plan.pages_to_extract == [2]
+    assert all(2 not in range(info['page_start'], info['page_end'] + 1) for info in (chunk_info[i] for i in plan.kept))
@@ -0,0 +1,26 @@
+import sys
+
+import benchmark
+from reader_pool import ReaderPool
+
+
+def test_answer_spans_with_a_numpy_model(monkeypatch):
+    # The offline benchmark's stand-in reader runs on numpy arrays, without torch
+    transformers = type(sys)('transformers')
+    transformers.pipeline = lambda task, model=None, **kwargs: benchmark.OverlapReader()
+    transformers.AutoTokenizer = benchmark.WordTokenizer
+    monkeypatch.setitem(sys.modules, 'transformers', transformers)
+
+    pool = ReaderPool('stand-in')
+    texts = [
+        'The pump is serviced every month. The warranty runs for two years.',
+        'Valves are checked weekly. Component W-0017 operates at 150 litres per minute.',
+    ]
+    results = pool.answer_spans(
+        ['How long does the warranty run?', 'What does W-0017 operate at?'],
+        [pool.tokenize(texts[:1]), pool.tokenize(texts[1:])]
+    )
+
+    answers = [text[r['start']:r['end']] for text, r in zip(texts, results)]
+    assert answers == ['The warranty runs for two years.', 'Component W-0017 operates at 150 litres per minute.']
+    assert pool.metrics()['inference_count'] == 1
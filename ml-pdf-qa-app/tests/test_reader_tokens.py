@@ -0,0 +1,133 @@
+import re
+
+import numpy as np
+import pytest
+
+from reader_tokens import ChunkTokens, best_span, build_windows, select_answers, tokenize_texts
+
+CLS, SEP = 0, 1
+
+
+class PieceTokenizer:
+    """Stand-in for a fast BERT-style tokenizer: words and punctuation split into 3-character pieces"""
+
+    def __init__(self):
+        self.vocab = {}
+
+    def _token_id(self, piece):
+        return self.vocab.setdefault(piece, len(self.vocab) + 2)
+
+    def __call__(self, texts, **kwargs):
+        ids, offsets = [], []
+        for text in texts:
+            text_ids, text_offsets = [], []
+            for word in re.finditer(r'\w+|[^\w\s]', text):
+                for start in range(word.start(), word.end(), 3):
+                    end = min(start + 3, word.end())
+                    text_ids.append(self._token_id(text[start:end].lower()))
+                    text_offsets.append((start, end))
+            ids.append(text_ids)
+            offsets.append(text_offsets)
+        return {'input_ids': ids, 'offset_mapping': offsets}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 3 if pair else 2
+
+    def build_inputs_with_special_tokens(self, first, second):
+        return [CLS] + list(first) + [SEP] + list(second) + [SEP]
+
+    def get_special_tokens_mask(self, first, second):
+        return [1] + [0] * len(first) + [1] + [0] * len(second) + [1]
+
+    def create_token_type_ids_from_sequences(self, first, second):
+        return [0] * (len(first) + 2) + [1] * (len(second) + 1)
+
+
+CONTEXTS = [
+    "The relief valve opens at 8.5 bar during normal operation.",
+    "Component W-0017 operates at 150 litres per minute. " * 12 + "The warranty runs for two years.",
+]
+
+
+def span_logits(window, first, last):
+    """Logits peaking on context tokens first..last of a window"""
+    start = np.full(len(window['input_ids']), -5.0, dtype=np.float32)
+    end = start.copy()
+    start[window['context_start'] + first] = 10.0
+    end[window['context_start'] + last] = 10.0
+    return start, end
+
+
+def token_range(offsets, start_char, end_char):
+    """First and last token covering the characters [start_char, end_char)"""
+    inside = [i for i, (s, e) in enumerate(offsets.tolist()) if s < end_char and e > start_char]
+    return inside[0], inside[-1]
+
+
+def test_chunk_tokens_round_trip():
+    tokenized = tokenize_texts(PieceTokenizer(), CONTEXTS)
+    tokens = ChunkTokens.from_chunks(tokenized)
+    assert len(tokens) == len(CONTEXTS)
+    for (ids, offsets), (stored_ids, stored_offsets) in zip(tokenized, tokens):
+        assert np.array_equal(ids, stored_ids)
+        assert np.array_equal(offsets, stored_offsets)
+    assert np.array_equal(tokens[-1][0], tokenized[-1][0])
+    with pytest.raises(IndexError):
+        tokens[len(CONTEXTS)]
+
+
+def test_offsets_point_at_token_characters():
+    text = CONTEXTS[0]
+    ids, offsets = tokenize_texts(PieceTokenizer(), [text])[0]
+    assert ''.join(text[s:e] for s, e in offsets.tolist()) == ''.join(text.split())
+
+
+@pytest.mark.parametrize('context, answer', [(0, '8.5 bar'), (1, 'two years'), (1, 'W-0017')])
+def test_answer_span_maps_to_its_characters(context, answer):
+    tokenizer = PieceTokenizer()
+    contexts = [tokenize_texts(tokenizer, CONTEXTS)]
+    question_ids = [tokenize_texts(tokenizer, ['What?'])[0][0]]
+    windows = build_windows(tokenizer, question_ids, contexts, max_length=48, stride=16)
+    assert {w['context'] for w in windows} == {0, 1}
+
+    text = CONTEXTS[context]
+    start_char = text.index(answer)
+    first, last = token_range(contexts[0][context][1], start_char, start_char + len(answer))
+    # Peak the logits in one window that holds the whole answer; flat elsewhere
+    logits = []
+    target = None
+    for window in windows:
+        inside = window['context'] == context and \
+            window['token_start'] <= first and last < window['token_start'] + window['length']
+        if inside and target is None:
+            target = window
+            logits.append(span_logits(window, first - window['token_start'], last - window['token_start']))
+        else:
+            flat = np.zeros(len(window['input_ids']), dtype=np.float32)
+            logits.append((flat, flat))
+    assert target is not None
+
+    result = select_answers(windows, [s for s, _ in logits], [e for _, e in logits], contexts)[0]
+    assert result['context'] == context
+    assert text[result['start']:result['end']] == answer
+
+
+def test_windows_cover_long_contexts_with_overlap():
+    tokenizer = PieceTokenizer()
+    contexts = [tokenize_texts(tokenizer, CONTEXTS[1:])]
+    windows = build_windows(tokenizer, [[5]], contexts, max_length=48, stride=16)
+    total = len(contexts[0][0][0])
+    assert windows[0]['token_start'] == 0
+    assert windows[-1]['token_start'] + windows[-1]['length'] == total
+    for previous, window in zip(windows, windows[1:]):
+        assert window['token_start'] < previous['token_start'] + previous['length']
+    for window in windows:
+        piece = window['input_ids'][window['context_start']:window['context_start'] + window['length']]
+        assert piece == contexts[0][0][0][window['token_start']:window['token_start'] + window['length']].tolist()
+
+
+def test_best_span_respects_the_maximum_length():
+    start = np.array([0, 0, 9, 0, 0, 0], dtype=np.float32)
+    end = np.array([0, 0, 0, 0, 0, 9], dtype=np.float32)
+    _, first, last = best_span(start, end, context_start=1, length=5, max_answer_len=2)
+    assert first == 1 and last - first < 2
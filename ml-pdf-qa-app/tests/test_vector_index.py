@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from vector_index import create_index, load_index
+
+DIMENSION = 32
+BACKENDS = ['ivf', 'hnsw', 'int8', 'binary']
+# Lowest acceptable mean recall@10 against exact search
+MIN_RECALL = {'ivf': 0.9, 'hnsw': 0.95, 'int8': 0.95, 'binary': 0.85}
+
+
+def unit_vectors(n, seed, clusters=24):
+    """Points around the same fixed cluster centres, like chunk and question embeddings of one document"""
+    centres = np.random.default_rng(0).normal(size=(clusters, DIMENSION))
+    rng = np.random.default_rng(seed)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.7 * rng.normal(size=(n, DIMENSION))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return unit_vectors(1200, seed=1)
+
+
+@pytest.fixture(scope='module')
+def queries():
+    return unit_vectors(40, seed=2)
+
+
+def build(backend, vectors, batch_size=100):
+    index = create_index(backend, DIMENSION)
+    for start in range(0, len(vectors), batch_size):
+        index.add(np.arange(start, min(start + batch_size, len(vectors))), vectors[start:start + batch_size])
+    index.finalize()
+    return index
+
+
+def recall(index, exact, queries, k=10):
+    found = [len(set(index.search(q, k)[0].tolist()) & set(exact.search(q, k)[0].tolist())) / k for q in queries]
+    return float(np.mean(found))
+
+
+def test_exact_search_is_sorted_and_exact(corpus, queries):
+    exact = create_index('exact', DIMENSION).adopt(corpus)
+    ids, scores = exact.search(queries[0], 10)
+    expected = np.argsort(-(corpus @ queries[0]))[:10]
+    assert ids.tolist() == expected.tolist()
+    assert np.all(np.diff(scores) <= 0)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_recall_against_exact_search(backend, corpus, queries):
+    exact = create_index('exact', DIMENSION).adopt(corpus)
+    index = build(backend, corpus)
+    assert len(index) == len(corpus)
+    assert recall(index, exact, queries) >= MIN_RECALL[backend]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_deleted_ids_are_never_returned(backend, corpus, queries):
+    index = build(backend, corpus)
+    removed = set(range(0, len(corpus), 3))
+    index.remove(sorted(removed))
+    assert len(index) == len(corpus) - len(removed)
+    for q in queries[:10]:
+        ids, _ = index.search(q, 10)
+        assert len(ids) == 10
+        assert not removed & set(ids.tolist())
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_re_adding_an_id_replaces_its_vector(backend, corpus):
+    index = build(backend, corpus)
+    index.add([5], -corpus[5:6])
+    assert len(index) == len(corpus)
+    ids, _ = index.search(-corpus[5], 1)
+    assert ids.tolist() == [5]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_save_and_load_without_vectors(backend, corpus, queries, tmp_path):
+    index = build(backend, corpus)
+    index.remove([1, 2, 3])
+    path = tmp_path / f'{backend}.npz'
+    index.save(path, include_vectors=False)
+    loaded = load_index(path, vectors=corpus)
+    assert len(loaded) == len(index)
+    for q in queries[:10]:
+        assert loaded.search(q, 10)[0].tolist() == index.search(q, 10)[0].tolist()
+
+
+def test_ivf_retrains_as_it_grows(corpus):
+    index = create_index('ivf', DIMENSION)
+    index.add(np.arange(300), corpus[:300])
+    lists = len(index.centroids)
+    index.add(np.arange(300, 1200), corpus[300:])
+    index.finalize()
+    assert index.trained_size == len(corpus)
+    assert len(index.centroids) > lists
+    assert len(index.centroids) == int(np.sqrt(len(corpus)))
+
+
+def test_ivf_explicit_nprobe_overrides_tuning(corpus):
+    index = create_index('ivf', DIMENSION, nprobe=1)
+    index.add(np.arange(len(corpus)), corpus)
+    index.finalize()
+    assert index.tuned_nprobe >= 1
+    assert index.nprobe == 1
+
+
+def test_ivf_tuning_is_saved(corpus, tmp_path):
+    index = build('ivf', corpus)
+    path = tmp_path / 'ivf.npz'
+    index.save(path, include_vectors=False)
+    loaded = load_index(path, vectors=corpus)
+    assert (loaded.tuned_nprobe, loaded.trained_size) == (index.tuned_nprobe, index.trained_size)